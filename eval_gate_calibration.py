@@ -0,0 +1,151 @@
+import argparse
+import json
+import time
+import logging
+
+import numpy as np
+
+from query.eval_answer import EvalAnswerHandler, LocalAnswerEvaluator
+from query.medical.medical_pipeline import MedicalPipeline
+
+
+# =========================
+# CONFIG
+# =========================
+
+EVAL_FILES = [
+    "data/comparison_eval_set_fixed.json",
+    "data/comprehensive_1_drug.json",
+    "data/hybrid_eval_set_openai.json",
+]
+RESULT_FILE = "eval_gate_calibration_results.json"
+THRESHOLDS = np.round(np.arange(0.2, 0.95, 0.05), 2)
+TARGET_AGREEMENT = 0.95
+
+
+# =========================
+# LOGGING
+# =========================
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+logger = logging.getLogger("eval-gate-calibration")
+
+
+# =========================
+# Metrics
+# =========================
+
+def band_report(rows: list[dict], accept: float, reject: float) -> dict:
+    """Ma trận nhầm lẫn của quyết định cục bộ so với LLM judge với một cặp ngưỡng."""
+    confusion = {"tp": 0, "fp": 0, "tn": 0, "fn": 0}
+    escalated = 0
+    for row in rows:
+        if reject < row["local_score"] < accept:
+            escalated += 1
+            continue
+        local = row["local_score"] >= accept
+        key = ("t" if local == row["judge"] else "f") + ("p" if local else "n")
+        confusion[key] += 1
+    decided = len(rows) - escalated
+    return {
+        "accept": float(accept),
+        "reject": float(reject),
+        "local_fraction": decided / len(rows) if rows else 0.0,
+        "local_agreement": (confusion["tp"] + confusion["tn"]) / decided if decided else None,
+        "confusion": confusion,
+    }
+
+
+def sweep(rows: list[dict]) -> list[dict]:
+    return [
+        band_report(rows, accept, reject)
+        for accept in THRESHOLDS for reject in THRESHOLDS if reject < accept
+    ]
+
+
+# =========================
+# Main
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the local answer-quality gate against the LLM judge")
+    parser.add_argument("--per-file", type=int, default=20, help="Questions sampled from each eval file")
+    parser.add_argument("--accept", type=float, default=0.7)
+    parser.add_argument("--reject", type=float, default=0.4)
+    args = parser.parse_args()
+
+    samples = []
+    for path in EVAL_FILES:
+        with open(path, "r", encoding="utf-8") as f:
+            samples += json.load(f)[:args.per_file]
+
+    medical_pipeline = MedicalPipeline()
+    judge = EvalAnswerHandler(mode="llm")
+    # Ngưỡng được hiệu chỉnh riêng cho từng RETRIEVAL_MODE (thang điểm retrieval khác nhau)
+    local = LocalAnswerEvaluator(medical_pipeline.embedder, args.accept, args.reject,
+                                 retrieval_mode=medical_pipeline.retrieval_mode)
+
+    rows = []
+    local_ms, judge_ms = [], []
+    for idx, sample in enumerate(samples):
+        question = sample["question"]
+        results = medical_pipeline.medical_rag.query(question, with_payload=False)
+        texts = medical_pipeline.threshold_texts(results)
+        if not texts:
+            logger.info(f"[{idx}] no context, skipped: {question}")
+            continue
+        answer = medical_pipeline.process_medical_answer(question, context="\n\n".join(texts)).answer
+
+        started = time.perf_counter()
+        score, signals = local.score(question, answer, [hit.score for hit in results])
+        local_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        verdict = judge.evaluate(question, answer, try_count=1)
+        judge_ms.append((time.perf_counter() - started) * 1000)
+
+        rows.append({
+            "question": question,
+            "answer": answer,
+            "local_score": score,
+            "signals": signals,
+            "judge": verdict.is_satisfactory,
+            "judge_score": verdict.score,
+        })
+        logger.info(f"[{idx}] local={score:.2f} judge={verdict.is_satisfactory} ({verdict.score:.2f})")
+
+    if not rows:
+        print("No samples with retrieved context")
+        return
+
+    current = band_report(rows, args.accept, args.reject)
+    candidates = [r for r in sweep(rows) if r["local_agreement"] is not None and r["local_agreement"] >= TARGET_AGREEMENT]
+    best = max(candidates, key=lambda r: (r["local_fraction"], r["local_agreement"])) if candidates else None
+    correlation = float(np.corrcoef([r["local_score"] for r in rows], [r["judge_score"] for r in rows])[0, 1])
+
+    with open(RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump({"retrieval_mode": medical_pipeline.retrieval_mode, "rows": rows, "current": current,
+                   "suggested": best}, f, ensure_ascii=False, indent=2)
+
+    print(f"📊 EVAL GATE CALIBRATION (RETRIEVAL_MODE={medical_pipeline.retrieval_mode})")
+    print(f"samples: {len(rows)} | judge satisfactory: {np.mean([r['judge'] for r in rows]):.1%} | "
+          f"local {np.mean(local_ms):.1f} ms/answer vs LLM judge {np.mean(judge_ms):.0f} ms/answer")
+    print(f"correlation(local score, judge score): {correlation:.3f}")
+    print(f"thresholds reject<={current['reject']:.2f} / accept>={current['accept']:.2f}: "
+          f"local {current['local_fraction']:.1%}, agreement {current['local_agreement']}, "
+          f"confusion {current['confusion']}")
+    if best:
+        print(f"suggested (agreement >= {TARGET_AGREEMENT:.0%}): reject<={best['reject']:.2f} / "
+              f"accept>={best['accept']:.2f}, local {best['local_fraction']:.1%}, "
+              f"agreement {best['local_agreement']:.3f}")
+        suffix = f"_{medical_pipeline.retrieval_mode.upper()}"
+        print(f"set EVAL_REJECT_THRESHOLD{suffix}={best['reject']:.2f} EVAL_ACCEPT_THRESHOLD{suffix}={best['accept']:.2f}")
+    else:
+        print(f"no threshold pair reaches {TARGET_AGREEMENT:.0%} agreement; keep EVAL_MODE=llm")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,8 @@ from query.prompt_templates import EVAL_PROMPT
 
 CHECKPOINT_FILE = "naive_eval_results_checkpoint.json"
 FINAL_RESULT_FILE = "naive_eval_results.json"
+# Số câu hỏi mỗi lần retrieval batch; batch lỗi thì các câu trong đó retrieval riêng từng câu
+RETRIEVAL_BATCH_SIZE = 32
 
 
 # =========================
@@ -126,6 +128,23 @@ def evaluate_rag(
     answer_chain = answer_prompt | answer_llm
     eval_chain = eval_prompt | eval_llm
 
+    # ===== BATCH RETRIEVAL =====
+    # Một lần encode + một request tới Qdrant cho mỗi RETRIEVAL_BATCH_SIZE câu hỏi chưa đánh giá
+
+    pending_queries = [
+        sample["question"] for sample in eval_data
+        if sample["question"] not in done_queries
+    ]
+    logger.info(f"[BATCH RETRIEVAL] {len(pending_queries)} queries")
+    hits_by_query = {}
+    for start in range(0, len(pending_queries), RETRIEVAL_BATCH_SIZE):
+        chunk = pending_queries[start:start + RETRIEVAL_BATCH_SIZE]
+        try:
+            hits_by_query.update(zip(chunk, medical_rag.query_batch(chunk, limit=k)))
+        except Exception as e:
+            logger.error(f"[BATCH RETRIEVAL] queries {start}-{start + len(chunk) - 1} failed, "
+                         f"falling back to per-sample retrieval: {e}")
+
     # ===== MAIN LOOP =====
 
     for idx, sample in enumerate(eval_data):
@@ -144,8 +163,9 @@ def evaluate_rag(
             # ---- 1. RETRIEVAL ----
             logger.info("[STAGE 1] Retrieval")
 
-            hits = medical_rag.query(query, limit=k)
-            time.sleep(1)  # giảm áp lực Qdrant
+            hits = hits_by_query.get(query)
+            if hits is None:
+                hits = medical_rag.query(query, limit=k)
 
             retrieved_ids = [hit.id for hit in hits]
             context = "\n\n".join(hit.payload["text"] for hit in hits)
@@ -0,0 +1,141 @@
+import argparse
+import json
+import time
+import logging
+
+import numpy as np
+
+from query.medical.medical_pipeline import MedicalPipeline
+from query.planner import QueryPlanner
+from query.router.router import Router
+from query.split_query import SplitQueryHandler
+
+
+# =========================
+# CONFIG
+# =========================
+
+EVAL_FILES = [
+    "data/comparison_eval_set_fixed.json",
+    "data/comprehensive_1_drug.json",
+    "data/hybrid_eval_set_openai.json",
+]
+RESULT_FILE = "planner_benchmark_results.json"
+K = 5
+
+
+# =========================
+# LOGGING
+# =========================
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+logger = logging.getLogger("planner-benchmark")
+
+
+# =========================
+# Paths
+# =========================
+
+def multi_call_path(question: str, split_handler, router) -> dict:
+    """Split -> Router (mỗi sub-query); retrieval bằng chính sub-query y tế như MedicalQueryPipeline."""
+    started = time.perf_counter()
+    sub_queries = split_handler.split(question).queries
+    routes = [router.route(sub_query).datasource for sub_query in sub_queries]
+    return {
+        "latency_s": time.perf_counter() - started,
+        "llm_calls": 1 + len(sub_queries),
+        "sub_queries": sub_queries,
+        "routes": routes,
+        "search_queries": [q for q, route in zip(sub_queries, routes) if route == "medical_knowledge"],
+    }
+
+
+def rephrase_path(multi: dict, medical_pipeline) -> dict:
+    """multi_call + Rephrase mỗi sub-query y tế trước retrieval (dùng lại kết quả split / route)."""
+    started = time.perf_counter()
+    search_queries = [medical_pipeline.process_medical_rephrase(q) for q in multi["search_queries"]]
+    return {
+        **multi,
+        "latency_s": multi["latency_s"] + time.perf_counter() - started,
+        "llm_calls": multi["llm_calls"] + len(search_queries),
+        "search_queries": search_queries,
+    }
+
+
+def planner_path(question: str, planner) -> dict:
+    started = time.perf_counter()
+    plan = planner.plan(question)
+    return {
+        "latency_s": time.perf_counter() - started,
+        "llm_calls": 1,
+        "sub_queries": [item.question for item in plan.queries],
+        "routes": [item.datasource for item in plan.queries],
+        "search_queries": [item.search_query for item in plan.queries if item.datasource == "medical_knowledge"],
+    }
+
+
+def retrieval_recall(medical_rag, search_queries: list[str], relevant_ids: list) -> float:
+    """Tỉ lệ chunk ground truth nằm trong hợp top-K của các search query."""
+    if not relevant_ids:
+        return float("nan")
+    if not search_queries:
+        return 0.0
+    retrieved = {hit.id for hits in medical_rag.query_batch(search_queries, limit=K, with_payload=False) for hit in hits}
+    return len(retrieved & set(relevant_ids)) / len(relevant_ids)
+
+
+# =========================
+# Main
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency / quality of the planner vs the multi-call path")
+    parser.add_argument("--per-file", type=int, default=10, help="Questions sampled from each eval file")
+    args = parser.parse_args()
+
+    samples = []
+    for path in EVAL_FILES:
+        with open(path, "r", encoding="utf-8") as f:
+            samples += json.load(f)[:args.per_file]
+
+    split_handler = SplitQueryHandler(use_heuristic=False)
+    router = Router()
+    planner = QueryPlanner()
+    medical_pipeline = MedicalPipeline()
+
+    rows = []
+    for idx, sample in enumerate(samples):
+        question = sample["question"]
+        relevant = sample.get("ground_truth_chunk_ids", [])
+        logger.info(f"[{idx}] {question}")
+        multi = multi_call_path(question, split_handler, router)
+        rephrased = rephrase_path(multi, medical_pipeline)
+        plan = planner_path(question, planner)
+        for result in (multi, rephrased, plan):
+            result["recall@k"] = retrieval_recall(medical_pipeline.medical_rag, result["search_queries"], relevant)
+        rows.append({"question": question, "multi_call": multi, "multi_call_rephrase": rephrased, "planner": plan})
+
+    with open(RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+
+    print("📊 PLANNER vs MULTI-CALL")
+    for mode in ("multi_call", "multi_call_rephrase", "planner"):
+        latencies = [row[mode]["latency_s"] for row in rows]
+        print(
+            f"{mode:20s} latency avg {np.mean(latencies):.2f}s p95 {np.percentile(latencies, 95):.2f}s | "
+            f"LLM calls avg {np.mean([row[mode]['llm_calls'] for row in rows]):.2f} | "
+            f"sub-queries avg {np.mean([len(row[mode]['sub_queries']) for row in rows]):.2f} | "
+            f"recall@{K} {np.nanmean([row[mode]['recall@k'] for row in rows]):.3f}"
+        )
+    same_count = np.mean([len(row["multi_call"]["sub_queries"]) == len(row["planner"]["sub_queries"]) for row in rows])
+    same_route = np.mean([
+        set(row["multi_call"]["routes"]) == set(row["planner"]["routes"]) for row in rows
+    ])
+    print(f"same sub-query count: {same_count:.1%} | same route set: {same_route:.1%}")
+
+
+if __name__ == "__main__":
+    main()
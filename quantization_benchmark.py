@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import time
+import logging
+
+import numpy as np
+from qdrant_client import models
+
+from query.core import get_embedding_model, get_rag_client, get_quantization_search_params
+from query.core.vector_store import LocalVectorStore
+
+
+# =========================
+# CONFIG
+# =========================
+
+EVAL_FILE = "data/hybrid_eval_set_openai.json"
+RESULT_FILE = "quantization_benchmark_results.json"
+K_VALUES = (1, 5, 10, 20)
+BYTES_PER_DIM = {"none": 4.0, "int8": 1.0, "binary": 1 / 8}
+
+
+# =========================
+# LOGGING
+# =========================
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+logger = logging.getLogger("quantization-benchmark")
+
+
+# =========================
+# Metrics
+# =========================
+
+def recall_at_k(retrieved_ids: list, relevant_ids: list) -> float:
+    return float(any(rid in retrieved_ids for rid in relevant_ids))
+
+
+def summarize(name: str, hits_per_query: list[list], relevant: list[list], latencies: list[float],
+              memory_bytes: float) -> dict:
+    result = {"config": name, "memory_mb": round(memory_bytes / 2 ** 20, 2)}
+    for k in K_VALUES:
+        result[f"recall@{k}"] = round(float(np.mean([
+            recall_at_k([hit.id for hit in hits[:k]], ids) for hits, ids in zip(hits_per_query, relevant)
+        ])), 4)
+    result["latency_avg_ms"] = round(float(np.mean(latencies)) * 1000, 2)
+    result["latency_p95_ms"] = round(float(np.percentile(latencies, 95)) * 1000, 2)
+    logger.info(json.dumps(result))
+    return result
+
+
+def run(search, vectors: np.ndarray, limit: int) -> tuple[list, list]:
+    hits_per_query, latencies = [], []
+    for vector in vectors:
+        started = time.perf_counter()
+        hits_per_query.append(search(vector, limit))
+        latencies.append(time.perf_counter() - started)
+    return hits_per_query, latencies
+
+
+# =========================
+# Benchmarks
+# =========================
+
+def benchmark_local(path: str, vectors: np.ndarray, relevant: list, limit: int) -> list[dict]:
+    results = []
+    configs = [("none", 1.0, True), ("int8", 1.0, False), ("int8", 2.0, True),
+               ("binary", 2.0, True), ("binary", 4.0, True)]
+    for mode, oversampling, rescore in configs:
+        store = LocalVectorStore(path, quantization=mode, oversampling=oversampling, rescore=rescore)
+        hits, latencies = run(
+            lambda vector, n: store.search(store.collection_name, vector.tolist(), limit=n), vectors, limit,
+        )
+        name = f"local/{mode}" + (f"/x{oversampling}/{'rescore' if rescore else 'no-rescore'}" if mode != "none" else "")
+        results.append(summarize(name, hits, relevant, latencies, store.memory_bytes()))
+        store.close()
+    return results
+
+
+def benchmark_qdrant(collection_name: str, vectors: np.ndarray, relevant: list, limit: int) -> list[dict]:
+    client = get_rag_client()
+    info = client.get_collection(collection_name)
+    points = info.points_count or 0
+    dim = vectors.shape[1]
+    quantization = info.config.quantization_config
+    mode = "int8" if isinstance(quantization, models.ScalarQuantization) else \
+        "binary" if isinstance(quantization, models.BinaryQuantization) else "none"
+    if mode == "none":
+        logger.warning(f"{collection_name} has no quantization config, run python -m query.core.quantization first")
+
+    configs = [("full-precision", models.SearchParams(quantization=models.QuantizationSearchParams(ignore=True)))]
+    if mode != "none":
+        configs += [
+            (f"{mode}/x1/no-rescore", get_quantization_search_params(rescore=False, oversampling=1.0)),
+            (f"{mode}/x2/rescore", get_quantization_search_params(rescore=True, oversampling=2.0)),
+            (f"{mode}/x4/rescore", get_quantization_search_params(rescore=True, oversampling=4.0)),
+        ]
+
+    results = []
+    for name, params in configs:
+        hits, latencies = run(
+            lambda vector, n: client.search(
+                collection_name=collection_name, query_vector=vector.tolist(), limit=n, search_params=params,
+            ),
+            vectors, limit,
+        )
+        # Ước lượng RAM vector cần cho search (mã lượng tử nếu có, ngược lại float32)
+        memory = points * dim * BYTES_PER_DIM[mode if name != "full-precision" else "none"]
+        results.append(summarize(f"qdrant/{name}", hits, relevant, latencies, memory))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall / memory / latency of quantized retrieval")
+    parser.add_argument("--eval-path", default=EVAL_FILE)
+    parser.add_argument("--backend", choices=("qdrant", "local", "all"), default="all")
+    parser.add_argument("--local-path", default=os.getenv("LOCAL_INDEX_PATH", ".cache/local_index"))
+    args = parser.parse_args()
+
+    with open(args.eval_path, "r", encoding="utf-8") as f:
+        eval_data = json.load(f)
+    questions = [item["question"] for item in eval_data]
+    relevant = [item.get("ground_truth_chunk_ids", []) for item in eval_data]
+
+    embedder = get_embedding_model()
+    vectors = embedder.encode(questions, convert_to_numpy=True)
+    limit = max(K_VALUES)
+
+    results = []
+    if args.backend in ("qdrant", "all"):
+        results += benchmark_qdrant(os.getenv("COLLECTION_NAME"), vectors, relevant, limit)
+    if args.backend in ("local", "all"):
+        if os.path.exists(args.local_path):
+            results += benchmark_local(args.local_path, vectors, relevant, limit)
+        else:
+            logger.warning(f"No local snapshot at {args.local_path}, run python -m query.core.vector_store first")
+
+    with open(RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print("📊 QUANTIZATION BENCHMARK")
+    for result in results:
+        recalls = " ".join(f"R@{k}={result[f'recall@{k}']:.3f}" for k in K_VALUES)
+        print(f"{result['config']:35s} {recalls} | {result['memory_mb']:8.2f} MB | "
+              f"avg {result['latency_avg_ms']:.1f} ms p95 {result['latency_p95_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
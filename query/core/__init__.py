@@ -1,9 +1,23 @@
-__all__ = ["get_llm", "get_rag_client", "get_embedding_model", "get_cross_encoder",
-           "RouteQuery", "AnswerQuery", "RephraseQuery", "SummarizeQuery", "SplitQuery", "EvalAnswer",
+__all__ = ["get_llm", "get_rag_client", "get_async_rag_client", "get_latency_report", "get_sparse_encoder", "get_vector_store", "get_async_vector_store",
+           "LocalVectorStore", "get_quantization_search_params",
+           "ChunkTextStore", "get_chunk_store", "get_embedding_model", "get_cross_encoder",
+           "get_model_registry", "warmup_models", "unload_models", "SharedEmbeddings",
+           "MicroBatcher", "EmbeddingService", "get_embedding_service", "TTLCache", "RetrievalCache", "get_retrieval_cache",
+           "CollectionVersion", "get_collection_version",
+           "RerankEngine", "get_rerank_engine",
+           "RouteQuery", "AnswerQuery", "RephraseQuery", "SummarizeQuery", "SplitQuery", "PlannedQuery", "PlanQuery", "EvalAnswer",
            "SummaryAnswer", "FinalAnswer", "FaithfulnessEval", "LLMEvalResult"]
 
 from .llm import get_llm, HistoryManager
-from .rag import get_rag_client
-from .embedding import get_embedding_model, get_cross_encoder
+from .rag import get_rag_client, get_async_rag_client, get_latency_report
+from .embedding import get_embedding_model, get_cross_encoder, get_model_registry, warmup_models, unload_models, \
+    SharedEmbeddings
+from .sparse import get_sparse_encoder
+from .quantization import get_quantization_search_params
+from .vector_store import LocalVectorStore, get_vector_store, get_async_vector_store
+from .chunk_store import ChunkTextStore, get_chunk_store
+from .batching import MicroBatcher, EmbeddingService, get_embedding_service
+from .cache import TTLCache, RetrievalCache, get_retrieval_cache, CollectionVersion, get_collection_version
+from .reranker import RerankEngine, get_rerank_engine
 from .structure import RouteQuery, AnswerQuery, RephraseQuery, SummarizeQuery, SplitQuery, EvalAnswer, SummaryAnswer, FinalAnswer, \
-    FaithfulnessEval, LLMEvalResult
\ No newline at end of file
+    FaithfulnessEval, LLMEvalResult, PlannedQuery, PlanQuery
\ No newline at end of file
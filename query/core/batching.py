@@ -0,0 +1,187 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Đặt vào queue để dừng worker thread
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Gom các request từ nhiều caller đồng thời thành batch trong một cửa sổ thời gian ngắn,
+    chạy một lần `batch_fn` cho cả batch và trả kết quả riêng cho từng caller qua Future.
+    """
+
+    def __init__(self, batch_fn: Callable[[list], list], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        """
+        Args:
+            batch_fn: Hàm xử lý một list item, trả về list kết quả cùng thứ tự
+            max_batch_size: Số item tối đa trong một batch
+            max_wait_ms: Thời gian tối đa chờ gom thêm item sau item đầu tiên
+            name: Tên worker thread (dùng cho log)
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=1000)
+        self._latencies = deque(maxlen=1000)
+        self._total_items = 0
+        self._total_batches = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item) -> Future:
+        if self._closed:
+            raise RuntimeError(f"[{self.name}] batcher is closed")
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def submit_many(self, items: list) -> list[Future]:
+        return [self.submit(item) for item in items]
+
+    def close(self):
+        """Dừng worker thread sau khi xử lý hết các item đã nhận."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+
+    def _collect(self) -> Optional[list]:
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Xử lý nốt batch hiện tại rồi mới dừng
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            items = [item for item, _, _ in batch]
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(batch):
+                    # zip sẽ cắt bớt và để các caller còn lại chờ mãi
+                    raise ValueError(f"batch_fn returned {len(results)} results for {len(batch)} items")
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"[{self.name}] Batch of {len(batch)} failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            now = time.perf_counter()
+            with self._stats_lock:
+                self._total_batches += 1
+                self._total_items += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._latencies.extend(now - enqueued for _, _, enqueued in batch)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            latencies = list(self._latencies)
+            total_items = self._total_items
+            total_batches = self._total_batches
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            "total_items": total_items,
+            "total_batches": total_batches,
+            "avg_batch_size": float(np.mean(sizes)) if sizes else 0.0,
+            "max_batch_size": max(sizes) if sizes else 0,
+            "latency_p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else 0.0,
+            "latency_p95_ms": float(np.percentile(latencies, 95) * 1000) if latencies else 0.0,
+        }
+
+
+class EmbeddingService:
+    """
+    Embed câu query theo micro-batch: nhiều caller đồng thời chỉ tốn một lần `encode`.
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.model = model
+        self._batcher = MicroBatcher(
+            self._encode_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="embedding-service",
+        )
+
+    def _encode_batch(self, texts: list[str]) -> list[np.ndarray]:
+        vectors = self.model.encode(texts, convert_to_numpy=True, batch_size=len(texts))
+        return list(vectors)
+
+    def submit(self, text: str) -> Future:
+        return self._batcher.submit(text)
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        return self._batcher.submit(text).result(timeout=timeout)
+
+    def encode_many(self, texts: list[str], timeout: Optional[float] = None) -> list[np.ndarray]:
+        futures = self._batcher.submit_many(texts)
+        return [future.result(timeout=timeout) for future in futures]
+
+    def stats(self) -> dict:
+        return self._batcher.stats()
+
+    def close(self):
+        self._batcher.close()
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model, max_batch_size: int = 32, max_wait_ms: float = 5.0) -> EmbeddingService:
+    """
+    Trả về EmbeddingService dùng chung cho một instance model (một worker thread cho mỗi model).
+    """
+    with _services_lock:
+        service = _services.get(id(model))
+        if service is None or service.model is not model:
+            service = EmbeddingService(model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+            _services[id(model)] = service
+        return service
+
+
+def release_embedding_service(model) -> bool:
+    """Bỏ EmbeddingService của model khỏi danh sách dùng chung và dừng worker thread (khi unload model)."""
+    with _services_lock:
+        service = _services.get(id(model))
+        if service is None or service.model is not model:
+            return False
+        del _services[id(model)]
+    service.close()
+    return True
@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache LRU thread-safe, có thể kèm TTL (giây) cho từng entry.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """
+        Args:
+            max_size: Số entry tối đa, vượt quá sẽ loại entry ít dùng nhất
+            ttl: Thời gian sống của entry (giây), None để không hết hạn
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """
+        Xóa các entry có key thỏa predicate (None để xóa toàn bộ).
+
+        Returns:
+            int: Số entry đã bị xóa
+        """
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class CollectionVersion:
+    """
+    Version của collection, chia sẻ giữa các process qua file marker
+    (một file mỗi collection trong thư mục dùng chung). Pipeline ingestion gọi bump()
+    sau khi re-index; các worker đọc lại marker tối đa mỗi `check_interval` giây nên
+    cache retrieval / chunk text tự hết hiệu lực mà không cần restart.
+    Các worker phải dùng chung CACHE_VERSION_DIR (cùng máy hoặc volume chung);
+    nếu không, phải restart worker sau khi ingest.
+    """
+
+    def __init__(self, directory: str, check_interval: float = 5.0):
+        """
+        Args:
+            directory: Thư mục chứa file marker
+            check_interval: Số giây tối đa giữa hai lần đọc lại marker
+        """
+        self.directory = directory
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._versions = {}  # collection -> (version, checked_at)
+
+    def _path(self, collection_name: str) -> str:
+        return os.path.join(self.directory, f"{collection_name}.version")
+
+    def current(self, collection_name: str) -> str:
+        """Version hiện tại ("" nếu collection chưa từng được re-index)."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(collection_name)
+            if cached is not None and now - cached[1] < self.check_interval:
+                return cached[0]
+        try:
+            with open(self._path(collection_name), "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            version = ""
+        with self._lock:
+            self._versions[collection_name] = (version, now)
+        return version
+
+    def bump(self, collection_name: str) -> str:
+        """Ghi version mới (atomic) để mọi process bỏ cache cũ của collection."""
+        version = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(collection_name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._versions[collection_name] = (version, time.monotonic())
+        logger.info(f"Collection {collection_name} version bumped to {version}")
+        return version
+
+
+_collection_version = None
+_collection_version_lock = threading.Lock()
+
+
+def get_collection_version() -> CollectionVersion:
+    """Trả về CollectionVersion dùng chung (CACHE_VERSION_DIR / CACHE_VERSION_CHECK_INTERVAL)."""
+    global _collection_version
+    with _collection_version_lock:
+        if _collection_version is None:
+            _collection_version = CollectionVersion(
+                directory=os.getenv("CACHE_VERSION_DIR", ".cache/collection_versions"),
+                check_interval=float(os.getenv("CACHE_VERSION_CHECK_INTERVAL", "5")),
+            )
+        return _collection_version
+
+
+def normalize_query(query: str) -> str:
+    """Chuẩn hóa câu hỏi để các biến thể khác hoa/thường, khoảng trắng dùng chung cache."""
+    query = unicodedata.normalize("NFC", query).lower()
+    return " ".join(query.split()).strip(" ?.!")
+
+
+class RetrievalCache:
+    """
+    Cache kết quả retrieval theo (câu hỏi chuẩn hóa, collection, tham số limit).
+    Kết hợp LRU + TTL; khóa chứa version của collection (CollectionVersion) nên sau khi
+    re-index ở process khác, kết quả cũ không còn được dùng và bị LRU loại dần.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: Optional[float] = 3600,
+                 versions: Optional[CollectionVersion] = None):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self.versions = versions
+
+    def make_key(self, query: str, collection_name: str, *params) -> tuple:
+        version = self.versions.current(collection_name) if self.versions is not None else ""
+        return (collection_name, version, normalize_query(query)) + tuple(params)
+
+    def get(self, key: tuple):
+        return self._cache.get(key)
+
+    def put(self, key: tuple, hits):
+        self._cache.put(key, list(hits))
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], list]):
+        hits = self._cache.get(key)
+        if hits is None:
+            hits = compute()
+            self._cache.put(key, list(hits))
+        return hits
+
+    def invalidate_collection(self, collection_name: str) -> int:
+        """Xóa toàn bộ kết quả của một collection trong process hiện tại."""
+        removed = self._cache.invalidate(lambda key: key[0] == collection_name)
+        logger.info(f"Invalidated {removed} retrieval cache entries for collection {collection_name}")
+        return removed
+
+    def clear(self) -> int:
+        return self._cache.invalidate()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+_retrieval_cache = None
+_retrieval_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Trả về RetrievalCache dùng chung trong process (cấu hình qua RETRIEVAL_CACHE_SIZE / RETRIEVAL_CACHE_TTL)."""
+    global _retrieval_cache
+    with _retrieval_cache_lock:
+        if _retrieval_cache is None:
+            _retrieval_cache = RetrievalCache(
+                max_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048")),
+                ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")),
+                versions=get_collection_version(),
+            )
+        return _retrieval_cache
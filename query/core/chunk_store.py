@@ -0,0 +1,146 @@
+import os
+import threading
+from typing import Optional, Union
+
+from .cache import TTLCache, CollectionVersion, get_collection_version
+from .vector_store import get_vector_store
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Giá trị with_payload của Qdrant: True (toàn bộ), False (chỉ id + score) hoặc danh sách trường
+PayloadSelector = Union[bool, list[str]]
+
+PAYLOAD_ALL = True
+PAYLOAD_IDS_ONLY = False
+
+
+def payload_key(with_payload: PayloadSelector) -> tuple:
+    """Khóa hashable của payload selector, dùng trong khóa retrieval cache."""
+    if isinstance(with_payload, bool):
+        return (with_payload,)
+    return tuple(sorted(with_payload))
+
+
+class ChunkTextStore:
+    """
+    Lấy payload chunk theo id (lazy), chỉ cho các hit thực sự được dùng.
+    - Gom các id còn thiếu thành một lời gọi retrieve
+    - Payload được cache LRU theo point id nên chunk phổ biến chỉ tải một lần
+    - Cache bị xóa khi version của collection đổi (re-index ở process khác)
+    """
+
+    def __init__(self, client, collection_name: str, fields: tuple = ("text",), cache_size: int = 10000,
+                 versions: Optional[CollectionVersion] = None):
+        """
+        Args:
+            client: Qdrant client hoặc LocalVectorStore (có method retrieve)
+            collection_name: Tên collection
+            fields: Các trường payload cần lấy
+            cache_size: Số chunk tối đa giữ trong cache
+            versions: Version của collection dùng chung giữa các process
+        """
+        self.client = client
+        self.collection_name = collection_name
+        self.fields = list(fields)
+        self.cache = TTLCache(max_size=cache_size)
+        self.versions = versions
+        self._version = versions.current(collection_name) if versions is not None else ""
+        self._version_lock = threading.Lock()
+
+    def _check_version(self):
+        if self.versions is None:
+            return
+        version = self.versions.current(self.collection_name)
+        with self._version_lock:
+            if version == self._version:
+                return
+            self._version = version
+        removed = self.cache.invalidate()
+        logger.info(f"Collection {self.collection_name} re-indexed, dropped {removed} cached chunk payloads")
+
+    def fetch(self, ids: list) -> dict:
+        """
+        Trả về {point id: payload} cho các id, chỉ gọi retrieve cho các id chưa có trong cache.
+        """
+        self._check_version()
+        payloads = {}
+        missing = []
+        for point_id in dict.fromkeys(ids):
+            payload = self.cache.get(point_id)
+            if payload is None:
+                missing.append(point_id)
+            else:
+                payloads[point_id] = payload
+
+        if missing:
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=missing,
+                with_payload=self.fields,
+                with_vectors=False,
+            )
+            for point in points:
+                payload = point.payload or {}
+                self.cache.put(point.id, payload)
+                payloads[point.id] = payload
+            logger.debug(f"Chunk store: fetched {len(missing)}/{len(payloads)} payloads")
+        return payloads
+
+    def hydrate(self, hits: list) -> list:
+        """
+        Gắn payload cho các hit được trả về không kèm payload (hoặc thiếu trường cần dùng).
+        Trả về bản sao các hit, không sửa object nằm trong retrieval cache. Hit vẫn thiếu payload
+        sau khi retrieve (point đã bị xóa giữa search và retrieve) bị bỏ.
+        """
+        missing = [hit.id for hit in hits if not self._complete(hit.payload)]
+        if not missing:
+            return list(hits)
+
+        payloads = self.fetch(missing)
+        hydrated = []
+        for hit in hits:
+            if hit.id in payloads:
+                payload = {**(hit.payload or {}), **payloads[hit.id]}
+                hit = hit.model_copy(update={"payload": payload})
+            if self._complete(hit.payload):
+                hydrated.append(hit)
+        if len(hydrated) < len(hits):
+            logger.warning(f"Chunk store: dropped {len(hits) - len(hydrated)} hits without payload")
+        return hydrated
+
+    def _complete(self, payload: Optional[dict]) -> bool:
+        return bool(payload) and all(f in payload for f in self.fields)
+
+    def texts(self, hits: list, field: str = "text") -> list[str]:
+        return [hit.payload.get(field, "") for hit in self.hydrate(hits)]
+
+    def invalidate(self, ids: Optional[list] = None) -> int:
+        if ids is None:
+            return self.cache.invalidate()
+        ids = set(ids)
+        return self.cache.invalidate(lambda point_id: point_id in ids)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+_chunk_stores = {}
+_chunk_stores_lock = threading.Lock()
+
+
+def get_chunk_store(collection_name: Optional[str] = None) -> ChunkTextStore:
+    """Trả về ChunkTextStore dùng chung cho một collection (CHUNK_TEXT_CACHE_SIZE)."""
+    collection_name = collection_name or os.getenv("COLLECTION_NAME")
+    with _chunk_stores_lock:
+        store = _chunk_stores.get(collection_name)
+        if store is None:
+            store = ChunkTextStore(
+                get_vector_store(),
+                collection_name,
+                cache_size=int(os.getenv("CHUNK_TEXT_CACHE_SIZE", "10000")),
+                versions=get_collection_version(),
+            )
+            _chunk_stores[collection_name] = store
+        return store
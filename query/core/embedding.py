@@ -1,13 +1,161 @@
+import threading
+from typing import Optional
+
 from sentence_transformers import SentenceTransformer
 from sentence_transformers import CrossEncoder
+from langchain_core.embeddings import Embeddings
+
+from .batching import release_embedding_service
+from .reranker import release_rerank_engine
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Registry dùng chung trong process cho các model embedding / rerank.
+    Mỗi model chỉ được load một lần theo khóa (kind, model_name, device, max_length),
+    các component khác nhau sẽ nhận lại cùng một instance.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _get_or_load(self, key: tuple, loader):
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        # Lock riêng cho từng khóa để hai model khác nhau có thể load song song
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            model = self._models.get(key)
+            if model is None:
+                logger.info(f"Loading model {key}")
+                model = loader()
+                self._models[key] = model
+            return model
+
+    def get_embedding_model(self, model_name: str, device: Optional[str] = None,
+                            max_length: Optional[int] = None) -> SentenceTransformer:
+        key = ("embedding", model_name, device, max_length)
+
+        def loader():
+            model = SentenceTransformer(model_name, device=device)
+            if max_length is not None:
+                model.max_seq_length = max_length
+            return model
+
+        return self._get_or_load(key, loader)
+
+    def get_cross_encoder(self, model_name: str, device: Optional[str] = None,
+                          max_length: int = 512) -> CrossEncoder:
+        key = ("cross_encoder", model_name, device, max_length)
+
+        def loader():
+            return CrossEncoder(
+                model_name,
+                max_length=max_length,
+                device=device,
+                trust_remote_code=True
+            )
+
+        return self._get_or_load(key, loader)
+
+    def get_sparse_model(self, model_name: str):
+        key = ("sparse", model_name, None, None)
+
+        def loader():
+            from fastembed import SparseTextEmbedding
+            # Tiếng Việt không có snowball stemmer nên tắt stemmer, giữ nguyên token
+            return SparseTextEmbedding(model_name=model_name, disable_stemmer=True)
+
+        return self._get_or_load(key, loader)
+
+    def unload(self, model_name: Optional[str] = None) -> int:
+        """
+        Giải phóng model khỏi registry.
+
+        Args:
+            model_name: Tên model cần giải phóng, None để giải phóng toàn bộ
+
+        Returns:
+            int: Số model đã được giải phóng
+        """
+        with self._lock:
+            keys = [key for key in self._models if model_name is None or key[1] == model_name]
+            models = [self._models.pop(key) for key in keys]
+            for key in keys:
+                self._key_locks.pop(key, None)
+
+        # EmbeddingService / RerankEngine dùng chung giữ tham chiếu tới model (và worker thread),
+        # phải bỏ chúng thì model mới được giải phóng
+        for model in models:
+            release_embedding_service(model)
+            release_rerank_engine(model)
+
+        if keys:
+            logger.info(f"Unloaded {len(keys)} model(s)")
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+        return len(keys)
+
+    def loaded_models(self) -> list[tuple]:
+        with self._lock:
+            return list(self._models.keys())
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    return _registry
+
+
+def get_embedding_model(model_name: str="AITeamVN/Vietnamese_Embedding_v2", device: Optional[str] = None,
+                        max_length: Optional[int] = None):
+    return _registry.get_embedding_model(model_name, device=device, max_length=max_length)
+
+def get_cross_encoder(model_name: str="BAAI/bge-reranker-v2-m3", max_length: int=512, device: Optional[str] = None):
+    return _registry.get_cross_encoder(model_name, device=device, max_length=max_length)
+
+def warmup_models(with_reranker: bool = False, device: Optional[str] = None):
+    """
+    Load trước các model khi khởi động worker để request đầu tiên không phải chờ.
+
+    Args:
+        with_reranker: Có load cả cross-encoder hay không
+        device: Thiết bị chạy model (None để tự chọn)
+    """
+    embedder = get_embedding_model(device=device)
+    embedder.encode(["warmup"], convert_to_numpy=True)
+    if with_reranker:
+        reranker = get_cross_encoder(device=device)
+        reranker.predict([("warmup", "warmup")], show_progress_bar=False)
+
+def unload_models(model_name: Optional[str] = None) -> int:
+    return _registry.unload(model_name)
+
+
+class SharedEmbeddings(Embeddings):
+    """Adapter LangChain Embeddings dùng SentenceTransformer lấy từ registry."""
 
+    def __init__(self, model_name: str = "AITeamVN/Vietnamese_Embedding_v2", device: Optional[str] = None,
+                 max_length: Optional[int] = None):
+        self.model = get_embedding_model(model_name, device=device, max_length=max_length)
 
-def get_embedding_model(model_name: str="AITeamVN/Vietnamese_Embedding_v2"):
-    return SentenceTransformer(model_name)
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.model.encode(texts, convert_to_numpy=True).tolist()
 
-def get_cross_encoder(model_name: str="BAAI/bge-reranker-v2-m3", max_length: int=512):
-    return CrossEncoder(
-            model_name,
-            max_length=max_length,
-            trust_remote_code=True
-        )
\ No newline at end of file
+    def embed_query(self, text: str) -> list[float]:
+        return self.model.encode([text], convert_to_numpy=True).tolist()[0]
@@ -0,0 +1,138 @@
+import os
+from typing import Optional
+
+import numpy as np
+from qdrant_client import models
+
+from .rag import get_rag_client
+from .sparse import DENSE_VECTOR_NAME
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Bảng đếm bit cho từng giá trị byte, dùng tính khoảng cách Hamming
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def get_quantization_search_params(rescore: Optional[bool] = None,
+                                   oversampling: Optional[float] = None) -> Optional[models.SearchParams]:
+    """
+    SearchParams cho collection đã bật quantization: search trên vector lượng tử,
+    lấy dư (oversampling) ứng viên rồi chấm lại bằng vector float32 gốc.
+    Mặc định đọc QUANTIZATION_RESCORE / QUANTIZATION_OVERSAMPLING, trả về None nếu không cấu hình.
+    """
+    if oversampling is None:
+        env_oversampling = os.getenv("QUANTIZATION_OVERSAMPLING")
+        if env_oversampling is None and rescore is None:
+            return None
+        oversampling = float(env_oversampling or "2.0")
+    if rescore is None:
+        rescore = os.getenv("QUANTIZATION_RESCORE", "true").lower() in ("1", "true", "yes")
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(ignore=False, rescore=rescore, oversampling=oversampling)
+    )
+
+
+def quantization_config(mode: str, always_ram: bool = True, quantile: float = 0.99):
+    if mode == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=quantile, always_ram=always_ram,
+            )
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=always_ram))
+    if mode == "none":
+        return models.Disabled.DISABLED
+    raise ValueError(f"Unknown quantization mode: {mode} (expected one of {QUANTIZATION_MODES})")
+
+
+def enable_quantization(mode: str = "int8", collection_name: Optional[str] = None, always_ram: bool = True,
+                        on_disk_vectors: bool = True):
+    """
+    Bật quantization cho collection Qdrant: vector lượng tử giữ trong RAM,
+    vector float32 gốc chuyển xuống đĩa và chỉ dùng để rescore.
+
+    Args:
+        mode: "int8", "binary" hoặc "none" để tắt
+        collection_name: Tên collection (mặc định COLLECTION_NAME)
+        always_ram: Giữ vector lượng tử trong RAM
+        on_disk_vectors: Chuyển vector float32 gốc xuống đĩa
+    """
+    collection_name = collection_name or os.getenv("COLLECTION_NAME")
+    client = get_rag_client()
+    vectors_config = None
+    if on_disk_vectors and mode != "none":
+        vectors_config = {DENSE_VECTOR_NAME or "": models.VectorParamsDiff(on_disk=True)}
+    client.update_collection(
+        collection_name=collection_name,
+        quantization_config=quantization_config(mode, always_ram=always_ram),
+        vectors_config=vectors_config,
+    )
+    logger.info(f"Quantization {mode} enabled on {collection_name}")
+
+
+class VectorQuantizer:
+    """
+    Lượng tử hóa vector (đã chuẩn hóa) cho LocalVectorStore.
+    - int8: lượng tử đối xứng theo quantile, 4x nhỏ hơn float32
+    - binary: 1 bit / chiều (dấu), 32x nhỏ hơn, chấm bằng khoảng cách Hamming
+    """
+
+    def __init__(self, mode: str, quantile: float = 0.99):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode} (expected one of {QUANTIZATION_MODES})")
+        self.mode = mode
+        self.quantile = quantile
+        self.scale = 1.0
+        self.dim = 0
+        self.codes = None
+
+    def fit(self, vectors: np.ndarray, block_size: int = 4096) -> "VectorQuantizer":
+        if self.mode == "none":
+            return self
+        self.dim = vectors.shape[1]
+        if self.mode == "int8":
+            sample = np.abs(np.asarray(vectors[:block_size * 4], dtype=np.float32))
+            self.scale = float(np.quantile(sample, self.quantile)) / 127 or 1.0
+
+        # Lượng tử theo block để không phải nạp toàn bộ memmap float32 vào RAM
+        blocks = []
+        for start in range(0, len(vectors), block_size):
+            blocks.append(self.encode(np.asarray(vectors[start:start + block_size], dtype=np.float32)))
+        self.codes = np.concatenate(blocks) if blocks else np.empty((0, 0), dtype=np.int8)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.mode == "int8":
+            return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+        return np.packbits(vectors > 0, axis=-1)
+
+    def scores(self, queries: np.ndarray, block_size: int = 4096) -> np.ndarray:
+        """Cosine xấp xỉ giữa các query (đã chuẩn hóa) và toàn bộ vector đã lượng tử."""
+        results = []
+        if self.mode == "int8":
+            query_codes = self.encode(queries).astype(np.float32)
+            for start in range(0, len(self.codes), block_size):
+                block = self.codes[start:start + block_size].T.astype(np.float32)
+                results.append((query_codes @ block) * self.scale ** 2)
+        else:
+            query_bits = self.encode(queries)
+            for start in range(0, len(self.codes), block_size):
+                block = self.codes[start:start + block_size]
+                hamming = _POPCOUNT[np.bitwise_xor(query_bits[:, None, :], block[None, :, :])].sum(axis=-1, dtype=np.int32)
+                results.append(1.0 - 2.0 * hamming.astype(np.float32) / self.dim)
+        return np.concatenate(results, axis=1)
+
+    def nbytes(self) -> int:
+        return 0 if self.codes is None else int(self.codes.nbytes)
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    enable_quantization(sys.argv[1] if len(sys.argv) > 1 else "int8")
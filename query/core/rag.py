@@ -1,15 +1,215 @@
+import asyncio
 import os
-from xmlrpc import client
-from qdrant_client import QdrantClient, models
+import random
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+from grpc import RpcError
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
 from dotenv import load_dotenv
 
+import logging
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
+# Các method được đo latency / retry; các method này đều nhận tham số collection_name
+INSTRUMENTED_METHODS = {
+    "search", "search_batch", "query_points", "query_batch_points",
+    "retrieve", "scroll", "count", "upsert", "update_vectors", "set_payload",
+}
+# Các method nhận tham số timeout theo từng lời gọi
+TIMEOUT_METHODS = {"search", "search_batch", "query_points", "query_batch_points", "retrieve", "scroll", "count"}
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+class LatencyHistogram:
+    """Histogram latency theo (collection, method)."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: [0] * len(self.buckets))
+        self._sums = defaultdict(float)
+        self._errors = defaultdict(int)
+
+    def observe(self, collection: str, method: str, elapsed_ms: float, error: bool = False):
+        key = (collection, method)
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if elapsed_ms <= bound:
+                    self._counts[key][i] += 1
+                    break
+            self._sums[key] += elapsed_ms
+            if error:
+                self._errors[key] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            report = {}
+            for (collection, method), counts in self._counts.items():
+                total = sum(counts)
+                report.setdefault(collection, {})[method] = {
+                    "count": total,
+                    "errors": self._errors[(collection, method)],
+                    "avg_ms": self._sums[(collection, method)] / total if total else 0.0,
+                    "buckets": {f"le_{bound}": count for bound, count in zip(self.buckets, counts)},
+                }
+            return report
+
+
+latency_histogram = LatencyHistogram()
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code is None or error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (ResponseHandlingException, httpx.TransportError, RpcError, TimeoutError))
+
+
+class _ClientProxyBase:
+    def __init__(self, client, retries: int, backoff: float, call_timeout: Optional[int]):
+        self._client = client
+        self.retries = retries
+        self.backoff = backoff
+        self.call_timeout = call_timeout
+
+    def _prepare(self, name: str, args: tuple, kwargs: dict) -> str:
+        if name in TIMEOUT_METHODS and self.call_timeout is not None:
+            kwargs.setdefault("timeout", self.call_timeout)
+        return kwargs.get("collection_name") or (args[0] if args else "")
+
+    def _delay(self, attempt: int) -> float:
+        # Exponential backoff + jitter
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class QdrantClientProxy(_ClientProxyBase):
+    """
+    Bọc QdrantClient: thêm timeout mặc định cho từng lời gọi, retry với backoff
+    cho lỗi tạm thời và ghi latency theo collection.
+    """
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in INSTRUMENTED_METHODS or not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            collection = self._prepare(name, args, kwargs)
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                try:
+                    result = attr(*args, **kwargs)
+                    latency_histogram.observe(collection, name, (time.perf_counter() - started) * 1000)
+                    return result
+                except Exception as e:
+                    latency_histogram.observe(collection, name, (time.perf_counter() - started) * 1000, error=True)
+                    if attempt >= self.retries or not _is_retryable(e):
+                        raise
+                    delay = self._delay(attempt)
+                    logger.warning(f"Qdrant {name} on {collection} failed ({e}), retry in {delay:.2f}s")
+                    time.sleep(delay)
+
+        return wrapper
+
+
+class AsyncQdrantClientProxy(_ClientProxyBase):
+    """Phiên bản async của QdrantClientProxy cho AsyncQdrantClient."""
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in INSTRUMENTED_METHODS or not callable(attr):
+            return attr
+
+        async def wrapper(*args, **kwargs):
+            collection = self._prepare(name, args, kwargs)
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                try:
+                    result = await attr(*args, **kwargs)
+                    latency_histogram.observe(collection, name, (time.perf_counter() - started) * 1000)
+                    return result
+                except Exception as e:
+                    latency_histogram.observe(collection, name, (time.perf_counter() - started) * 1000, error=True)
+                    if attempt >= self.retries or not _is_retryable(e):
+                        raise
+                    delay = self._delay(attempt)
+                    logger.warning(f"Qdrant {name} on {collection} failed ({e}), retry in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+        return wrapper
+
+
+def _env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def _client_options() -> dict:
+    """
+    Cấu hình client từ biến môi trường:
+    QDRANT_PREFER_GRPC, QDRANT_GRPC_PORT, QDRANT_HTTP2, QDRANT_TIMEOUT, QDRANT_MAX_CONNECTIONS
+    """
+    max_connections = int(os.getenv("QDRANT_MAX_CONNECTIONS", "20"))
+    return dict(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY"),
+        timeout=int(os.getenv("QDRANT_TIMEOUT", "60")),
+        prefer_grpc=_env_flag("QDRANT_PREFER_GRPC"),
+        grpc_port=int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+        http2=_env_flag("QDRANT_HTTP2"),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+
+
+def _proxy_options() -> dict:
+    call_timeout = os.getenv("QDRANT_CALL_TIMEOUT")
+    return dict(
+        retries=int(os.getenv("QDRANT_RETRIES", "2")),
+        backoff=float(os.getenv("QDRANT_RETRY_BACKOFF", "0.2")),
+        call_timeout=int(call_timeout) if call_timeout else None,
+    )
+
+
+_client = None
+# AsyncQdrantClient (httpx / grpc channel) gắn với event loop tạo ra nó -> mỗi loop một client,
+# tự bỏ khi loop bị thu hồi (mỗi lần asyncio.run() là một loop mới)
+_async_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+
+
 def get_rag_client():
-    client = QdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"), timeout=60)
-    return client
+    """Trả về Qdrant client dùng chung trong process (giữ connection pool giữa các lời gọi)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = QdrantClientProxy(QdrantClient(**_client_options()), **_proxy_options())
+        return _client
+
+def get_async_rag_client():
+    """Trả về AsyncQdrantClient dùng chung cho event loop đang chạy (phải gọi bên trong coroutine)."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = AsyncQdrantClientProxy(AsyncQdrantClient(**_client_options()), **_proxy_options())
+            _async_clients[loop] = client
+        return client
+
+def get_latency_report() -> dict:
+    return latency_histogram.report()
 
 if __name__ == "__main__":
     rag_client = get_rag_client()
-    
-    print(rag_client.get_collections()) 
\ No newline at end of file
+
+    print(rag_client.get_collections())
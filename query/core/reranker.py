@@ -0,0 +1,160 @@
+import hashlib
+import threading
+from typing import Optional
+
+from .batching import MicroBatcher
+from .cache import TTLCache, CollectionVersion, get_collection_version
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _query_hash(query: str) -> str:
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+
+class RerankEngine:
+    """
+    Chấm điểm các cặp (query, chunk) bằng cross-encoder theo batch.
+    - Các cặp từ nhiều query đồng thời được gom chung một batch (MicroBatcher)
+    - Trong batch, các cặp được sắp theo độ dài token để giảm padding
+    - Điểm được cache theo (collection, version, hash query, point id) để các lần retry không phải
+      chấm lại; sau khi re-index (version đổi) điểm cũ không còn được dùng
+    """
+
+    def __init__(self, reranker, batch_size: int = 16, max_batch_pairs: int = 64,
+                 max_wait_ms: float = 5.0, cache_size: int = 10000,
+                 versions: Optional[CollectionVersion] = None):
+        """
+        Args:
+            reranker: CrossEncoder
+            batch_size: Số cặp trong một forward pass của cross-encoder
+            max_batch_pairs: Số cặp tối đa gom từ các caller vào một lần chấm
+            max_wait_ms: Thời gian chờ gom thêm cặp từ caller khác
+            cache_size: Số điểm tối đa giữ trong cache
+            versions: Version của collection dùng chung giữa các process
+        """
+        self.reranker = reranker
+        self.batch_size = batch_size
+        self.score_cache = TTLCache(max_size=cache_size)
+        self.versions = versions
+        self._batcher = MicroBatcher(
+            self._score_batch,
+            max_batch_size=max_batch_pairs,
+            max_wait_ms=max_wait_ms,
+            name="rerank-engine",
+        )
+
+    def _pair_length(self, pair: tuple[str, str]) -> int:
+        tokenizer = getattr(self.reranker, "tokenizer", None)
+        if tokenizer is not None:
+            try:
+                return len(tokenizer(pair[0], pair[1], truncation=True)["input_ids"])
+            except Exception:
+                pass
+        return len(pair[0]) + len(pair[1])
+
+    def _score_batch(self, pairs: list[tuple[str, str]]) -> list[float]:
+        # Sắp theo độ dài để các batch con có độ dài gần nhau -> ít padding
+        order = sorted(range(len(pairs)), key=lambda i: self._pair_length(pairs[i]))
+        sorted_scores = self.reranker.predict(
+            [pairs[i] for i in order],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+
+        scores = [0.0] * len(pairs)
+        for position, index in enumerate(order):
+            scores[index] = float(sorted_scores[position])
+        return scores
+
+    def score_pairs(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """Chấm điểm các cặp (không dùng cache)."""
+        futures = self._batcher.submit_many(pairs)
+        return [future.result() for future in futures]
+
+    def score(self, query: str, hits, collection_name: str = "") -> list[float]:
+        """
+        Chấm điểm các hit của Qdrant cho một query, dùng cache theo (collection, version, hash query, point id).
+
+        Args:
+            query: Câu hỏi
+            hits: Danh sách ScoredPoint có payload["text"]
+            collection_name: Collection chứa các hit (để bỏ điểm cũ khi collection được re-index)
+
+        Returns:
+            list[float]: Điểm cross-encoder theo đúng thứ tự hits
+        """
+        return self.score_many([(query, hits)], collection_name=collection_name)[0]
+
+    def score_many(self, requests: list[tuple[str, list]], collection_name: str = "") -> list[list[float]]:
+        """
+        Chấm điểm cho nhiều query cùng lúc: tất cả các cặp được gửi trước rồi mới chờ,
+        nên chúng được gom chung batch.
+
+        Args:
+            requests: Danh sách (query, hits)
+            collection_name: Collection chứa các hit
+
+        Returns:
+            list[list[float]]: Điểm cho từng query theo đúng thứ tự hits
+        """
+        version = self.versions.current(collection_name) if self.versions is not None and collection_name else ""
+        all_scores = []
+        pending = []
+        for request_index, (query, hits) in enumerate(requests):
+            query_hash = _query_hash(query)
+            scores = [None] * len(hits)
+            for i, hit in enumerate(hits):
+                cache_key = (collection_name, version, query_hash, hit.id)
+                cached = self.score_cache.get(cache_key)
+                if cached is not None:
+                    scores[i] = cached
+                else:
+                    future = self._batcher.submit((query, hit.payload["text"]))
+                    pending.append((request_index, i, cache_key, future))
+            all_scores.append(scores)
+
+        for request_index, i, cache_key, future in pending:
+            all_scores[request_index][i] = future.result()
+            self.score_cache.put(cache_key, all_scores[request_index][i])
+
+        total = sum(len(hits) for _, hits in requests)
+        if len(pending) < total:
+            logger.info(f"Rerank cache: {total - len(pending)}/{total} pairs reused")
+        return all_scores
+
+    def stats(self) -> dict:
+        return {
+            "batching": self._batcher.stats(),
+            "cache": self.score_cache.stats(),
+        }
+
+    def close(self):
+        self._batcher.close()
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_rerank_engine(reranker, batch_size: int = 16) -> RerankEngine:
+    """Trả về RerankEngine dùng chung cho một instance cross-encoder."""
+    with _engines_lock:
+        engine = _engines.get(id(reranker))
+        if engine is None or engine.reranker is not reranker:
+            engine = RerankEngine(reranker, batch_size=batch_size, versions=get_collection_version())
+            _engines[id(reranker)] = engine
+        return engine
+
+
+def release_rerank_engine(reranker) -> bool:
+    """Bỏ RerankEngine của cross-encoder khỏi danh sách dùng chung và dừng worker thread (khi unload model)."""
+    with _engines_lock:
+        engine = _engines.get(id(reranker))
+        if engine is None or engine.reranker is not reranker:
+            return False
+        del _engines[id(reranker)]
+    engine.close()
+    return True
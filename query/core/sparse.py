@@ -0,0 +1,101 @@
+import os
+from typing import Optional
+
+from qdrant_client import models
+
+from .embedding import get_model_registry
+from .rag import get_rag_client
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+SPARSE_MODEL_NAME = os.getenv("SPARSE_MODEL_NAME", "Qdrant/bm25")
+# Tên vector trong collection; dense mặc định là vector không tên ("")
+DENSE_VECTOR_NAME = os.getenv("DENSE_VECTOR_NAME") or None
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "bm25")
+
+
+def get_sparse_encoder(model_name: str = SPARSE_MODEL_NAME):
+    """Encoder BM25 (fastembed) dùng chung trong process."""
+    return get_model_registry().get_sparse_model(model_name)
+
+
+def to_sparse_vector(embedding) -> models.SparseVector:
+    return models.SparseVector(indices=embedding.indices.tolist(), values=embedding.values.tolist())
+
+
+def encode_sparse_query(encoder, query: str) -> models.SparseVector:
+    return to_sparse_vector(next(iter(encoder.query_embed(query))))
+
+
+def encode_sparse_documents(encoder, texts: list[str], batch_size: int = 256) -> list[models.SparseVector]:
+    return [to_sparse_vector(embedding) for embedding in encoder.embed(texts, batch_size=batch_size)]
+
+
+def ensure_sparse_vector_config(client, collection_name: str, vector_name: str = SPARSE_VECTOR_NAME):
+    """Thêm cấu hình sparse vector (IDF tính phía Qdrant) vào collection nếu chưa có."""
+    info = client.get_collection(collection_name)
+    sparse_config = info.config.params.sparse_vectors or {}
+    if vector_name in sparse_config:
+        return
+    try:
+        client.update_collection(
+            collection_name=collection_name,
+            sparse_vectors_config={vector_name: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+        )
+    except Exception as e:
+        raise RuntimeError(
+            f"Collection {collection_name} has no sparse vector '{vector_name}' and it cannot be added in place; "
+            f"re-create the collection with sparse_vectors_config ({e})"
+        )
+
+
+def index_sparse_vectors(collection_name: Optional[str] = None, batch_size: int = 256,
+                         text_field: str = "text") -> int:
+    """
+    Tính BM25 sparse vector cho toàn bộ chunk trong collection và ghi cạnh dense vector.
+
+    Args:
+        collection_name: Tên collection (mặc định COLLECTION_NAME)
+        batch_size: Số điểm xử lý mỗi lần scroll / update
+        text_field: Trường payload chứa text của chunk
+
+    Returns:
+        int: Số điểm đã được index
+    """
+    collection_name = collection_name or os.getenv("COLLECTION_NAME")
+    client = get_rag_client()
+    encoder = get_sparse_encoder()
+    ensure_sparse_vector_config(client, collection_name)
+
+    indexed = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=[text_field],
+            with_vectors=False,
+        )
+        if not points:
+            break
+        vectors = encode_sparse_documents(encoder, [p.payload[text_field] for p in points], batch_size)
+        client.update_vectors(
+            collection_name=collection_name,
+            points=[
+                models.PointVectors(id=point.id, vector={SPARSE_VECTOR_NAME: vector})
+                for point, vector in zip(points, vectors)
+            ],
+        )
+        indexed += len(points)
+        logger.info(f"Indexed sparse vectors for {indexed} points")
+        if offset is None:
+            break
+    return indexed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Indexed {index_sparse_vectors()} points")
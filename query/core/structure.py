@@ -32,6 +32,22 @@ class SplitQuery(BaseModel):
     queries: list[str] = Field(..., description="List of K sub-queries split from the original query")
     reasoning: str = Field(..., description="Brief explanation of why the query was split this way")
 
+class PlannedQuery(BaseModel):
+    """One sub-query of a query plan."""
+
+    question: str = Field(..., description="Self-contained sub-question in the user's wording")
+    datasource: Literal["medical_knowledge", "store_database"] = Field(
+        ...,
+        description="Route to store_database for sales-related queries or medical_knowledge for medical queries",
+    )
+    search_query: str = Field(..., description="Retrieval-optimized rephrasing of the sub-question with key drug names and terms")
+
+class PlanQuery(BaseModel):
+    """Split, route and rephrase a user query in a single step."""
+
+    queries: list[PlannedQuery] = Field(..., description="List of 1 to 3 planned sub-queries")
+    reasoning: str = Field(..., description="Brief explanation of the plan")
+
 class EvalAnswer(BaseModel):
     """Evaluate the quality of an answer."""
 
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import mmap
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+from qdrant_client.http.models import ScoredPoint
+
+from .rag import get_rag_client, get_async_rag_client
+from .sparse import DENSE_VECTOR_NAME
+from .quantization import VectorQuantizer
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+PAYLOADS_FILE = "payloads.jsonl"
+OFFSETS_FILE = "payload_offsets.npy"
+META_FILE = "meta.json"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _dense_vector(vector):
+    # Collection có named vectors thì Qdrant trả về dict {tên: vector}
+    if isinstance(vector, dict):
+        return vector.get(DENSE_VECTOR_NAME or "")
+    return vector
+
+
+class LocalVectorStore:
+    """
+    Snapshot collection Qdrant trên đĩa, search ngay trong process (không qua mạng).
+    - vectors.npy: ma trận vector đã chuẩn hóa, mở bằng memmap
+    - payloads.jsonl + payload_offsets.npy: payload từng điểm, đọc theo offset qua mmap
+    - Search bằng HNSW (faiss) nếu bật, ngược lại nhân ma trận NumPy (exact)
+    - Có thể lượng tử hóa (int8 / binary): chỉ mã lượng tử nằm trong RAM, search trên mã
+      lượng tử với oversampling rồi rescore các ứng viên bằng vector float32 trên memmap
+    Cùng giao diện search / search_batch / retrieve với QdrantClient và trả về ScoredPoint,
+    nên các lớp RAG dùng được mà không phải sửa.
+    """
+
+    def __init__(self, path: str, use_hnsw: bool = False, hnsw_m: int = 32, ef_search: int = 64,
+                 quantization: str = "none", oversampling: float = 2.0, rescore: bool = True):
+        """
+        Args:
+            path: Thư mục chứa snapshot (tạo bởi export_collection)
+            use_hnsw: Dùng faiss HNSW thay cho tìm kiếm exact (bỏ qua khi bật quantization)
+            hnsw_m: Số cạnh mỗi node của đồ thị HNSW
+            ef_search: Độ rộng tìm kiếm HNSW (lớn hơn -> recall cao hơn, chậm hơn)
+            quantization: "none", "int8" hoặc "binary"
+            oversampling: Số ứng viên lấy dư (limit * oversampling) trước khi rescore
+            rescore: Chấm lại ứng viên bằng vector float32 gốc
+        """
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.collection_name = self.meta["collection_name"]
+        self.ids = self.meta["ids"]
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE))
+        self._id_to_index = {point_id: i for i, point_id in enumerate(self.ids)}
+
+        self._payload_file = open(os.path.join(path, PAYLOADS_FILE), "rb")
+        self._payloads = mmap.mmap(self._payload_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(os.path.join(path, PAYLOADS_FILE)) else b""
+
+        self.oversampling = oversampling
+        self.rescore = rescore
+        self.quantizer = VectorQuantizer(quantization).fit(self.vectors) if quantization != "none" else None
+
+        self.index = None
+        if use_hnsw and self.quantizer is None:
+            self.index = self._build_hnsw(hnsw_m, ef_search)
+        mode = quantization if self.quantizer is not None else ("hnsw" if self.index is not None else "exact")
+        logger.info(
+            f"Loaded local vector store {self.collection_name}: {len(self.ids)} points, "
+            f"dim={self.vectors.shape[1] if len(self.ids) else 0}, {mode}"
+        )
+
+    def _build_hnsw(self, m: int, ef_search: int):
+        import faiss
+
+        index = faiss.IndexHNSWFlat(self.vectors.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = ef_search
+        index.add(np.ascontiguousarray(self.vectors, dtype=np.float32))
+        return index
+
+    def payload(self, index: int, fields: Optional[list[str]] = None) -> dict:
+        start = int(self.offsets[index])
+        end = int(self.offsets[index + 1])
+        payload = json.loads(self._payloads[start:end])
+        if fields is not None:
+            payload = {key: payload[key] for key in fields if key in payload}
+        return payload
+
+    def _to_points(self, indices, scores, with_payload=True, with_vectors=False) -> list[ScoredPoint]:
+        # with_payload giống Qdrant: True / False hoặc danh sách trường
+        fields = None if isinstance(with_payload, bool) else list(with_payload)
+        return [
+            ScoredPoint(
+                id=self.ids[i],
+                version=0,
+                score=float(score),
+                payload=self.payload(i, fields) if with_payload is not False else None,
+                vector=self.vectors[i].tolist() if with_vectors else None,
+            )
+            for i, score in zip(indices, scores)
+            if i >= 0
+        ]
+
+    def memory_bytes(self) -> int:
+        """Số byte vector phải giữ trong RAM để search (mã lượng tử nếu có, ngược lại float32)."""
+        if self.quantizer is not None:
+            return self.quantizer.nbytes()
+        return int(self.vectors.nbytes)
+
+    def _quantization_options(self, search_params) -> tuple[bool, float, bool]:
+        use_quantization = self.quantizer is not None
+        oversampling, rescore = self.oversampling, self.rescore
+        quantization = getattr(search_params, "quantization", None) if search_params is not None else None
+        if quantization is not None:
+            use_quantization = use_quantization and not quantization.ignore
+            oversampling = quantization.oversampling or oversampling
+            rescore = quantization.rescore if quantization.rescore is not None else rescore
+        return use_quantization, oversampling, rescore
+
+    def _search_matrix(self, queries: np.ndarray, limit: int, search_params=None) -> tuple[np.ndarray, np.ndarray]:
+        queries = _normalize(np.asarray(queries, dtype=np.float32))
+        limit = min(limit, len(self.ids))
+        if limit <= 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+
+        use_quantization, oversampling, rescore = self._quantization_options(search_params)
+        if use_quantization:
+            candidates = min(len(self.ids), max(limit, int(round(limit * oversampling))))
+            indices, scores = self._top_k(self.quantizer.scores(queries), candidates)
+            if rescore:
+                # Chỉ đọc các hàng ứng viên từ memmap float32
+                scores = np.stack([
+                    np.asarray(self.vectors[np.sort(row)], dtype=np.float32) @ query
+                    for row, query in zip(indices, queries)
+                ])
+                indices = np.sort(indices, axis=1)
+                order = np.argsort(-scores, axis=1)
+                indices = np.take_along_axis(indices, order, axis=1)
+                scores = np.take_along_axis(scores, order, axis=1)
+            return indices[:, :limit], scores[:, :limit]
+
+        if self.index is not None:
+            scores, indices = self.index.search(queries, limit)
+            return indices, scores
+
+        return self._top_k(queries @ self.vectors.T, limit)
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _check_collection(self, collection_name: Optional[str]):
+        if collection_name and collection_name != self.collection_name:
+            raise ValueError(f"Local store holds {self.collection_name}, not {collection_name}")
+
+    def search(self, collection_name: str, query_vector, limit: int = 10, with_payload=True,
+               with_vectors=False, search_params=None, **kwargs) -> list[ScoredPoint]:
+        self._check_collection(collection_name)
+        indices, scores = self._search_matrix(np.asarray([_dense_vector(query_vector)]), limit, search_params)
+        return self._to_points(indices[0], scores[0], with_payload, with_vectors)
+
+    def search_batch(self, collection_name: str, requests: list, **kwargs) -> list[list[ScoredPoint]]:
+        self._check_collection(collection_name)
+        if not requests:
+            return []
+        limit = max(request.limit for request in requests)
+        indices, scores = self._search_matrix(
+            np.asarray([_dense_vector(r.vector) for r in requests]), limit, requests[0].params,
+        )
+        return [
+            self._to_points(indices[i][:request.limit], scores[i][:request.limit],
+                            request.with_payload if request.with_payload is not None else True,
+                            bool(request.with_vector))
+            for i, request in enumerate(requests)
+        ]
+
+    def retrieve(self, collection_name: str, ids: list, with_payload=True, with_vectors=False, **kwargs):
+        self._check_collection(collection_name)
+        indices = [self._id_to_index[point_id] for point_id in ids if point_id in self._id_to_index]
+        return self._to_points(indices, [0.0] * len(indices), with_payload, with_vectors)
+
+    def close(self):
+        if isinstance(self._payloads, mmap.mmap):
+            self._payloads.close()
+        self._payload_file.close()
+
+
+class AsyncLocalVectorStore:
+    """Giao diện async cho LocalVectorStore (search chạy trong thread pool)."""
+
+    def __init__(self, store: LocalVectorStore):
+        self._store = store
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if name not in ("search", "search_batch", "retrieve"):
+            return attr
+
+        async def wrapper(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+
+        return wrapper
+
+
+def export_collection(path: str, collection_name: Optional[str] = None, batch_size: int = 256) -> int:
+    """
+    Xuất toàn bộ vector + payload của collection Qdrant ra snapshot local.
+
+    Args:
+        path: Thư mục đích
+        collection_name: Tên collection (mặc định COLLECTION_NAME)
+        batch_size: Số điểm mỗi lần scroll
+
+    Returns:
+        int: Số điểm đã xuất
+    """
+    collection_name = collection_name or os.getenv("COLLECTION_NAME")
+    client = get_rag_client()
+    total = client.count(collection_name=collection_name, exact=True).count
+    os.makedirs(path, exist_ok=True)
+
+    ids = []
+    offsets = [0]
+    vectors = None
+    offset = None
+    # Ghi ra file tạm rồi mới đổi tên, snapshot cũ vẫn dùng được trong lúc export
+    tmp = {name: os.path.join(path, f".tmp_{name}") for name in (VECTORS_FILE, PAYLOADS_FILE, OFFSETS_FILE, META_FILE)}
+    with open(tmp[PAYLOADS_FILE], "wb") as payload_file:
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=[DENSE_VECTOR_NAME] if DENSE_VECTOR_NAME else True,
+            )
+            for point in points:
+                vector = np.asarray(_dense_vector(point.vector), dtype=np.float32)
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        tmp[VECTORS_FILE], mode="w+", dtype=np.float32, shape=(total, vector.shape[0])
+                    )
+                if len(ids) >= total:
+                    raise RuntimeError(f"Collection {collection_name} grew during export, retry")
+                vectors[len(ids)] = _normalize(vector)
+                ids.append(point.id)
+                data = json.dumps(point.payload or {}, ensure_ascii=False).encode("utf-8")
+                payload_file.write(data)
+                offsets.append(offsets[-1] + len(data))
+            logger.info(f"Exported {len(ids)}/{total} points")
+            if offset is None or not points:
+                break
+
+    if vectors is None:
+        np.save(tmp[VECTORS_FILE], np.empty((0, 0), dtype=np.float32))
+    else:
+        vectors.flush()
+        if len(ids) < total:
+            trimmed = np.array(vectors[:len(ids)])
+            del vectors
+            np.save(tmp[VECTORS_FILE], trimmed)
+        else:
+            del vectors
+    np.save(tmp[OFFSETS_FILE], np.asarray(offsets, dtype=np.int64))
+    with open(tmp[META_FILE], "w", encoding="utf-8") as f:
+        json.dump({"collection_name": collection_name, "ids": ids}, f)
+
+    for name, tmp_path in tmp.items():
+        os.replace(tmp_path, os.path.join(path, name))
+    return len(ids)
+
+
+_local_store = None
+_local_store_lock = threading.Lock()
+
+
+def _vector_store_backend() -> str:
+    return os.getenv("VECTOR_STORE_BACKEND", "qdrant").lower()
+
+
+def get_local_vector_store() -> LocalVectorStore:
+    """Trả về LocalVectorStore dùng chung, đọc từ LOCAL_INDEX_PATH."""
+    global _local_store
+    with _local_store_lock:
+        if _local_store is None:
+            _local_store = LocalVectorStore(
+                os.getenv("LOCAL_INDEX_PATH", ".cache/local_index"),
+                use_hnsw=os.getenv("LOCAL_INDEX_HNSW", "false").lower() in ("1", "true", "yes"),
+                quantization=os.getenv("LOCAL_INDEX_QUANTIZATION", "none"),
+                oversampling=float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0")),
+            )
+        return _local_store
+
+
+def get_vector_store():
+    """
+    Backend search cho các lớp RAG, chọn theo VECTOR_STORE_BACKEND:
+    "qdrant" (mặc định) hoặc "local" (snapshot trong process).
+    """
+    if _vector_store_backend() == "local":
+        return get_local_vector_store()
+    return get_rag_client()
+
+
+def get_async_vector_store():
+    if _vector_store_backend() == "local":
+        return AsyncLocalVectorStore(get_local_vector_store())
+    return get_async_rag_client()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    target = sys.argv[1] if len(sys.argv) > 1 else os.getenv("LOCAL_INDEX_PATH", ".cache/local_index")
+    print(f"Exported {export_collection(target)} points to {target}")
@@ -1,11 +1,103 @@
+import asyncio
+import os
+import re
+import threading
+import unicodedata
+from typing import Optional
+
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate
-from .core import get_llm, EvalAnswer
+from .core import get_llm, EvalAnswer, get_embedding_service
 from .prompt_templates import EVAL_ANSWER_SYSTEM_PROMPT, EVAL_ANSWER_HUMAN_PROMPT
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Câu trả lời kiểu "không tìm thấy thông tin" -> chắc chắn không đạt
+REFUSAL_PATTERN = re.compile(
+    r"không tìm thấy|không có thông tin|không đủ thông tin|không được đề cập|không thể trả lời|"
+    r"không rõ|chưa có thông tin|ngữ cảnh không|tài liệu không|xin lỗi",
+    re.IGNORECASE,
+)
+
+
+class LocalAnswerEvaluator:
+    """
+    Chấm điểm câu trả lời không cần LLM, từ các tín hiệu sẵn có:
+    - cosine embedding giữa câu hỏi và câu trả lời (embedder dùng chung với RAG)
+    - điểm retrieval cao nhất (chỉ khi là cosine, tức RETRIEVAL_MODE=native)
+    - độ dài câu trả lời và mẫu từ chối trả lời
+    Điểm nằm trong [0, 1]; chỉ các điểm trong vùng không chắc chắn mới cần LLM judge.
+    """
+
+    def __init__(self, embedder, accept_threshold: float = 0.7, reject_threshold: float = 0.4,
+                 weights: tuple = (0.5, 0.35, 0.15), min_words: int = 8, retrieval_mode: str = "native"):
+        """
+        Args:
+            embedder: SentenceTransformer dùng chung với RAG
+            accept_threshold: Điểm >= ngưỡng này -> đạt, không cần LLM
+            reject_threshold: Điểm <= ngưỡng này -> không đạt, không cần LLM
+            weights: Trọng số (cosine câu hỏi - câu trả lời, điểm retrieval, độ dài)
+            min_words: Số từ để câu trả lời được xem là đủ dài
+            retrieval_mode: "native" (điểm cosine) hoặc "hybrid" (điểm RRF ~1/(60 + rank), không so
+                được với thang cosine nên bỏ tín hiệu retrieval)
+        """
+        self.embedding_service = get_embedding_service(embedder)
+        self.retrieval_mode = retrieval_mode
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+        self.weights = weights
+        self.min_words = min_words
+
+    def signals(self, query: str, answer: str, retrieval_scores: Optional[list[float]] = None) -> dict:
+        answer = unicodedata.normalize("NFC", answer or "")
+        query_vector, answer_vector = self.embedding_service.encode_many([query, answer or " "])
+        similarity = float(np.dot(query_vector, answer_vector) /
+                           max(np.linalg.norm(query_vector) * np.linalg.norm(answer_vector), 1e-12))
+        scores = sorted(retrieval_scores or [], reverse=True)
+        return {
+            "similarity": similarity,
+            "top_retrieval": scores[0] if scores else None,
+            "retrieval_margin": scores[0] - scores[1] if len(scores) > 1 else None,
+            "words": len(answer.split()),
+            "refusal": bool(REFUSAL_PATTERN.search(answer)),
+        }
+
+    def score(self, query: str, answer: str, retrieval_scores: Optional[list[float]] = None) -> tuple[float, dict]:
+        """
+        Returns:
+            tuple[float, dict]: (điểm trong [0, 1], các tín hiệu đã dùng)
+        """
+        signals = self.signals(query, answer, retrieval_scores)
+        if signals["refusal"] or signals["words"] == 0:
+            return 0.0, signals
+
+        similarity_weight, retrieval_weight, length_weight = self.weights
+        similarity = float(np.clip((signals["similarity"] - 0.3) / 0.5, 0.0, 1.0))
+        length = min(1.0, signals["words"] / self.min_words)
+        if signals["top_retrieval"] is None or self.retrieval_mode != "native":
+            # Không có điểm cosine: chia lại trọng số cho các tín hiệu còn lại
+            total = similarity_weight + length_weight
+            return (similarity_weight * similarity + length_weight * length) / total, signals
+
+        retrieval = float(np.clip((signals["top_retrieval"] - 0.45) / 0.35, 0.0, 1.0))
+        score = similarity_weight * similarity + retrieval_weight * retrieval + length_weight * length
+        return float(score), signals
+
+    def decide(self, score: float) -> Optional[bool]:
+        """True / False nếu chắc chắn, None nếu nằm trong vùng không chắc chắn."""
+        if score >= self.accept_threshold:
+            return True
+        if score <= self.reject_threshold:
+            return False
+        return None
+
+
+def _mode_threshold(name: str, retrieval_mode: str, default: str) -> float:
+    """Ngưỡng riêng của retrieval mode (vd. EVAL_ACCEPT_THRESHOLD_HYBRID), không có thì dùng ngưỡng chung."""
+    return float(os.getenv(f"{name}_{retrieval_mode.upper()}", os.getenv(name, default)))
+
 
 class EvalAnswerHandler:
     """
@@ -13,18 +105,39 @@ class EvalAnswerHandler:
     Dựa trên kiến trúc: RAG + Answer -> Eval Answer -> (loop back nếu try < M) hoặc (Web search nếu try >= M hoặc not satisfactory)
     """
     
-    def __init__(self, max_tries: int = 3):
+    def __init__(self, max_tries: int = 3, mode: Optional[str] = None, embedder=None,
+                 retrieval_mode: Optional[str] = None):
         """
         Khởi tạo EvalAnswerHandler.
         
         Args:
             max_tries: Số lần thử tối đa (M) trước khi chuyển sang web search
+            mode: "llm" (luôn dùng LLM judge) hoặc "local" (LocalAnswerEvaluator, chỉ gọi LLM
+                khi điểm nằm trong vùng không chắc chắn); mặc định đọc EVAL_MODE
+            embedder: SentenceTransformer cho chế độ local
+            retrieval_mode: Thang điểm retrieval ("native" / "hybrid"), mặc định đọc RETRIEVAL_MODE;
+                ngưỡng được hiệu chỉnh riêng theo mode (EVAL_ACCEPT_THRESHOLD_HYBRID, ...)
         """
         self.llm = get_llm()
         self.structured_llm = self.llm.with_structured_output(EvalAnswer)
         self.prompt = self._create_prompt()
         self.eval_chain = self.prompt | self.structured_llm
         self.max_tries = max_tries
+        self.mode = mode or os.getenv("EVAL_MODE", "llm")
+        self.local_evaluator = None
+        if self.mode == "local":
+            if embedder is None:
+                raise ValueError("Local evaluation mode needs an embedder")
+            retrieval_mode = retrieval_mode or os.getenv("RETRIEVAL_MODE", "native")
+            self.local_evaluator = LocalAnswerEvaluator(
+                embedder,
+                accept_threshold=_mode_threshold("EVAL_ACCEPT_THRESHOLD", retrieval_mode, "0.7"),
+                reject_threshold=_mode_threshold("EVAL_REJECT_THRESHOLD", retrieval_mode, "0.4"),
+                retrieval_mode=retrieval_mode,
+            )
+        self._lock = threading.Lock()
+        self.local_decisions = 0
+        self.llm_decisions = 0
     
     def _create_prompt(self):
         """Tạo prompt template cho việc đánh giá câu trả lời."""
@@ -33,7 +146,8 @@ class EvalAnswerHandler:
             ("human", EVAL_ANSWER_HUMAN_PROMPT),
         ])
     
-    def evaluate(self, query: str, answer: str, try_count: int) -> EvalAnswer:
+    def evaluate(self, query: str, answer: str, try_count: int,
+                 retrieval_scores: Optional[list[float]] = None) -> EvalAnswer:
         """
         Đánh giá chất lượng câu trả lời.
         
@@ -41,39 +155,112 @@ class EvalAnswerHandler:
             query: Câu hỏi gốc của người dùng
             answer: Câu trả lời từ RAG + Answer
             try_count: Số lần đã thử (bắt đầu từ 1)
+            retrieval_scores: Điểm các hit retrieval dùng để trả lời (cho chế độ local)
             
         Returns:
             EvalAnswer: Đối tượng chứa kết quả đánh giá và quyết định
         """
+        local_result = self._local_eval(query, answer, try_count, retrieval_scores)
+        if local_result is not None:
+            return local_result
         try:
-            result = self.eval_chain.invoke({
-                "query": query,
-                "answer": answer,
-                "try_count": try_count,
-                "max_tries": self.max_tries
-            })
-            
-            # Logic bổ sung: nếu đã thử quá M lần, không nên retry nữa
-            if try_count >= self.max_tries:
-                result.should_retry = False
-                logger.info(f"Max tries ({self.max_tries}) reached, should not retry")
+            result = self.eval_chain.invoke(self._build_inputs(query, answer, try_count))
+            return self._postprocess(result, try_count)
+        except Exception as e:
+            logger.error(f"Error in evaluating answer: {e}")
+            return self._fallback_eval(try_count)
+    
+    async def aevaluate(self, query: str, answer: str, try_count: int,
+                        retrieval_scores: Optional[list[float]] = None) -> EvalAnswer:
+        """
+        Phiên bản async của evaluate, dùng ainvoke để không chặn event loop.
+        
+        Args:
+            query: Câu hỏi gốc của người dùng
+            answer: Câu trả lời từ RAG + Answer
+            try_count: Số lần đã thử (bắt đầu từ 1)
+            retrieval_scores: Điểm các hit retrieval dùng để trả lời (cho chế độ local)
             
-            logger.info(
-                f"Answer evaluation - Satisfactory: {result.is_satisfactory}, "
-                f"Score: {result.score:.2f}, Should retry: {result.should_retry}, "
-                f"Try: {try_count}/{self.max_tries}"
-            )
-            return result
+        Returns:
+            EvalAnswer: Đối tượng chứa kết quả đánh giá và quyết định
+        """
+        if self.local_evaluator is not None:
+            local_result = await asyncio.to_thread(self._local_eval, query, answer, try_count, retrieval_scores)
+            if local_result is not None:
+                return local_result
+        try:
+            result = await self.eval_chain.ainvoke(self._build_inputs(query, answer, try_count))
+            return self._postprocess(result, try_count)
         except Exception as e:
             logger.error(f"Error in evaluating answer: {e}")
-            # Fallback: nếu đã thử quá nhiều lần, không retry
-            should_retry = try_count < self.max_tries
-            return EvalAnswer(
-                is_satisfactory=False,
-                score=0.0,
-                reasoning=f"Fallback due to evaluation error. Try count: {try_count}",
-                should_retry=should_retry
-            )
+            return self._fallback_eval(try_count)
+    
+    def _local_eval(self, query: str, answer: str, try_count: int,
+                    retrieval_scores: Optional[list[float]]) -> Optional[EvalAnswer]:
+        """Quyết định cục bộ; None nếu cần LLM judge (chế độ llm hoặc vùng không chắc chắn)."""
+        if self.local_evaluator is None:
+            return None
+        score, signals = self.local_evaluator.score(query, answer, retrieval_scores)
+        decision = self.local_evaluator.decide(score)
+        with self._lock:
+            if decision is None:
+                self.llm_decisions += 1
+            else:
+                self.local_decisions += 1
+        if decision is None:
+            logger.info(f"Local eval score {score:.2f} is uncertain, asking LLM judge")
+            return None
+
+        result = EvalAnswer(
+            is_satisfactory=decision,
+            score=score,
+            reasoning=(
+                f"Local evaluation: similarity={signals['similarity']:.2f}, "
+                f"top_retrieval={signals['top_retrieval']}, words={signals['words']}, refusal={signals['refusal']}"
+            ),
+            should_retry=not decision,
+        )
+        return self._postprocess(result, try_count)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.local_decisions + self.llm_decisions
+            return {
+                "local": self.local_decisions,
+                "llm": self.llm_decisions,
+                "local_fraction": self.local_decisions / total if total else 0.0,
+            }
+
+    def _build_inputs(self, query: str, answer: str, try_count: int) -> dict:
+        return {
+            "query": query,
+            "answer": answer,
+            "try_count": try_count,
+            "max_tries": self.max_tries
+        }
+    
+    def _postprocess(self, result: EvalAnswer, try_count: int) -> EvalAnswer:
+        # Logic bổ sung: nếu đã thử quá M lần, không nên retry nữa
+        if try_count >= self.max_tries:
+            result.should_retry = False
+            logger.info(f"Max tries ({self.max_tries}) reached, should not retry")
+        
+        logger.info(
+            f"Answer evaluation - Satisfactory: {result.is_satisfactory}, "
+            f"Score: {result.score:.2f}, Should retry: {result.should_retry}, "
+            f"Try: {try_count}/{self.max_tries}"
+        )
+        return result
+    
+    def _fallback_eval(self, try_count: int) -> EvalAnswer:
+        # Fallback: nếu đã thử quá nhiều lần, không retry
+        should_retry = try_count < self.max_tries
+        return EvalAnswer(
+            is_satisfactory=False,
+            score=0.0,
+            reasoning=f"Fallback due to evaluation error. Try count: {try_count}",
+            should_retry=should_retry
+        )
     
     def should_retry(self, query: str, answer: str, try_count: int) -> bool:
         """
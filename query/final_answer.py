@@ -38,24 +38,47 @@ class FinalAnswerHandler:
             FinalAnswer: Câu trả lời cuối cùng với confidence score
         """
         try:
-            sources_text = ", ".join(summary.sources) if summary.sources else "Không có nguồn"
-            
-            result = self.final_chain.invoke({
-                "query": query,
-                "summary": summary.summary,
-                "sources": sources_text
-            })
+            result = self.final_chain.invoke(self._build_inputs(query, summary))
+            logger.info(f"Generated final answer with {len(summary.sources)} sources")
+            return result
+        except Exception as e:
+            logger.error(f"Error in generating final answer: {e}")
+            return self._fallback_answer(summary)
+    
+    async def agenerate(self, query: str, summary: SummaryAnswer) -> FinalAnswer:
+        """
+        Phiên bản async của generate, dùng ainvoke để không chặn event loop.
+        
+        Args:
+            query: Câu hỏi gốc của người dùng
+            summary: Câu trả lời đã được tổng hợp từ Summary
             
+        Returns:
+            FinalAnswer: Câu trả lời cuối cùng với confidence score
+        """
+        try:
+            result = await self.final_chain.ainvoke(self._build_inputs(query, summary))
             logger.info(f"Generated final answer with {len(summary.sources)} sources")
             return result
         except Exception as e:
             logger.error(f"Error in generating final answer: {e}")
-            # Fallback: trả về summary trực tiếp
-            return FinalAnswer(
-                answer=summary.summary,
-                sources=summary.sources,
-                confidence=0.7
-            )
+            return self._fallback_answer(summary)
+    
+    def _build_inputs(self, query: str, summary: SummaryAnswer) -> dict:
+        sources_text = ", ".join(summary.sources) if summary.sources else "Không có nguồn"
+        return {
+            "query": query,
+            "summary": summary.summary,
+            "sources": sources_text
+        }
+    
+    def _fallback_answer(self, summary: SummaryAnswer) -> FinalAnswer:
+        # Fallback: trả về summary trực tiếp
+        return FinalAnswer(
+            answer=summary.summary,
+            sources=summary.sources,
+            confidence=0.7
+        )
     
     def generate_simple(self, query: str, summary: SummaryAnswer) -> str:
         """
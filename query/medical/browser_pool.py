@@ -0,0 +1,169 @@
+import asyncio
+import os
+import threading
+from typing import Optional
+
+from playwright.async_api import async_playwright, Error as PlaywrightError
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _BrowserSlot:
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.uses = 0
+
+
+class BrowserPool:
+    """
+    Giữ sẵn N Chromium headless (mỗi browser một context + page) để crawl_page không phải
+    launch browser mới cho từng URL.
+    - Page được tái tạo sau `max_page_uses` lần dùng
+    - Browser bị crash / mất kết nối sẽ được khởi động lại
+    - Ảnh, font, media bị chặn để giảm dung lượng tải về
+
+    Pool chạy trên một event loop riêng (thread nền) nên có thể gọi từ bất kỳ thread nào
+    (fetch) hoặc từ một event loop khác (afetch).
+    """
+
+    def __init__(self, size: int = 2, max_page_uses: int = 50,
+                 blocked_resource_types: tuple = ("image", "font", "media")):
+        """
+        Args:
+            size: Số browser giữ sẵn
+            max_page_uses: Số lần dùng tối đa của một page trước khi tạo page mới
+            blocked_resource_types: Các loại resource bị chặn khi tải trang
+        """
+        self.size = size
+        self.max_page_uses = max_page_uses
+        self.blocked_resource_types = set(blocked_resource_types)
+        self._playwright = None
+        self._slots = None
+        self._start_lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+        self._thread.start()
+        self._started = False
+        self.restarts = 0
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    def start(self):
+        """Khởi động trước các browser (warm-up)."""
+        with self._start_lock:
+            if not self._started:
+                self._run(self._start())
+                self._started = True
+
+    async def _start(self):
+        self._playwright = await async_playwright().start()
+        self._slots = asyncio.Queue()
+        for i in range(self.size):
+            slot = _BrowserSlot(i)
+            await self._launch(slot)
+            self._slots.put_nowait(slot)
+        logger.info(f"Browser pool started with {self.size} browser(s)")
+
+    async def _launch(self, slot: _BrowserSlot):
+        slot.browser = await self._playwright.chromium.launch(headless=True)
+        slot.context = await slot.browser.new_context()
+        await slot.context.route("**/*", self._filter_request)
+        slot.page = await slot.context.new_page()
+        slot.uses = 0
+
+    async def _filter_request(self, route):
+        if route.request.resource_type in self.blocked_resource_types:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _restart(self, slot: _BrowserSlot):
+        logger.warning(f"Restarting browser #{slot.index}")
+        self.restarts += 1
+        try:
+            await slot.browser.close()
+        except Exception:
+            pass
+        await self._launch(slot)
+
+    async def _recycle_page(self, slot: _BrowserSlot):
+        try:
+            await slot.page.close()
+        except Exception:
+            pass
+        slot.page = await slot.context.new_page()
+        slot.uses = 0
+
+    def close(self):
+        if self._started:
+            self._run(self._close())
+            self._started = False
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _close(self):
+        while not self._slots.empty():
+            slot = self._slots.get_nowait()
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+        await self._playwright.stop()
+
+    # -------------------------
+    # Fetch
+    # -------------------------
+    async def _fetch(self, url: str, timeout: int) -> str:
+        slot = await self._slots.get()
+        try:
+            if not slot.browser.is_connected():
+                await self._restart(slot)
+            elif slot.page.is_closed() or slot.uses >= self.max_page_uses:
+                await self._recycle_page(slot)
+
+            slot.uses += 1
+            try:
+                await slot.page.goto(url, timeout=timeout)
+                return await slot.page.content()
+            except PlaywrightError:
+                # Browser chết giữa chừng -> khởi động lại rồi báo lỗi cho caller
+                if not slot.browser.is_connected():
+                    await self._restart(slot)
+                raise
+        finally:
+            self._slots.put_nowait(slot)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def fetch(self, url: str, timeout: int = 10000) -> str:
+        """Tải HTML của url (gọi đồng bộ, thread-safe)."""
+        self.start()
+        return self._run(self._fetch(url, timeout))
+
+    async def afetch(self, url: str, timeout: int = 10000) -> str:
+        """Tải HTML của url từ một event loop khác."""
+        await asyncio.to_thread(self.start)
+        future = asyncio.run_coroutine_threadsafe(self._fetch(url, timeout), self._loop)
+        return await asyncio.wrap_future(future)
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Trả về BrowserPool dùng chung trong process (cấu hình qua BROWSER_POOL_SIZE / BROWSER_PAGE_MAX_USES)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(
+                size=int(os.getenv("BROWSER_POOL_SIZE", "2")),
+                max_page_uses=int(os.getenv("BROWSER_PAGE_MAX_USES", "50")),
+            )
+        return _pool
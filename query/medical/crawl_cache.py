@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlCache:
+    """
+    Cache trên đĩa (SQLite) cho web fallback:
+    - pages: text đã crawl + headers, ETag, Last-Modified theo URL
+    - searches: danh sách URL trả về cho một câu tìm kiếm (TTL riêng)
+    Entry còn hạn được dùng ngay không cần network; entry hết hạn được revalidate bằng conditional GET.
+    """
+
+    def __init__(self, path: str, page_ttl: float = 7 * 86400, search_ttl: float = 86400):
+        """
+        Args:
+            path: Đường dẫn file SQLite
+            page_ttl: Thời gian (giây) một trang được coi là còn mới
+            search_ttl: Thời gian (giây) giữ kết quả web_search
+        """
+        self.path = path
+        self.page_ttl = page_ttl
+        self.search_ttl = search_ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                headers TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS searches (
+                query TEXT NOT NULL,
+                max_results INTEGER NOT NULL,
+                urls TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (query, max_results)
+            )"""
+        )
+        self._conn.commit()
+
+    # -------------------------
+    # Pages
+    # -------------------------
+    def get_page(self, url: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, headers, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "url": url,
+            "text": row[0],
+            "headers": json.loads(row[1]) if row[1] else {},
+            "etag": row[2],
+            "last_modified": row[3],
+            "fetched_at": row[4],
+        }
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.page_ttl
+
+    def validators(self, entry: Optional[dict]) -> Optional[dict]:
+        """Header cho conditional GET từ entry đã lưu."""
+        if entry is None:
+            return None
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers or None
+
+    def put_page(self, url: str, text: str, headers: Optional[dict] = None):
+        headers = headers or {}
+        lowered = {k.lower(): v for k, v in headers.items()}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, text, headers, etag, last_modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, text, json.dumps(headers), lowered.get("etag"), lowered.get("last-modified"), time.time()),
+            )
+            self._conn.commit()
+
+    def touch_page(self, url: str):
+        """Đánh dấu trang vẫn còn mới sau khi server trả 304 Not Modified."""
+        with self._lock:
+            self._conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    # -------------------------
+    # Searches
+    # -------------------------
+    def get_search(self, query: str, max_results: int) -> Optional[list[str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT urls, created_at FROM searches WHERE query = ? AND max_results = ?",
+                (query, max_results),
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.search_ttl:
+            return None
+        return json.loads(row[0])
+
+    def put_search(self, query: str, max_results: int, urls: list[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (query, max_results, urls, created_at) VALUES (?, ?, ?, ?)",
+                (query, max_results, json.dumps(urls), time.time()),
+            )
+            self._conn.commit()
+
+    # -------------------------
+    # Maintenance
+    # -------------------------
+    def purge(self, max_age: Optional[float] = None) -> int:
+        """Xóa các trang cũ hơn max_age (mặc định 4 lần page_ttl) và các search đã hết hạn."""
+        max_age = max_age if max_age is not None else 4 * self.page_ttl
+        now = time.time()
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM pages WHERE fetched_at < ?", (now - max_age,)).rowcount
+            self._conn.execute("DELETE FROM searches WHERE created_at < ?", (now - self.search_ttl,))
+            self._conn.commit()
+        return removed
+
+
+_cache: Optional[CrawlCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_crawl_cache() -> CrawlCache:
+    """Trả về CrawlCache dùng chung (cấu hình qua CRAWL_CACHE_PATH / CRAWL_PAGE_TTL / CRAWL_SEARCH_TTL)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CrawlCache(
+                path=os.getenv("CRAWL_CACHE_PATH", ".cache/crawl_cache.sqlite"),
+                page_ttl=float(os.getenv("CRAWL_PAGE_TTL", str(7 * 86400))),
+                search_ttl=float(os.getenv("CRAWL_SEARCH_TTL", "86400")),
+            )
+        return _cache
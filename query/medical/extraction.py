@@ -0,0 +1,213 @@
+import math
+import re
+import threading
+import time
+
+from lxml import etree
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Các thẻ bị bỏ hoàn toàn (kể cả nội dung bên trong)
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+    "nav", "header", "footer", "aside", "form", "button", "select", "option", "head",
+}
+
+# Các thẻ kết thúc một khối văn bản
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd",
+    "h1", "h2", "h3", "h4", "h5", "h6", "table", "tr", "td", "th", "blockquote",
+    "pre", "br", "hr", "body", "figcaption",
+}
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# Thẻ bao cả trang: không bao giờ bị bỏ vì class/id (vd. <body class="has-sidebar">)
+WRAPPER_TAGS = {"html", "body", "main", "article"}
+
+# class/id thường gặp ở các khối điều hướng, quảng cáo, bình luận...
+# Chỉ áp dụng cho khối lá (khối không chứa khối con) hoặc thẻ inline; khối bao ngoài
+# có class khớp chỉ bị siết ngưỡng link density, không bị bỏ cả cây con
+BOILERPLATE_PATTERN = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|breadcrumbs?|footer|header|sidebar|widget|banner|advert|ads?|"
+    r"cookie|popup|modal|social|share|comments?|related|newsletter|subscribe|login)($|[\s_-])",
+    re.IGNORECASE,
+)
+
+
+class _MainTextTarget:
+    """
+    Parser target cho lxml: nhận sự kiện start/end/data theo luồng,
+    không dựng cây DOM, chỉ giữ lại các khối văn bản nội dung chính.
+    """
+
+    def __init__(self, min_block_chars: int, max_link_density: float):
+        self.min_block_chars = min_block_chars
+        self.max_link_density = max_link_density
+        self.blocks = []
+        self._stack = []  # (tag, is_skip, is_marked)
+        self._block_marks = []  # cờ class boilerplate của các khối đang mở, khối trong cùng ở cuối
+        self._marked_depth = 0
+        self._skip_depth = 0
+        self._link_depth = 0
+        self._buffer = []
+        self._link_chars = 0
+        self._heading = False
+
+    def _has_boilerplate_marker(self, tag: str, attrib) -> bool:
+        if tag in WRAPPER_TAGS:
+            return False
+        marker = f"{attrib.get('class', '')} {attrib.get('id', '')} {attrib.get('role', '')}"
+        return bool(marker.strip()) and bool(BOILERPLATE_PATTERN.search(marker))
+
+    def _flush(self):
+        text = " ".join("".join(self._buffer).split())
+        if text:
+            # Text trong buffer thuộc khối đang mở trong cùng: bỏ nếu chính khối đó mang class boilerplate
+            leaf_marked = bool(self._block_marks) and self._block_marks[-1]
+            # Nằm trong khối bao có class boilerplate: chỉ giữ khối ít link
+            max_link_density = self.max_link_density / 2 if self._marked_depth else self.max_link_density
+            link_density = self._link_chars / len(text)
+            keep = (
+                not leaf_marked
+                and (len(text) >= self.min_block_chars or self._heading)
+                and link_density <= max_link_density
+            )
+            if keep:
+                self.blocks.append(text)
+        self._buffer = []
+        self._link_chars = 0
+        self._heading = False
+
+    def start(self, tag, attrib):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        is_marked = self._skip_depth == 0 and self._has_boilerplate_marker(tag, attrib)
+        # Thẻ điều hướng và phần tử inline có class boilerplate bị bỏ cả cây con
+        is_skip = self._skip_depth == 0 and (tag in SKIP_TAGS or (is_marked and tag not in BLOCK_TAGS))
+        self._stack.append((tag, is_skip, is_marked))
+        if is_skip or self._skip_depth:
+            self._skip_depth += 1
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+            self._block_marks.append(is_marked)
+            self._marked_depth += int(is_marked)
+        if tag in HEADING_TAGS:
+            self._heading = True
+        if tag == "a":
+            self._link_depth += 1
+
+    def end(self, tag):
+        if not self._stack:
+            return
+        tag, _, is_marked = self._stack.pop()
+        if self._skip_depth:
+            self._skip_depth -= 1
+            return
+        if tag == "a" and self._link_depth:
+            self._link_depth -= 1
+        if tag in BLOCK_TAGS:
+            self._flush()
+            if self._block_marks:
+                self._block_marks.pop()
+            self._marked_depth -= int(is_marked)
+
+    def data(self, data):
+        if self._skip_depth:
+            return
+        self._buffer.append(data)
+        if self._link_depth:
+            self._link_chars += len(data.strip())
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        self._flush()
+        return self.blocks
+
+
+def estimate_chunks(num_chars: int, chunk_size: int = 1000, chunk_overlap: int = 50) -> int:
+    if num_chars <= 0:
+        return 0
+    return max(1, math.ceil((num_chars - chunk_overlap) / (chunk_size - chunk_overlap)))
+
+
+class ExtractionReport:
+    """Thống kê số ký tự / chunk trước và sau khi extract để theo dõi lượng embedding tiết kiệm được."""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 50):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.raw_chars = 0
+        self.text_chars = 0
+        self.raw_chunks = 0
+        self.text_chunks = 0
+        self.elapsed = 0.0
+
+    def record(self, raw_chars: int, text_chars: int, elapsed: float):
+        raw_chunks = estimate_chunks(raw_chars, self.chunk_size, self.chunk_overlap)
+        text_chunks = estimate_chunks(text_chars, self.chunk_size, self.chunk_overlap)
+        with self._lock:
+            self.pages += 1
+            self.raw_chars += raw_chars
+            self.text_chars += text_chars
+            self.raw_chunks += raw_chunks
+            self.text_chunks += text_chunks
+            self.elapsed += elapsed
+        logger.info(
+            f"Extracted {raw_chars} -> {text_chars} chars, "
+            f"~{raw_chunks} -> ~{text_chunks} chunks in {elapsed * 1000:.1f}ms"
+        )
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "pages": self.pages,
+                "raw_chars": self.raw_chars,
+                "text_chars": self.text_chars,
+                "raw_chunks": self.raw_chunks,
+                "text_chunks": self.text_chunks,
+                "chunks_saved": self.raw_chunks - self.text_chunks,
+                "avg_extract_ms": self.elapsed / self.pages * 1000 if self.pages else 0.0,
+            }
+
+
+extraction_report = ExtractionReport()
+
+
+def extract_main_text(html: str, min_block_chars: int = 40, max_link_density: float = 0.5,
+                      feed_size: int = 64 * 1024) -> str:
+    """
+    Trích text nội dung chính từ HTML bằng parser tăng dần (lxml target parser):
+    bỏ script, style, điều hướng, header/footer... và các khối chủ yếu là link.
+
+    Args:
+        html: HTML thô
+        min_block_chars: Độ dài tối thiểu của một khối (trừ tiêu đề) để được giữ
+        max_link_density: Tỉ lệ ký tự nằm trong link tối đa của một khối
+        feed_size: Số ký tự đưa vào parser mỗi lần
+
+    Returns:
+        str: Các khối văn bản, mỗi khối một dòng
+    """
+    if not html:
+        return ""
+    started = time.perf_counter()
+    target = _MainTextTarget(min_block_chars, max_link_density)
+    parser = etree.HTMLParser(target=target, recover=True, encoding="utf-8")
+    try:
+        for offset in range(0, len(html), feed_size):
+            parser.feed(html[offset:offset + feed_size].encode("utf-8"))
+        blocks = parser.close()
+    except etree.LxmlError as e:
+        logger.warning(f"HTML extraction failed: {e}")
+        blocks = target.blocks
+
+    text = "\n".join(blocks)
+    extraction_report.record(len(html), len(text), time.perf_counter() - started)
+    return text
@@ -0,0 +1,293 @@
+import asyncio
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import httpx
+import numpy as np
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from playwright.async_api import TimeoutError, Error as PlaywrightError
+
+from .browser_pool import get_browser_pool
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "vi-VN,vi;q=0.9,en;q=0.8",
+    # urllib3 tự giải nén br khi đã cài brotli
+    "Accept-Encoding": "gzip, deflate, br",
+}
+
+# Executor riêng cho việc blocking trong crawl async (extract, parse): asyncio.run() chỉ chờ
+# default executor khi đóng loop, nên thread còn chạy sau deadline không giữ crawl lại
+_crawl_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="crawl")
+
+
+async def run_detached(func, *args):
+    """Chạy hàm blocking trên executor crawl, không bị asyncio.run() chờ khi hết deadline."""
+    return await asyncio.get_running_loop().run_in_executor(_crawl_executor, func, *args)
+
+
+HEADER_CHARSET_PATTERN = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+META_CHARSET_PATTERN = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+class FetchResult:
+    def __init__(self, url: str, content: str = "", tier: str = "", status: Optional[int] = None,
+                 headers: Optional[dict] = None):
+        self.url = url
+        self.content = content
+        self.tier = tier
+        self.status = status
+        self.headers = headers or {}
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.content)
+
+
+class _TierStats:
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.latencies = deque(maxlen=1000)
+
+    def record(self, success: bool, latency: float):
+        self.attempts += 1
+        self.successes += int(success)
+        self.latencies.append(latency)
+
+    def report(self) -> dict:
+        latencies = list(self.latencies)
+        return {
+            "attempts": self.attempts,
+            "success_rate": self.successes / self.attempts if self.attempts else 0.0,
+            "latency_p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else 0.0,
+            "latency_p95_ms": float(np.percentile(latencies, 95) * 1000) if latencies else 0.0,
+        }
+
+
+def decode_html(body: bytes, content_type: str = "") -> str:
+    """
+    Decode HTML theo charset trong Content-Type, rồi <meta charset>, cuối cùng là UTF-8.
+    Không dùng response.encoding: requests trả ISO-8859-1 cho text/html không khai báo
+    charset, làm hỏng tiếng Việt.
+    """
+    candidates = []
+    match = HEADER_CHARSET_PATTERN.search(content_type)
+    if match:
+        candidates.append(match.group(1))
+    match = META_CHARSET_PATTERN.search(body[:4096])
+    if match:
+        candidates.append(match.group(1).decode("ascii", errors="ignore"))
+    for encoding in candidates:
+        try:
+            return body.decode(encoding, errors="replace")
+        except LookupError:
+            continue
+    return body.decode("utf-8", errors="replace")
+
+
+def visible_text_length(html: str) -> int:
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "template"]):
+        tag.decompose()
+    return len(" ".join(soup.get_text(" ").split()))
+
+
+class TieredFetcher:
+    """
+    Tải trang theo 2 tầng:
+    1. HTTP GET thường (session pool, keep-alive, gzip/brotli, giới hạn dung lượng);
+       bản async dùng httpx.AsyncClient nên hủy task khi hết deadline là dừng request ngay
+    2. Headless Chromium (BrowserPool) nếu HTML tĩnh có quá ít text (trang render bằng JS)
+    """
+
+    def __init__(self, min_text_chars: int = 500, max_bytes: int = 3 * 1024 * 1024,
+                 http_timeout: float = 5.0, pool_maxsize: int = 20):
+        """
+        Args:
+            min_text_chars: Số ký tự text tối thiểu để chấp nhận kết quả HTTP, ít hơn sẽ chuyển sang browser
+            max_bytes: Dung lượng tối đa đọc từ một response
+            http_timeout: Timeout (giây) cho tầng HTTP
+            pool_maxsize: Số connection giữ lại cho mỗi host
+        """
+        self.min_text_chars = min_text_chars
+        self.max_bytes = max_bytes
+        self.http_timeout = http_timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize,
+                              max_retries=Retry(total=1, backoff_factor=0.2))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool_maxsize = pool_maxsize
+        # AsyncClient gắn với event loop tạo ra nó -> mỗi loop một client
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.stats = {"http": _TierStats(), "browser": _TierStats()}
+        self.escalations = 0
+        self._stats_lock = threading.Lock()
+
+    def _record(self, tier: str, success: bool, started: float):
+        with self._stats_lock:
+            self.stats[tier].record(success, time.perf_counter() - started)
+
+    # -------------------------
+    # Tier 1: HTTP
+    # -------------------------
+    def fetch_http(self, url: str, headers: Optional[dict] = None) -> FetchResult:
+        started = time.perf_counter()
+        result = FetchResult(url, tier="http")
+        try:
+            with self.session.get(url, timeout=self.http_timeout, stream=True, headers=headers) as response:
+                result.status = response.status_code
+                result.headers = dict(response.headers)
+                content_type = response.headers.get("Content-Type", "")
+                if response.status_code == 200 and "html" in content_type:
+                    body = bytearray()
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        body.extend(chunk)
+                        if len(body) >= self.max_bytes:
+                            logger.info(f"Truncated {url} at {self.max_bytes} bytes")
+                            break
+                    result.content = decode_html(bytes(body), content_type)
+        except requests.RequestException as e:
+            logger.info(f"HTTP fetch failed for {url}: {e}")
+        return self._finish_http(result, started)
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._stats_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    headers=DEFAULT_HEADERS,
+                    timeout=self.http_timeout,
+                    follow_redirects=True,
+                    limits=httpx.Limits(max_keepalive_connections=self.pool_maxsize),
+                    transport=httpx.AsyncHTTPTransport(retries=1),
+                )
+                self._async_clients[loop] = client
+            return client
+
+    async def afetch_http(self, url: str, headers: Optional[dict] = None) -> FetchResult:
+        started = time.perf_counter()
+        result = FetchResult(url, tier="http")
+        try:
+            async with self._async_client().stream("GET", url, headers=headers) as response:
+                result.status = response.status_code
+                result.headers = dict(response.headers)
+                content_type = response.headers.get("Content-Type", "")
+                if response.status_code == 200 and "html" in content_type:
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                        body.extend(chunk)
+                        if len(body) >= self.max_bytes:
+                            logger.info(f"Truncated {url} at {self.max_bytes} bytes")
+                            break
+                    result.content = decode_html(bytes(body), content_type)
+        except httpx.HTTPError as e:
+            logger.info(f"HTTP fetch failed for {url}: {e}")
+        # Parse HTML để đếm text là CPU-bound, chạy ngoài event loop
+        return await run_detached(self._finish_http, result, started)
+
+    async def aclose(self):
+        """Đóng AsyncClient của event loop hiện tại (gọi trước khi loop kết thúc)."""
+        with self._stats_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def _finish_http(self, result: FetchResult, started: float) -> FetchResult:
+        if result.status == 304:
+            # Conditional GET: nội dung không đổi, caller dùng lại bản đã cache
+            self._record("http", True, started)
+            return result
+
+        success = bool(result.content) and visible_text_length(result.content) >= self.min_text_chars
+        self._record("http", success, started)
+        if not success:
+            result.content = ""
+        return result
+
+    # -------------------------
+    # Tier 2: Browser
+    # -------------------------
+    def fetch_browser(self, url: str, timeout: int = 10000) -> FetchResult:
+        started = time.perf_counter()
+        result = FetchResult(url, tier="browser")
+        try:
+            result.content = get_browser_pool().fetch(url, timeout=timeout)
+        except (PlaywrightError, TimeoutError) as e:
+            print(f"[WARN] Không thể truy cập {url}: {e}")
+        self._record("browser", result.ok, started)
+        return result
+
+    async def afetch_browser(self, url: str, timeout: int = 10000) -> FetchResult:
+        started = time.perf_counter()
+        result = FetchResult(url, tier="browser")
+        try:
+            result.content = await get_browser_pool().afetch(url, timeout=timeout)
+        except (PlaywrightError, TimeoutError) as e:
+            print(f"[WARN] Không thể truy cập {url}: {e}")
+        self._record("browser", result.ok, started)
+        return result
+
+    # -------------------------
+    # Tiered fetch
+    # -------------------------
+    def fetch(self, url: str, timeout: int = 10000, validators: Optional[dict] = None) -> FetchResult:
+        """
+        Args:
+            url: URL cần tải
+            timeout: Timeout (ms) cho tầng browser
+            validators: Header If-None-Match / If-Modified-Since cho conditional GET
+
+        Returns:
+            FetchResult: status 304 nếu trang không đổi so với validators
+        """
+        result = self.fetch_http(url, headers=validators)
+        if result.ok or result.status == 304:
+            return result
+        with self._stats_lock:
+            self.escalations += 1
+        return self.fetch_browser(url, timeout=timeout)
+
+    async def afetch(self, url: str, timeout: int = 10000, validators: Optional[dict] = None) -> FetchResult:
+        result = await self.afetch_http(url, headers=validators)
+        if result.ok or result.status == 304:
+            return result
+        with self._stats_lock:
+            self.escalations += 1
+        return await self.afetch_browser(url, timeout=timeout)
+
+    def report(self) -> dict:
+        with self._stats_lock:
+            return {
+                "escalations": self.escalations,
+                **{tier: stats.report() for tier, stats in self.stats.items()},
+            }
+
+
+_fetcher: Optional[TieredFetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher() -> TieredFetcher:
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = TieredFetcher()
+        return _fetcher
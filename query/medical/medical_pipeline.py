@@ -1,18 +1,26 @@
+import os
+
 from langchain_core.prompts import ChatPromptTemplate
 
 from ..core import get_llm, get_embedding_model, AnswerQuery, RephraseQuery
-from .medical_rag import MedicalRAG
+from .medical_rag import MedicalNativeRAG, MedicalHybridRAG
 from .medical_search import MedicalSearch
 from ..prompt_templates import MEDICAL_REPHRASE_PROMPT, MEDICAL_ANSWER_PROMPT, MEDICAL_SYSTEM_PROMPT, MEDICAL_HISTORY_PROMPT
 
 
 
 class MedicalPipeline:
-    def __init__(self):
+    def __init__(self, retrieval_mode: str = None):
         self.llm = get_llm()
-        self.similarity_threshold = 0.55
+        self.retrieval_mode = retrieval_mode or os.getenv("RETRIEVAL_MODE", "native")
         self.embedder = get_embedding_model(model_name="AITeamVN/Vietnamese_Embedding_v2")
-        self.medical_rag = MedicalRAG(embedder=self.embedder)
+        if self.retrieval_mode == "hybrid":
+            # Điểm RRF nằm trong khoảng rất nhỏ (~1/(60 + rank)), không so được với ngưỡng cosine
+            self.similarity_threshold = float(os.getenv("HYBRID_SCORE_THRESHOLD", "0.0"))
+            self.medical_rag = MedicalHybridRAG(embedder=self.embedder)
+        else:
+            self.similarity_threshold = 0.55
+            self.medical_rag = MedicalNativeRAG(embedder=self.embedder)
         self.medical_search = MedicalSearch(max_results=3)
         self._init_prompt()
         self._init_chains()
@@ -41,12 +49,28 @@ class MedicalPipeline:
         results = self.rephrase_chain.invoke({"query": query})
         return results.rephrased_question
 
+    async def aprocess_medical_answer(self, query: str, context: str = "") -> AnswerQuery:
+        results = await self.answer_chain.ainvoke({"query": query, "context": context})
+        return results
+
+    async def aprocess_medical_rephrase(self, query: str) -> str:
+        results = await self.rephrase_chain.ainvoke({"query": query})
+        return results.rephrased_question
+
+    def threshold_texts(self, results) -> list[str]:
+        """Text của các hit vượt similarity_threshold (tải lazy theo id nếu hit không kèm payload)."""
+        kept = [res for res in results if res.score >= self.similarity_threshold]
+        if not kept:
+            return []
+        return self.medical_rag.texts(kept)
+
     def query(self, user_query, max_attempts: int = 3) -> AnswerQuery:
         query = user_query
         for attempt in range(max_attempts):
             # 1. Query RAG to extract relevant documents
-            results = self.medical_rag.query(query)
-            thresholded_results = [res.payload["text"] for res in results if res.score >= self.similarity_threshold]
+            # Chỉ lấy id + score, text chỉ tải cho các hit vượt ngưỡng
+            results = self.medical_rag.query(query, with_payload=False)
+            thresholded_results = self.threshold_texts(results)
             # 2. If threshold is met → run RAG
             if thresholded_results:
                 context = "\n\n".join(thresholded_results)
@@ -1,36 +1,242 @@
-from http import client
+import asyncio
 import os
 import numpy as np
 from qdrant_client import models
 from qdrant_client.http.models import ScoredPoint
 from sentence_transformers import SentenceTransformer
-from ..core import get_rag_client
+from ..core import get_rag_client, get_async_rag_client, get_embedding_service, get_rerank_engine, get_retrieval_cache, \
+    get_sparse_encoder, get_vector_store, get_async_vector_store, get_quantization_search_params, get_chunk_store
+from ..core.sparse import encode_sparse_query, DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+from ..core.chunk_store import PayloadSelector, payload_key
 from dotenv import load_dotenv
 
 load_dotenv()
 
+def _search_batch(rag_client, collection_name: str, embedder, queries: list[str], limit: int, search_params=None,
+                  with_payload: PayloadSelector = True):
+    vectors = embedder.encode(queries, convert_to_numpy=True)
+    return rag_client.search_batch(
+        collection_name=collection_name,
+        requests=[
+            models.SearchRequest(vector=vector.tolist(), limit=limit, with_payload=with_payload, params=search_params)
+            for vector in vectors
+        ],
+    )
+
 class MedicalNativeRAG:
-    def __init__(self, embedder):
-        self.rag_client = get_rag_client()
+    def __init__(self, embedder, use_cache: bool = True, search_params=None):
+        # Qdrant hoặc snapshot local tùy VECTOR_STORE_BACKEND, cùng giao diện search / search_batch
+        self.rag_client = get_vector_store()
         self.collection_name = os.getenv("COLLECTION_NAME")
         # self.model_name = cfg.RAG_EMBEDDING_MODEL_NAME
         self.model = embedder
+        self.embedding_service = get_embedding_service(embedder)
+        self.cache = get_retrieval_cache() if use_cache else None
+        # Oversampling + rescore khi collection dùng vector lượng tử (QUANTIZATION_OVERSAMPLING)
+        self.search_params = search_params or get_quantization_search_params()
+        self.chunk_store = get_chunk_store(self.collection_name)
         
-    def query(self, query: str, limit=5):
-        embeddings = self.model.encode([query], convert_to_numpy=True).tolist()[0]
+    def query(self, query: str, limit=5, with_payload: PayloadSelector = True):
+        """
+        Args:
+            query: Câu hỏi
+            limit: Số hit trả về
+            with_payload: True (toàn bộ payload), False (chỉ id + score) hoặc danh sách trường;
+                dùng hydrate() để lấy text cho các hit được giữ lại
+        """
+        if self.cache is None:
+            return self._search(query, limit, with_payload)
+        key = self.cache.make_key(query, self.collection_name, "native", limit, payload_key(with_payload))
+        return self.cache.get_or_compute(key, lambda: self._search(query, limit, with_payload))
+
+    def hydrate(self, hits):
+        """Lấy text (batch retrieve theo id, có cache) cho các hit trả về không kèm payload."""
+        return self.chunk_store.hydrate(hits)
+
+    def texts(self, hits) -> list[str]:
+        """Text của các hit (bỏ hit không còn payload)."""
+        return self.chunk_store.texts(hits)
+
+    async def aquery(self, query: str, limit=5, with_payload: PayloadSelector = True):
+        """Phiên bản async của query, dùng AsyncQdrantClient."""
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(query, self.collection_name, "native", limit, payload_key(with_payload))
+            hits = self.cache.get(key)
+            if hits is not None:
+                return hits
+
+        embeddings = (await asyncio.wrap_future(self.embedding_service.submit(query))).tolist()
+        hits = await get_async_vector_store().search(
+            collection_name=self.collection_name,
+            query_vector=embeddings,
+            limit=limit,
+            search_params=self.search_params,
+            with_payload=with_payload,
+        )
+        if key is not None:
+            self.cache.put(key, hits)
+        return hits
+
+    def query_batch(self, queries: list[str], limit=5, with_payload: PayloadSelector = True) -> list[list[ScoredPoint]]:
+        """
+        Truy vấn nhiều câu hỏi: một lần encode và một request search_batch tới Qdrant.
+
+        Returns:
+            list[list[ScoredPoint]]: Kết quả theo đúng thứ tự queries
+        """
+        results = [None] * len(queries)
+        keys = [None] * len(queries)
+        missing = []
+        for i, query in enumerate(queries):
+            if self.cache is not None:
+                keys[i] = self.cache.make_key(query, self.collection_name, "native", limit, payload_key(with_payload))
+                results[i] = self.cache.get(keys[i])
+            if results[i] is None:
+                missing.append(i)
+
+        if missing:
+            batch_hits = _search_batch(
+                self.rag_client, self.collection_name, self.model,
+                [queries[i] for i in missing], limit, self.search_params, with_payload,
+            )
+            for i, hits in zip(missing, batch_hits):
+                results[i] = hits
+                if keys[i] is not None:
+                    self.cache.put(keys[i], hits)
+        return results
+
+    def _search(self, query: str, limit: int, with_payload: PayloadSelector = True):
+        embeddings = self.embedding_service.encode(query).tolist()
         hits = self.rag_client.search(
             collection_name=self.collection_name,
             query_vector=embeddings,
-            limit=limit
+            limit=limit,
+            search_params=self.search_params,
+            with_payload=with_payload,
         )
         return hits
     
-class MedicalRerankRAG:
-    def __init__(self, embedder, reranker):
+class MedicalHybridRAG:
+    """
+    Truy vấn hybrid: dense (embedding) + sparse (BM25) chạy song song phía Qdrant,
+    kết quả được trộn bằng Reciprocal Rank Fusion trong một lần query_points.
+    Điểm trả về là điểm RRF (không phải cosine), threshold cần đặt theo thang này.
+    """
+
+    def __init__(self, embedder, sparse_encoder=None, prefetch_limit: int = 20, use_cache: bool = True):
         self.rag_client = get_rag_client()
         self.collection_name = os.getenv("COLLECTION_NAME")
+        self.model = embedder
+        self.embedding_service = get_embedding_service(embedder)
+        self.sparse_encoder = sparse_encoder or get_sparse_encoder()
+        self.prefetch_limit = prefetch_limit
+        self.cache = get_retrieval_cache() if use_cache else None
+        self.chunk_store = get_chunk_store(self.collection_name)
+
+    def _request(self, dense_vector, sparse_vector, limit: int, with_payload: PayloadSelector = True) -> dict:
+        return dict(
+            prefetch=[
+                models.Prefetch(query=dense_vector, using=DENSE_VECTOR_NAME, limit=max(self.prefetch_limit, limit)),
+                models.Prefetch(query=sparse_vector, using=SPARSE_VECTOR_NAME, limit=max(self.prefetch_limit, limit)),
+            ],
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limit,
+            with_payload=with_payload,
+        )
+
+    def _key(self, query: str, limit: int, with_payload: PayloadSelector) -> tuple:
+        return self.cache.make_key(
+            query, self.collection_name, "hybrid", self.prefetch_limit, limit, payload_key(with_payload),
+        )
+
+    def query(self, query: str, limit=5, with_payload: PayloadSelector = True):
+        if self.cache is None:
+            return self._search(query, limit, with_payload)
+        key = self._key(query, limit, with_payload)
+        return self.cache.get_or_compute(key, lambda: self._search(query, limit, with_payload))
+
+    def hydrate(self, hits):
+        """Lấy text (batch retrieve theo id, có cache) cho các hit trả về không kèm payload."""
+        return self.chunk_store.hydrate(hits)
+
+    def texts(self, hits) -> list[str]:
+        """Text của các hit (bỏ hit không còn payload)."""
+        return self.chunk_store.texts(hits)
+
+    async def aquery(self, query: str, limit=5, with_payload: PayloadSelector = True):
+        """Phiên bản async của query, dùng AsyncQdrantClient."""
+        key = None
+        if self.cache is not None:
+            key = self._key(query, limit, with_payload)
+            hits = self.cache.get(key)
+            if hits is not None:
+                return hits
+
+        dense_vector = (await asyncio.wrap_future(self.embedding_service.submit(query))).tolist()
+        sparse_vector = await asyncio.to_thread(encode_sparse_query, self.sparse_encoder, query)
+        response = await get_async_rag_client().query_points(
+            collection_name=self.collection_name,
+            **self._request(dense_vector, sparse_vector, limit, with_payload),
+        )
+        hits = response.points
+        if key is not None:
+            self.cache.put(key, hits)
+        return hits
+
+    def query_batch(self, queries: list[str], limit=5, with_payload: PayloadSelector = True) -> list[list[ScoredPoint]]:
+        """
+        Truy vấn hybrid nhiều câu hỏi trong một request query_batch_points.
+
+        Returns:
+            list[list[ScoredPoint]]: Kết quả theo đúng thứ tự queries
+        """
+        results = [None] * len(queries)
+        keys = [None] * len(queries)
+        missing = []
+        for i, query in enumerate(queries):
+            if self.cache is not None:
+                keys[i] = self._key(query, limit, with_payload)
+                results[i] = self.cache.get(keys[i])
+            if results[i] is None:
+                missing.append(i)
+
+        if missing:
+            missing_queries = [queries[i] for i in missing]
+            dense_vectors = self.model.encode(missing_queries, convert_to_numpy=True)
+            responses = self.rag_client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=[
+                    models.QueryRequest(**self._request(
+                        dense.tolist(), encode_sparse_query(self.sparse_encoder, q), limit, with_payload,
+                    ))
+                    for q, dense in zip(missing_queries, dense_vectors)
+                ],
+            )
+            for i, response in zip(missing, responses):
+                results[i] = response.points
+                if keys[i] is not None:
+                    self.cache.put(keys[i], results[i])
+        return results
+
+    def _search(self, query: str, limit: int, with_payload: PayloadSelector = True):
+        dense_vector = self.embedding_service.encode(query).tolist()
+        sparse_vector = encode_sparse_query(self.sparse_encoder, query)
+        return self.rag_client.query_points(
+            collection_name=self.collection_name,
+            **self._request(dense_vector, sparse_vector, limit, with_payload),
+        ).points
+
+class MedicalRerankRAG:
+    def __init__(self, embedder, reranker, use_cache: bool = True, search_params=None):
+        self.rag_client = get_vector_store()
+        self.collection_name = os.getenv("COLLECTION_NAME")
         self.embedder = embedder
+        self.embedding_service = get_embedding_service(embedder)
         self.reranker = reranker
+        self.rerank_engine = get_rerank_engine(reranker)
+        self.cache = get_retrieval_cache() if use_cache else None
+        self.search_params = search_params or get_quantization_search_params()
         self.limit = 20
         self.top_k = 5
 
@@ -38,16 +244,18 @@ class MedicalRerankRAG:
     # 1. Dense retrieval
     # -------------------------
     def retrieve(self, query: str, limit):
-        query_embedding = self.embedder.encode(
-            [query], convert_to_numpy=True
-        ).tolist()[0]
+        query_embedding = self.embedding_service.encode(query).tolist()
 
         return self.rag_client.search(
             collection_name=self.collection_name,
             query_vector=query_embedding,
-            limit=limit
+            limit=limit,
+            search_params=self.search_params,
         )
         
+    def retrieve_batch(self, queries: list[str], limit) -> list[list[ScoredPoint]]:
+        return _search_batch(self.rag_client, self.collection_name, self.embedder, queries, limit, self.search_params)
+        
     # -------------------------
     # 2. Re-ranking
     # -------------------------
@@ -55,9 +263,10 @@ class MedicalRerankRAG:
         if not hits:
             return []
 
-        pairs = [(query, h.payload["text"]) for h in hits]
-        scores = self.reranker.predict(pairs, batch_size=1, show_progress_bar=False)
+        scores = self.rerank_engine.score(query, hits, collection_name=self.collection_name)
+        return self._combine(hits, scores, top_k)
 
+    def _combine(self, hits, scores, top_k):
         scored_hits = []
         for h, s in zip(hits, scores):
             final_score = s + 0.2 * h.score
@@ -70,6 +279,12 @@ class MedicalRerankRAG:
     # 3. Main query
     # -------------------------
     def query(self, query: str, limit1, limit2):
+        if self.cache is None:
+            return self._query(query, limit1, limit2)
+        key = self.cache.make_key(query, self.collection_name, "rerank", limit1, limit2)
+        return self.cache.get_or_compute(key, lambda: self._query(query, limit1, limit2))
+
+    def _query(self, query: str, limit1, limit2):
         hits = self.retrieve(query, limit=limit1)
 
         if not hits:
@@ -78,3 +293,29 @@ class MedicalRerankRAG:
         reranked_hits = self.rerank(query, hits, limit2)
         return  reranked_hits
 
+    def query_batch(self, queries: list[str], limit1, limit2) -> list[list[ScoredPoint]]:
+        """
+        Phiên bản batch của query: một search_batch cho tất cả câu hỏi,
+        các cặp rerank của mọi câu hỏi được chấm chung batch.
+        """
+        results = [None] * len(queries)
+        keys = [None] * len(queries)
+        missing = []
+        for i, query in enumerate(queries):
+            if self.cache is not None:
+                keys[i] = self.cache.make_key(query, self.collection_name, "rerank", limit1, limit2)
+                results[i] = self.cache.get(keys[i])
+            if results[i] is None:
+                missing.append(i)
+
+        if missing:
+            batch_hits = self.retrieve_batch([queries[i] for i in missing], limit=limit1)
+            batch_scores = self.rerank_engine.score_many(
+                [(queries[i], hits) for i, hits in zip(missing, batch_hits)],
+                collection_name=self.collection_name,
+            )
+            for i, hits, scores in zip(missing, batch_hits, batch_scores):
+                results[i] = self._combine(hits, scores, limit2)
+                if keys[i] is not None:
+                    self.cache.put(keys[i], results[i])
+        return results
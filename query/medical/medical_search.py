@@ -1,22 +1,28 @@
-import requests
-import numpy as np
+import asyncio
+from urllib.parse import urlparse
 from ddgs import DDGS
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright, TimeoutError, Error as PlaywrightError
-from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from query.core.structure import RouteQuery
 
-from ..core import AnswerQuery, get_llm
+from ..core import AnswerQuery, get_llm, SharedEmbeddings
 from ..prompt_templates import MEDICAL_ANSWER_PROMPT, MEDICAL_SYSTEM_PROMPT
+from .fetcher import get_fetcher, run_detached
+from .crawl_cache import get_crawl_cache
+from .extraction import extract_main_text
+from .web_index import WebChunkIndex, WebChunkRetriever
 
 def web_search(query: str, max_results: int = 5):
+    cache = get_crawl_cache()
+    urls = cache.get_search(query, max_results)
+    if urls is not None:
+        return urls
+
     with DDGS() as ddgs:
         results = ddgs.text(query, max_results=max_results)
     urls = [r.get("href") for r in results if r.get("href")]
+    if urls:
+        cache.put_search(query, max_results, urls)
     return urls
 
 def clean_text(soup):
@@ -30,39 +36,100 @@ def clean_text(soup):
     clean = "\n".join(lines)
     return clean
 
+def _store_page(cache, url: str, entry, result) -> str:
+    if result.status == 304:
+        cache.touch_page(url)
+        return entry["text"]
+    if result.ok:
+        # Chỉ lưu và trả về text nội dung chính, không phải HTML thô
+        text = extract_main_text(result.content)
+        if text:
+            cache.put_page(url, text, result.headers)
+            return text
+        # Extract rỗng: không cache để lần sau tải lại, không phục vụ kết quả hỏng tới hết TTL
+        print(f"[WARN] Không trích được nội dung từ {url}, không lưu cache")
+    # Lỗi mạng / extract rỗng: dùng tạm bản cũ nếu có
+    return entry["text"] if entry is not None else ""
+
 def crawl_page(url: str, timeout: int = 10000) -> str:
-    try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
-                page = browser.new_page()
-                page.goto(url, timeout=timeout)
-                content = page.content()
-                browser.close()
-                return content
-    except (PlaywrightError, TimeoutError) as e:
-        print(f"[WARN] Không thể truy cập {url}: {e}")
-        return ""
-
-    # Dùng BeautifulSoup để extract text
-    soup = BeautifulSoup(content, "html.parser")
-    text = clean_text(soup)
+    # Trang còn mới trong cache -> không cần network
+    cache = get_crawl_cache()
+    entry = cache.get_page(url)
+    if entry is not None and cache.is_fresh(entry):
+        return entry["text"]
+
+    # HTTP GET trước (conditional nếu đã có bản cũ), chỉ dùng headless Chromium khi HTML tĩnh quá ít text
+    result = get_fetcher().fetch(url, timeout=timeout, validators=cache.validators(entry))
+    text = _store_page(cache, url, entry, result)
     return text
 
+async def acrawl_page(url: str, timeout: int = 10000) -> str:
+    cache = get_crawl_cache()
+    entry = cache.get_page(url)
+    if entry is not None and cache.is_fresh(entry):
+        return entry["text"]
+
+    result = await get_fetcher().afetch(url, timeout=timeout, validators=cache.validators(entry))
+    # Extract là CPU-bound, chạy ngoài event loop (executor riêng, không chặn asyncio.run khi hết deadline)
+    return await run_detached(_store_page, cache, url, entry, result)
+
 class WebSearchCrawler:
-    def __init__(self, max_results: int = 5):
+    def __init__(self, max_results: int = 5, concurrent: bool = True, max_concurrency: int = 5,
+                 per_host_limit: int = 2, deadline: float = 15.0):
         self.max_results = max_results
+        self.concurrent = concurrent
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.deadline = deadline
 
     def search(self, query: str):
         results = web_search(query, self.max_results)
         return results
 
     def crawl(self, results):
+        if self.concurrent:
+            return asyncio.run(self._acrawl_and_close(results))
         crawled_texts = {}
         for url in results:
             text = crawl_page(url)
             crawled_texts[url] = text
         return crawled_texts
 
+    async def _acrawl_and_close(self, results):
+        try:
+            return await self.acrawl(results)
+        finally:
+            # Loop của asyncio.run() sắp đóng: đóng luôn AsyncClient gắn với nó
+            await get_fetcher().aclose()
+
+    async def acrawl(self, results):
+        """
+        Crawl đồng thời các URL với giới hạn tổng và giới hạn theo host.
+        Hết `deadline` giây thì trả về các trang đã xong, bỏ các trang còn chậm.
+        """
+        global_limit = asyncio.Semaphore(self.max_concurrency)
+        host_limits = {}
+
+        async def fetch(url):
+            host = urlparse(url).netloc
+            host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+            async with global_limit, host_limit:
+                return url, await acrawl_page(url)
+
+        urls = list(dict.fromkeys(results))
+        if not urls:
+            return {}
+        tasks = [asyncio.create_task(fetch(url)) for url in urls]
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"[WARN] Bỏ qua {len(pending)} trang chưa crawl xong sau {self.deadline}s")
+
+        finished = dict(task.result() for task in done if not task.cancelled() and task.exception() is None)
+        # Giữ thứ tự URL như kết quả tìm kiếm
+        return {url: finished[url] for url in urls if url in finished}
+
     def search_and_crawl(self, query: str):
         results = self.search(query)
         if not results:
@@ -74,30 +141,23 @@ class WebSearchCrawler:
 class WebInfoRetriever:
     def __init__(self, top_k: int = 5, threshold: float = 0.1):
         self.splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=50)
-        self.embedder = HuggingFaceEmbeddings(model_name="AITeamVN/Vietnamese_Embedding_v2")
+        self.embedder = SharedEmbeddings(model_name="AITeamVN/Vietnamese_Embedding_v2")
         self.top_k = top_k
         self.threshold = threshold
+        # Index dùng lâu dài: trang / chunk đã embed ở request trước được dùng lại
+        self.index = WebChunkIndex(embedder=self.embedder, splitter=self.splitter)
 
     def chunk_text(self, text: str):
         chunks = self.splitter.split_text(text)
         return chunks
     
     def retrieve(self, contexts: dict):
-        relevant_chunks = []
-        for url, text in contexts.items():
-            chunks = self.chunk_text(text)
-            for i, chunk in enumerate(chunks):
-                doc = Document(
-                    page_content=chunk,
-                    metadata={"source": url, "chunk_id": i}
-                )
-                relevant_chunks.append(doc)
-        if not relevant_chunks:
+        urls = [url for url, text in contexts.items() if text]
+        if not urls:
             print("No relevant chunks found.")
             return None
-        vectorstore = FAISS.from_documents(relevant_chunks, self.embedder)
-        retriever = vectorstore.as_retriever(search_kwargs={"k": self.top_k})
-        return retriever
+        self.index.add_pages({url: contexts[url] for url in urls})
+        return WebChunkRetriever(self.index, urls, k=self.top_k)
 
 
 
@@ -122,19 +182,38 @@ class MedicalSearch:
         response = self.search_chain.invoke({"query": query, "context": context})
         return response
 
+    async def aanswer_query(self, query: str, context: str):
+        response = await self.search_chain.ainvoke({"query": query, "context": context})
+        return response
+
 
     def answer(self, query: str):
+        combined_context = self._build_context(query)
+        if combined_context is None:
+            return self._no_result_answer()
+        return self.answer_query(query, combined_context)
+
+    async def aanswer(self, query: str):
+        # Crawl + embedding vẫn là sync, chạy trong thread để không chặn event loop
+        combined_context = await asyncio.to_thread(self._build_context, query)
+        if combined_context is None:
+            return self._no_result_answer()
+        return await self.aanswer_query(query, combined_context)
+
+    def _build_context(self, query: str):
         web_infos = self.web_crawler.search_and_crawl(query)
         retriever = self.info_retriever.retrieve(web_infos)
         if not retriever:
-            return AnswerQuery(answer="Xin lỗi, tôi không tìm thấy thông tin phù hợp để trả lời câu hỏi của bạn.", source="Không có nguồn.")
+            return None
         relevant_docs = retriever.invoke(query)
         print(f"Found {len(relevant_docs)} relevant documents.")
-        combined_context = "\n\n".join(
+        return "\n\n".join(
             f"[Nguồn: {doc.metadata.get('source', 'unknown')}] {doc.page_content}"
             for doc in relevant_docs
         )
-        return self.answer_query(query, combined_context)
+
+    def _no_result_answer(self):
+        return AnswerQuery(answer="Xin lỗi, tôi không tìm thấy thông tin phù hợp để trả lời câu hỏi của bạn.", source="Không có nguồn.")
 
 if __name__ == "__main__":
     medical_search = MedicalSearch(max_results=3)
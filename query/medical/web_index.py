@@ -0,0 +1,180 @@
+import hashlib
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class WebChunkIndex:
+    """
+    Index vector dùng lâu dài cho các chunk web đã crawl.
+    - Trang được nhận diện theo (URL, hash nội dung): trang không đổi thì không chunk lại
+    - Vector được lưu theo hash của chunk: chunk đã embed thì dùng lại, chỉ embed chunk mới
+    - Search chỉ trong các URL của request hiện tại
+    - Loại trang theo tuổi và theo tổng số chunk
+    """
+
+    def __init__(self, embedder, splitter, max_chunks: int = 20000, max_age: Optional[float] = 7 * 86400):
+        """
+        Args:
+            embedder: LangChain Embeddings (embed_documents / embed_query)
+            splitter: Text splitter dùng để chia trang thành chunk
+            max_chunks: Số chunk tối đa giữ trong index
+            max_age: Thời gian sống của một trang (giây), None để không hết hạn
+        """
+        self.embedder = embedder
+        self.splitter = splitter
+        self.max_chunks = max_chunks
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._pages = {}    # url -> {"hash", "chunks": [chunk_hash], "updated_at"}
+        self._vectors = {}  # chunk_hash -> (text, normalized vector)
+        self.embedded_chunks = 0
+        self.reused_chunks = 0
+
+    def add_pages(self, contexts: dict):
+        """
+        Thêm / cập nhật các trang {url: text}, chỉ embed các chunk chưa có vector.
+        """
+        new_chunks = {}
+        chunk_texts = {}  # chunk_hash -> text của mọi chunk thuộc các trang được cập nhật
+        page_updates = {}
+        with self._lock:
+            for url, text in contexts.items():
+                if not text:
+                    continue
+                page_hash = _content_hash(text)
+                page = self._pages.get(url)
+                if page is not None and page["hash"] == page_hash:
+                    page["updated_at"] = time.time()
+                    continue
+
+                chunk_hashes = []
+                for chunk in self.splitter.split_text(text):
+                    chunk_hash = _content_hash(chunk)
+                    chunk_hashes.append(chunk_hash)
+                    chunk_texts[chunk_hash] = chunk
+                    if chunk_hash in self._vectors:
+                        self.reused_chunks += 1
+                    else:
+                        new_chunks[chunk_hash] = chunk
+                page_updates[url] = {"hash": page_hash, "chunks": chunk_hashes}
+
+        # Embed ngoài lock để các request khác vẫn search được
+        vectors = self._embed(list(new_chunks.values()))
+
+        with self._lock:
+            for (chunk_hash, chunk), vector in zip(new_chunks.items(), vectors):
+                self._vectors[chunk_hash] = (chunk, vector)
+            self.embedded_chunks += len(new_chunks)
+
+            # Chunk "dùng lại" có thể đã bị evict bởi request khác trong lúc embed -> embed lại
+            missing = {
+                chunk_hash: chunk_texts[chunk_hash]
+                for page in page_updates.values() for chunk_hash in page["chunks"]
+                if chunk_hash not in self._vectors
+            }
+            if missing:
+                for (chunk_hash, chunk), vector in zip(missing.items(), self._embed(list(missing.values()))):
+                    self._vectors[chunk_hash] = (chunk, vector)
+                self.embedded_chunks += len(missing)
+
+            now = time.time()
+            for url, page in page_updates.items():
+                page["updated_at"] = now
+                self._pages[url] = page
+            self._evict()
+
+        if new_chunks or page_updates:
+            logger.info(
+                f"Web index: {len(page_updates)} page(s) (re)indexed, "
+                f"{len(new_chunks)} chunk(s) embedded, {self.reused_chunks} reused so far"
+            )
+
+    def _embed(self, texts: list[str]):
+        if not texts:
+            return []
+        vectors = np.asarray(self.embedder.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    def _evict(self):
+        if self.max_age is not None:
+            cutoff = time.time() - self.max_age
+            for url in [url for url, page in self._pages.items() if page["updated_at"] < cutoff]:
+                del self._pages[url]
+
+        total = sum(len(page["chunks"]) for page in self._pages.values())
+        if total > self.max_chunks:
+            for url, page in sorted(self._pages.items(), key=lambda item: item[1]["updated_at"]):
+                if total <= self.max_chunks:
+                    break
+                total -= len(page["chunks"])
+                del self._pages[url]
+
+        referenced = {chunk_hash for page in self._pages.values() for chunk_hash in page["chunks"]}
+        for chunk_hash in [h for h in self._vectors if h not in referenced]:
+            del self._vectors[chunk_hash]
+
+    def search(self, query: str, urls: list[str], k: int = 5) -> list[Document]:
+        """
+        Tìm k chunk gần nhất với query, chỉ trong các URL cho trước.
+        """
+        candidates = []
+        with self._lock:
+            for url in urls:
+                page = self._pages.get(url)
+                if page is None:
+                    continue
+                for chunk_id, chunk_hash in enumerate(page["chunks"]):
+                    entry = self._vectors.get(chunk_hash)
+                    if entry is None:
+                        continue
+                    text, vector = entry
+                    candidates.append((url, chunk_id, text, vector))
+
+        if not candidates:
+            return []
+
+        query_vector = np.asarray(self.embedder.embed_query(query), dtype=np.float32)
+        query_vector /= max(np.linalg.norm(query_vector), 1e-12)
+        scores = np.stack([vector for _, _, _, vector in candidates]) @ query_vector
+        top = np.argsort(-scores)[:k]
+        return [
+            Document(
+                page_content=candidates[i][2],
+                metadata={"source": candidates[i][0], "chunk_id": candidates[i][1], "score": float(scores[i])},
+            )
+            for i in top
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages": len(self._pages),
+                "vectors": len(self._vectors),
+                "embedded_chunks": self.embedded_chunks,
+                "reused_chunks": self.reused_chunks,
+            }
+
+
+class WebChunkRetriever:
+    """Retriever giới hạn trong các URL của một request, cùng giao diện invoke(query) với LangChain."""
+
+    def __init__(self, index: WebChunkIndex, urls: list[str], k: int = 5):
+        self.index = index
+        self.urls = urls
+        self.k = k
+
+    def invoke(self, query: str) -> list[Document]:
+        return self.index.search(query, self.urls, k=self.k)
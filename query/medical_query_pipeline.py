@@ -2,16 +2,23 @@
 Pipeline tích hợp hoàn chỉnh cho nhánh phía trên (Medical Knowledge path).
 Luồng: User Query -> Split Query -> K Queries -> Router -> RAG + Answer -> Eval Answer 
 -> (loop back hoặc Web search + Answer) -> Summary -> Final Answer
+Chế độ planner: User Query -> Planner (split + route + rephrase, 1 lời gọi LLM) -> RAG + Answer -> ...
 """
+import asyncio
+import os
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from .split_query import SplitQueryHandler
+from .planner import QueryPlanner
 from .router.router import Router
+from .router.embedding_router import EmbeddingRouter
 from .medical.medical_pipeline import MedicalPipeline
-from .medical.medical_search import MedicalSearch
 from .eval_answer import EvalAnswerHandler
+from .retry_strategy import RetryStrategyEngine, RetryState, RetrievalAttempt
 from .summary import SummaryHandler
 from .final_answer import FinalAnswerHandler
-from .core import AnswerQuery, FinalAnswer
+from .semantic_cache import SemanticAnswerCache
+from .core import AnswerQuery, FinalAnswer, PlannedQuery, get_collection_version
 
 import logging
 
@@ -25,21 +32,64 @@ class MedicalQueryPipeline:
     -> (loop back hoặc Web search + Answer) -> Summary -> Final Answer
     """
     
-    def __init__(self, max_retries: int = 3):
+    def __init__(self, max_retries: int = 3, max_concurrency: int = 4,
+                 use_semantic_cache: Optional[bool] = None, semantic_threshold: float = 0.92,
+                 router_mode: Optional[str] = None, plan_mode: Optional[str] = None,
+                 eval_mode: Optional[str] = None):
         """
         Khởi tạo pipeline.
         
         Args:
             max_retries: Số lần thử tối đa (M) cho RAG + Answer trước khi chuyển sang web search
+            max_concurrency: Số sub-query được xử lý song song tối đa (1 để chạy tuần tự)
+            use_semantic_cache: Bật cache câu trả lời theo ngữ nghĩa trước toàn bộ pipeline;
+                mặc định đọc SEMANTIC_CACHE (tắt) vì câu hỏi gần giống nhưng khác thuốc / liều
+                có thể nhận nhầm câu trả lời của nhau
+            semantic_threshold: Ngưỡng cosine để dùng lại câu trả lời đã lưu
+            router_mode: "llm" hoặc "embedding" (router cục bộ, chỉ gọi LLM khi margin thấp);
+                mặc định đọc ROUTER_MODE
+            plan_mode: "split" (Split -> Router -> RAG) hoặc "planner" (một lời gọi LLM cho
+                split + route + rephrase); mặc định đọc PLAN_MODE
+            eval_mode: "llm" hoặc "local" (chấm điểm cục bộ, chỉ gọi LLM judge trong vùng
+                không chắc chắn); mặc định đọc EVAL_MODE
         """
         self.split_handler = SplitQueryHandler()
-        self.router = Router()
         self.medical_pipeline = MedicalPipeline()
-        self.medical_search = MedicalSearch(max_results=3)
-        self.eval_handler = EvalAnswerHandler(max_tries=max_retries)
+        self.router = Router()
+        if (router_mode or os.getenv("ROUTER_MODE", "llm")) == "embedding":
+            self.router = EmbeddingRouter(
+                self.medical_pipeline.embedder,
+                llm_router=self.router,
+                margin=float(os.getenv("ROUTER_MARGIN", "0.05")),
+            )
+        self.planner = None
+        if (plan_mode or os.getenv("PLAN_MODE", "split")) == "planner":
+            self.planner = QueryPlanner()
+        self.medical_search = self.medical_pipeline.medical_search
+        self.eval_handler = EvalAnswerHandler(
+            max_tries=max_retries,
+            mode=eval_mode,
+            embedder=self.medical_pipeline.embedder,
+            retrieval_mode=self.medical_pipeline.retrieval_mode,
+        )
+        # Mỗi lần retry đổi limit / ngưỡng / retriever / câu truy vấn (RETRY_STRATEGIES)
+        self.retry_engine = RetryStrategyEngine(self.medical_pipeline)
         self.summary_handler = SummaryHandler()
         self.final_handler = FinalAnswerHandler()
         self.max_retries = max_retries
+        self.max_concurrency = max(1, max_concurrency)
+        self.semantic_cache = None
+        if use_semantic_cache is None:
+            use_semantic_cache = os.getenv("SEMANTIC_CACHE", "false").lower() in ("1", "true", "yes")
+        if use_semantic_cache:
+            # Snapshot trên đĩa (SEMANTIC_CACHE_PATH) giúp cache sống sót qua restart
+            self.semantic_cache = SemanticAnswerCache(
+                embedder=self.medical_pipeline.embedder,
+                similarity_threshold=semantic_threshold,
+                snapshot_path=os.getenv("SEMANTIC_CACHE_PATH"),
+                collection_name=self.medical_pipeline.medical_rag.collection_name,
+                versions=get_collection_version(),
+            )
     
     def process_query(self, user_query: str) -> FinalAnswer:
         """
@@ -53,29 +103,26 @@ class MedicalQueryPipeline:
         """
         logger.info(f"Processing query: {user_query}")
         
-        # Bước 1: Split Query thành K Queries
-        split_result = self.split_handler.split(user_query)
-        k_queries = split_result.queries
-        logger.info(f"Split into {len(k_queries)} sub-queries")
-        
-        # Bước 2: Xử lý từng query trong K queries
-        all_answers = []
+        # Bước 0: Semantic cache cho các câu hỏi diễn đạt khác nhưng cùng ý
+        cache_vector = None
+        if self.semantic_cache is not None:
+            cache_vector = self.semantic_cache.embed(user_query)
+            cached_answer = self.semantic_cache.lookup(user_query, vector=cache_vector)
+            if cached_answer is not None:
+                return cached_answer
         
-        for query in k_queries:
-            logger.info(f"Processing sub-query: {query}")
-            
-            # Bước 3: Router để xác định datasource
-            route_result = self.router.route(query)
-            logger.info(f"Routed to: {route_result.datasource}")
+        if self.planner is not None:
+            # Bước 1-3 gộp: Planner trả về sub-query đã route + search_query
+            planned = self._medical_plan(self.planner.plan(user_query).queries)
+            all_answers = [answer for answer in self._process_planned_queries(planned) if answer]
+        else:
+            # Bước 1: Split Query thành K Queries
+            split_result = self.split_handler.split(user_query)
+            k_queries = split_result.queries
+            logger.info(f"Split into {len(k_queries)} sub-queries")
             
-            # Chỉ xử lý nếu route đến medical_knowledge
-            if route_result.datasource == "medical_knowledge":
-                answer = self._process_medical_query(query)
-                if answer:
-                    all_answers.append(answer)
-            else:
-                # Nếu route đến store_database, bỏ qua (nhánh khác xử lý)
-                logger.info(f"Skipping query routed to {route_result.datasource}")
+            # Bước 2: Xử lý song song các query trong K queries, giữ nguyên thứ tự ban đầu
+            all_answers = [answer for answer in self._process_sub_queries(k_queries) if answer]
         
         # Bước 4: Summary tất cả các answers
         if not all_answers:
@@ -93,33 +140,208 @@ class MedicalQueryPipeline:
         final_answer = self.final_handler.generate(user_query, summary)
         logger.info("Generated final answer")
         
+        if self.semantic_cache is not None:
+            self.semantic_cache.add(user_query, final_answer, vector=cache_vector)
         return final_answer
     
-    def _process_medical_query(self, query: str) -> Optional[AnswerQuery]:
+    async def aprocess_query(self, user_query: str) -> FinalAnswer:
         """
-        Xử lý một câu hỏi y tế: RAG + Answer -> Eval Answer -> (loop back hoặc Web search).
+        Phiên bản async của process_query: các lời gọi LLM dùng ainvoke,
+        các sub-query chạy đồng thời trên cùng một event loop.
+        
+        Args:
+            user_query: Câu hỏi từ người dùng
+            
+        Returns:
+            FinalAnswer: Câu trả lời cuối cùng
+        """
+        logger.info(f"Processing query (async): {user_query}")
+        
+        cache_vector = None
+        if self.semantic_cache is not None:
+            cache_vector = await asyncio.to_thread(self.semantic_cache.embed, user_query)
+            cached_answer = self.semantic_cache.lookup(user_query, vector=cache_vector)
+            if cached_answer is not None:
+                return cached_answer
+        
+        if self.planner is not None:
+            items = self._medical_plan((await self.planner.aplan(user_query)).queries)
+            retrieval_queries = [planned.search_query for planned in items]
+            process = self._aprocess_planned_query
+        else:
+            split_result = await self.split_handler.asplit(user_query)
+            items = split_result.queries
+            logger.info(f"Split into {len(items)} sub-queries")
+            retrieval_queries = items
+            process = self._aprocess_sub_query
+        
+        await asyncio.to_thread(self._prefetch_retrieval, retrieval_queries)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def run(item) -> Optional[AnswerQuery]:
+            async with semaphore:
+                return await process(item)
+        
+        # gather giữ nguyên thứ tự ban đầu của sub-query
+        results = await asyncio.gather(*(run(item) for item in items))
+        all_answers = [answer for answer in results if answer]
+        
+        if not all_answers:
+            return FinalAnswer(
+                answer="Xin lỗi, tôi không tìm thấy thông tin phù hợp để trả lời câu hỏi của bạn.",
+                sources=[],
+                confidence=0.0
+            )
+        
+        summary = await self.summary_handler.asummarize(user_query, all_answers)
+        logger.info("Summarized all answers")
+        
+        final_answer = await self.final_handler.agenerate(user_query, summary)
+        logger.info("Generated final answer")
+        
+        if self.semantic_cache is not None:
+            await asyncio.to_thread(self.semantic_cache.add, user_query, final_answer, cache_vector)
+        return final_answer
+    
+    def _process_sub_queries(self, queries: list[str]) -> list[Optional[AnswerQuery]]:
+        """
+        Xử lý K sub-query (Router -> RAG + Answer -> Eval Answer), song song nếu max_concurrency > 1.
+        
+        Args:
+            queries: Danh sách các câu hỏi con
+            
+        Returns:
+            list[Optional[AnswerQuery]]: Câu trả lời theo đúng thứ tự của queries
+        """
+        self._prefetch_retrieval(queries)
+        return self._map_ordered(self._process_sub_query, queries)
+    
+    def _process_planned_queries(self, planned: list[PlannedQuery]) -> list[Optional[AnswerQuery]]:
+        """Như _process_sub_queries cho các sub-query từ planner (đã route, retrieval bằng search_query)."""
+        self._prefetch_retrieval([item.search_query for item in planned])
+        return self._map_ordered(self._process_planned_query, planned)
+    
+    def _map_ordered(self, process, items: list) -> list:
+        if self.max_concurrency == 1 or len(items) <= 1:
+            return [process(item) for item in items]
+        
+        workers = min(self.max_concurrency, len(items))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sub-query") as executor:
+            # executor.map trả kết quả theo thứ tự đầu vào
+            return list(executor.map(process, items))
+    
+    def _medical_plan(self, planned: list[PlannedQuery]) -> list[PlannedQuery]:
+        logger.info(f"Planned {len(planned)} sub-queries")
+        for item in planned:
+            if item.datasource != "medical_knowledge":
+                logger.info(f"Skipping query routed to {item.datasource}: {item.question}")
+        return [item for item in planned if item.datasource == "medical_knowledge"]
+    
+    def _process_planned_query(self, planned: PlannedQuery) -> Optional[AnswerQuery]:
+        logger.info(f"Processing planned sub-query: {planned.question} (search: {planned.search_query})")
+        try:
+            return self._process_medical_query(planned.question, search_query=planned.search_query)
+        except Exception as e:
+            logger.error(f"Error processing sub-query '{planned.question}': {e}")
+            return None
+    
+    async def _aprocess_planned_query(self, planned: PlannedQuery) -> Optional[AnswerQuery]:
+        """Phiên bản async của _process_planned_query."""
+        logger.info(f"Processing planned sub-query: {planned.question} (search: {planned.search_query})")
+        try:
+            return await self._aprocess_medical_query(planned.question, search_query=planned.search_query)
+        except Exception as e:
+            logger.error(f"Error processing sub-query '{planned.question}': {e}")
+            return None
+    
+    def _prefetch_retrieval(self, queries: list[str]):
+        """
+        Lấy trước kết quả RAG của tất cả sub-query trong một request batch tới Qdrant,
+        kết quả nằm sẵn trong retrieval cache cho các bước sau.
+        """
+        if len(queries) <= 1:
+            return
+        try:
+            self.medical_pipeline.medical_rag.query_batch(queries, with_payload=False)
+        except Exception as e:
+            logger.error(f"Error in batch retrieval prefetch: {e}")
+    
+    def _process_sub_query(self, query: str) -> Optional[AnswerQuery]:
+        """
+        Xử lý một sub-query. Lỗi được cô lập để không ảnh hưởng các sub-query khác.
+        
+        Args:
+            query: Câu hỏi con
+            
+        Returns:
+            AnswerQuery hoặc None nếu bị bỏ qua / lỗi
+        """
+        logger.info(f"Processing sub-query: {query}")
+        try:
+            # Bước 3: Router để xác định datasource
+            route_result = self.router.route(query)
+            logger.info(f"Routed to: {route_result.datasource}")
+            
+            # Chỉ xử lý nếu route đến medical_knowledge
+            if route_result.datasource != "medical_knowledge":
+                # Nếu route đến store_database, bỏ qua (nhánh khác xử lý)
+                logger.info(f"Skipping query routed to {route_result.datasource}")
+                return None
+            
+            return self._process_medical_query(query)
+        except Exception as e:
+            logger.error(f"Error processing sub-query '{query}': {e}")
+            return None
+    
+    async def _aprocess_sub_query(self, query: str) -> Optional[AnswerQuery]:
+        """Phiên bản async của _process_sub_query."""
+        logger.info(f"Processing sub-query: {query}")
+        try:
+            route_result = await self.router.aroute(query)
+            logger.info(f"Routed to: {route_result.datasource}")
+            
+            if route_result.datasource != "medical_knowledge":
+                logger.info(f"Skipping query routed to {route_result.datasource}")
+                return None
+            
+            return await self._aprocess_medical_query(query)
+        except Exception as e:
+            logger.error(f"Error processing sub-query '{query}': {e}")
+            return None
+    
+    def _process_medical_query(self, query: str, search_query: Optional[str] = None) -> Optional[AnswerQuery]:
+        """
+        Xử lý một câu hỏi y tế: RAG + Answer -> Eval Answer -> (retry với chiến lược khác hoặc Web search).
         
         Args:
             query: Câu hỏi y tế
+            search_query: Câu truy vấn dùng cho retrieval (mặc định chính query)
             
         Returns:
             AnswerQuery: Câu trả lời từ RAG hoặc Web search
         """
-        # Thử RAG + Answer với retry logic
+        state = self.retry_engine.start(query, search_query)
         for try_count in range(1, self.max_retries + 1):
             logger.info(f"Attempt {try_count}/{self.max_retries} for RAG + Answer")
             
-            # RAG + Answer
-            rag_answer = self._get_rag_answer(query)
+            # Mỗi lần thử đổi limit / ngưỡng / retriever / câu truy vấn; None nếu không còn chunk mới
+            attempt = self._get_retrieval(state)
+            if attempt is None:
+                logger.info("No new RAG context, switching to web search")
+                return self._get_web_search_answer(query)
             
+            # RAG + Answer
+            rag_answer = self._get_rag_answer(query, attempt.context)
             if not rag_answer:
-                # Nếu không có kết quả từ RAG, chuyển sang web search ngay
-                logger.info("No RAG results, switching to web search")
                 return self._get_web_search_answer(query)
             
             # Eval Answer
-            eval_result = self.eval_handler.evaluate(query, rag_answer.answer, try_count)
-            logger.info(f"Evaluation: satisfactory={eval_result.is_satisfactory}, score={eval_result.score:.2f}")
+            eval_result = self.eval_handler.evaluate(
+                query, rag_answer.answer, try_count, retrieval_scores=attempt.scores,
+            )
+            self.retry_engine.record(attempt, eval_result.is_satisfactory)
+            logger.info(f"Evaluation ({attempt.strategy}): satisfactory={eval_result.is_satisfactory}, "
+                        f"score={eval_result.score:.2f}")
             
             # Nếu đạt yêu cầu, trả về
             if eval_result.is_satisfactory:
@@ -138,31 +360,86 @@ class MedicalQueryPipeline:
         logger.info("Max retries reached, switching to web search")
         return self._get_web_search_answer(query)
     
-    def _get_rag_answer(self, query: str) -> Optional[AnswerQuery]:
+    async def _aprocess_medical_query(self, query: str, search_query: Optional[str] = None) -> Optional[AnswerQuery]:
+        """Phiên bản async của _process_medical_query."""
+        state = self.retry_engine.start(query, search_query)
+        for try_count in range(1, self.max_retries + 1):
+            logger.info(f"Attempt {try_count}/{self.max_retries} for RAG + Answer")
+            
+            attempt = await self._aget_retrieval(state)
+            if attempt is None:
+                logger.info("No new RAG context, switching to web search")
+                return await self._aget_web_search_answer(query)
+            
+            rag_answer = await self._aget_rag_answer(query, attempt.context)
+            if not rag_answer:
+                return await self._aget_web_search_answer(query)
+            
+            eval_result = await self.eval_handler.aevaluate(
+                query, rag_answer.answer, try_count, retrieval_scores=attempt.scores,
+            )
+            self.retry_engine.record(attempt, eval_result.is_satisfactory)
+            logger.info(f"Evaluation ({attempt.strategy}): satisfactory={eval_result.is_satisfactory}, "
+                        f"score={eval_result.score:.2f}")
+            
+            if eval_result.is_satisfactory:
+                logger.info("Answer is satisfactory, returning RAG answer")
+                return rag_answer
+            
+            if not eval_result.should_retry:
+                logger.info("Should not retry, switching to web search")
+                return await self._aget_web_search_answer(query)
+            
+            logger.info(f"Retrying RAG + Answer (try {try_count}/{self.max_retries})")
+        
+        logger.info("Max retries reached, switching to web search")
+        return await self._aget_web_search_answer(query)
+    
+    def _get_retrieval(self, state: RetryState) -> Optional[RetrievalAttempt]:
+        """
+        Retrieval cho lần thử tiếp theo.
+        
+        Args:
+            state: Trạng thái retry của câu hỏi
+            
+        Returns:
+            RetrievalAttempt hoặc None nếu không còn chunk mới hoặc lỗi (chuyển sang web search)
+        """
+        try:
+            return self.retry_engine.next_attempt(state)
+        except Exception as e:
+            logger.error(f"Error in RAG retrieval: {e}")
+            return None
+    
+    async def _aget_retrieval(self, state: RetryState) -> Optional[RetrievalAttempt]:
+        """Phiên bản async của _get_retrieval."""
+        try:
+            return await self.retry_engine.anext_attempt(state)
+        except Exception as e:
+            logger.error(f"Error in RAG retrieval: {e}")
+            return None
+    
+    def _get_rag_answer(self, query: str, context: str) -> Optional[AnswerQuery]:
         """
         Lấy câu trả lời từ RAG.
         
         Args:
             query: Câu hỏi
+            context: Context đã retrieval cho lần thử này
             
         Returns:
-            AnswerQuery hoặc None nếu không tìm thấy
+            AnswerQuery hoặc None nếu lỗi
         """
         try:
-            # Query RAG để lấy documents
-            results = self.medical_pipeline.medical_rag.query(query)
-            thresholded_results = [
-                res.payload["text"] 
-                for res in results 
-                if res.score >= self.medical_pipeline.similarity_threshold
-            ]
-            
-            if thresholded_results:
-                context = "\n\n".join(thresholded_results)
-                answer = self.medical_pipeline.process_medical_answer(query, context=context)
-                return answer
-            
+            return self.medical_pipeline.process_medical_answer(query, context=context)
+        except Exception as e:
+            logger.error(f"Error in RAG query: {e}")
             return None
+    
+    async def _aget_rag_answer(self, query: str, context: str) -> Optional[AnswerQuery]:
+        """Phiên bản async của _get_rag_answer."""
+        try:
+            return await self.medical_pipeline.aprocess_medical_answer(query, context=context)
         except Exception as e:
             logger.error(f"Error in RAG query: {e}")
             return None
@@ -182,8 +459,19 @@ class MedicalQueryPipeline:
             return answer
         except Exception as e:
             logger.error(f"Error in web search: {e}")
-            return AnswerQuery(
-                answer="Xin lỗi, không thể tìm kiếm thông tin trên web.",
-                source="Lỗi hệ thống"
-            )
+            return self._web_search_error_answer()
+    
+    async def _aget_web_search_answer(self, query: str) -> AnswerQuery:
+        """Phiên bản async của _get_web_search_answer."""
+        try:
+            return await self.medical_search.aanswer(query)
+        except Exception as e:
+            logger.error(f"Error in web search: {e}")
+            return self._web_search_error_answer()
+    
+    def _web_search_error_answer(self) -> AnswerQuery:
+        return AnswerQuery(
+            answer="Xin lỗi, không thể tìm kiếm thông tin trên web.",
+            source="Lỗi hệ thống"
+        )
 
@@ -0,0 +1,68 @@
+from langchain_core.prompts import ChatPromptTemplate
+from .core import get_llm, PlanQuery, PlannedQuery
+from .prompt_templates import PLANNER_SYSTEM_PROMPT, PLANNER_HUMAN_PROMPT
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryPlanner:
+    """
+    Gộp Split Query -> Router -> Rephrase thành một lời gọi LLM:
+    trả về các câu hỏi con, datasource và câu truy vấn tối ưu cho retrieval của từng câu.
+    """
+
+    def __init__(self):
+        self.llm = get_llm()
+        self.structured_llm = self.llm.with_structured_output(PlanQuery)
+        self.prompt = self._create_prompt()
+        self.plan_chain = self.prompt | self.structured_llm
+
+    def _create_prompt(self):
+        return ChatPromptTemplate.from_messages([
+            ("system", PLANNER_SYSTEM_PROMPT),
+            ("human", PLANNER_HUMAN_PROMPT),
+        ])
+
+    def plan(self, query: str) -> PlanQuery:
+        """
+        Lập kế hoạch truy vấn cho câu hỏi người dùng.
+
+        Args:
+            query: Câu hỏi gốc từ người dùng
+
+        Returns:
+            PlanQuery: Các câu hỏi con kèm datasource và search_query
+        """
+        try:
+            result = self.plan_chain.invoke({"query": query})
+            return self._postprocess(query, result)
+        except Exception as e:
+            logger.error(f"Error in planning query: {e}")
+            return self._fallback_plan(query)
+
+    async def aplan(self, query: str) -> PlanQuery:
+        """Phiên bản async của plan."""
+        try:
+            result = await self.plan_chain.ainvoke({"query": query})
+            return self._postprocess(query, result)
+        except Exception as e:
+            logger.error(f"Error in planning query: {e}")
+            return self._fallback_plan(query)
+
+    def _postprocess(self, query: str, result: PlanQuery) -> PlanQuery:
+        if not result.queries:
+            return self._fallback_plan(query)
+        for planned in result.queries:
+            # Thiếu search_query thì dùng chính câu hỏi con
+            planned.search_query = planned.search_query.strip() or planned.question
+        logger.info(f"Planned {len(result.queries)} sub-queries: {result.reasoning}")
+        return result
+
+    def _fallback_plan(self, query: str) -> PlanQuery:
+        # Fallback: một câu hỏi con là chính câu hỏi gốc, mặc định medical_knowledge
+        return PlanQuery(
+            queries=[PlannedQuery(question=query, datasource="medical_knowledge", search_query=query)],
+            reasoning="Fallback due to planning error - using original query",
+        )
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .core import get_cross_encoder
+from .medical.medical_rag import MedicalRerankRAG
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự mặc định; mỗi chiến lược được áp dụng cộng dồn lên trạng thái của lần thử trước
+DEFAULT_STRATEGIES = ("widen", "lower_threshold", "rerank", "rephrase")
+# Chiến lược tốn model / LLM: chỉ chạy khi đã có ít nhất một hit vượt ngưỡng
+COSTLY_STRATEGIES = {"rerank", "rephrase"}
+
+
+@dataclass
+class RetryState:
+    """Trạng thái retrieval của một câu hỏi qua các lần thử."""
+    query: str
+    search_query: str
+    limit: int
+    threshold: float
+    use_rerank: bool = False
+    seen_ids: set = field(default_factory=set)
+    pending: list = field(default_factory=list)
+    strategy: Optional[str] = None
+
+
+@dataclass
+class RetrievalAttempt:
+    """Kết quả retrieval của một lần thử: context cho Answer và điểm cho Eval."""
+    strategy: str
+    context: str
+    scores: list[float]
+    new_ids: int
+
+
+class RetryStrategyEngine:
+    """
+    Mỗi lần retry thay đổi một yếu tố của retrieval thay vì chạy lại y hệt:
+    tăng limit, hạ ngưỡng similarity, chuyển sang rerank, hoặc rephrase câu truy vấn.
+    Lần thử không lấy được chunk nào mới bị bỏ qua (không tốn lời gọi Answer / Eval);
+    hết chiến lược mà không có gì mới thì dừng sớm. Nếu sau widen / lower_threshold vẫn
+    không có hit nào vượt ngưỡng thì không chạy rerank / rephrase mà chuyển thẳng web search.
+    """
+
+    def __init__(self, medical_pipeline, strategies: Optional[list[str]] = None, base_limit: int = 5,
+                 widen_factor: int = 2, threshold_step: float = 0.05, min_threshold: float = 0.4,
+                 rerank_candidates: int = 20, preload_rerank: Optional[bool] = None):
+        """
+        Args:
+            medical_pipeline: MedicalPipeline (medical_rag, ngưỡng similarity, rephrase chain)
+            strategies: Thứ tự chiến lược (mặc định đọc RETRY_STRATEGIES, ví dụ "widen,rerank")
+            base_limit: Số hit của lần thử đầu tiên
+            widen_factor: Hệ số nhân limit cho chiến lược widen
+            threshold_step: Mức hạ ngưỡng similarity cho chiến lược lower_threshold
+            min_threshold: Ngưỡng similarity thấp nhất được phép
+            rerank_candidates: Số ứng viên dense trước khi rerank
+            preload_rerank: Load cross-encoder ngay khi khởi tạo (mặc định đọc RETRY_PRELOAD_RERANK, tắt)
+        """
+        self.medical_pipeline = medical_pipeline
+        if strategies is None:
+            strategies = os.getenv("RETRY_STRATEGIES", ",".join(DEFAULT_STRATEGIES)).split(",")
+        self.strategies = [name.strip() for name in strategies if name.strip()]
+        unknown = set(self.strategies) - set(DEFAULT_STRATEGIES)
+        if unknown:
+            raise ValueError(f"Unknown retry strategies: {sorted(unknown)}")
+        self.base_limit = base_limit
+        self.widen_factor = widen_factor
+        self.threshold_step = threshold_step
+        self.min_threshold = min_threshold
+        self.rerank_candidates = rerank_candidates
+
+        self._lock = threading.Lock()
+        # Cross-encoder chỉ được load khi lần đầu cần rerank, trừ khi bật preload
+        # (hoặc đã warmup_models(with_reranker=True) lúc khởi động worker)
+        self._rerank_rag = None
+        if preload_rerank is None:
+            preload_rerank = os.getenv("RETRY_PRELOAD_RERANK", "false").lower() in ("1", "true", "yes")
+        if preload_rerank and "rerank" in self.strategies:
+            self._rerank()
+        self._stats = {name: {"tried": 0, "novel": 0, "success": 0} for name in ("initial", *self.strategies)}
+
+    def start(self, query: str, search_query: Optional[str] = None) -> RetryState:
+        return RetryState(
+            query=query,
+            search_query=search_query or query,
+            limit=self.base_limit,
+            threshold=self.medical_pipeline.similarity_threshold,
+            pending=list(self.strategies),
+        )
+
+    # -------------------------
+    # Chiến lược
+    # -------------------------
+    def _apply(self, state: RetryState, strategy: str) -> bool:
+        """Áp dụng chiến lược (trừ rephrase) lên state; False nếu không còn tác dụng."""
+        if strategy == "widen":
+            state.limit *= self.widen_factor
+            return True
+        if strategy == "lower_threshold":
+            threshold = max(self.min_threshold, state.threshold - self.threshold_step)
+            if threshold >= state.threshold:
+                return False
+            state.threshold = threshold
+            return True
+        if strategy == "rerank":
+            if state.use_rerank:
+                return False
+            state.use_rerank = True
+            return True
+        return False
+
+    def _set_search_query(self, state: RetryState, rephrased: Optional[str]) -> bool:
+        if not rephrased or rephrased.strip() == state.search_query:
+            return False
+        state.search_query = rephrased.strip()
+        return True
+
+    def _exhausted(self, state: RetryState, strategy: str) -> bool:
+        if strategy in COSTLY_STRATEGIES and not state.seen_ids:
+            logger.info(f"No hit above threshold {state.threshold:.2f}, skipping '{strategy}' and later strategies")
+            state.pending.clear()
+            return True
+        return False
+
+    def _next_strategy(self, state: RetryState) -> Optional[str]:
+        while state.pending:
+            strategy = state.pending.pop(0)
+            if self._exhausted(state, strategy):
+                return None
+            if strategy == "rephrase":
+                try:
+                    rephrased = self.medical_pipeline.process_medical_rephrase(state.search_query)
+                except Exception as e:
+                    logger.error(f"Error in rephrase retry strategy: {e}")
+                    continue
+                if self._set_search_query(state, rephrased):
+                    return strategy
+            elif self._apply(state, strategy):
+                return strategy
+        return None
+
+    async def _anext_strategy(self, state: RetryState) -> Optional[str]:
+        while state.pending:
+            strategy = state.pending.pop(0)
+            if self._exhausted(state, strategy):
+                return None
+            if strategy == "rephrase":
+                try:
+                    rephrased = await self.medical_pipeline.aprocess_medical_rephrase(state.search_query)
+                except Exception as e:
+                    logger.error(f"Error in rephrase retry strategy: {e}")
+                    continue
+                if self._set_search_query(state, rephrased):
+                    return strategy
+            elif self._apply(state, strategy):
+                return strategy
+        return None
+
+    # -------------------------
+    # Retrieval
+    # -------------------------
+    def _rerank(self) -> MedicalRerankRAG:
+        with self._lock:
+            if self._rerank_rag is None:
+                self._rerank_rag = MedicalRerankRAG(self.medical_pipeline.embedder, get_cross_encoder())
+            return self._rerank_rag
+
+    def _search(self, state: RetryState):
+        if state.use_rerank:
+            return self._rerank().query(state.search_query, max(self.rerank_candidates, state.limit), state.limit)
+        return self.medical_pipeline.medical_rag.query(state.search_query, limit=state.limit, with_payload=False)
+
+    async def _asearch(self, state: RetryState):
+        if state.use_rerank:
+            return await asyncio.to_thread(
+                self._rerank().query, state.search_query, max(self.rerank_candidates, state.limit), state.limit,
+            )
+        return await self.medical_pipeline.medical_rag.aquery(state.search_query, limit=state.limit, with_payload=False)
+
+    def _attempt(self, state: RetryState, strategy: str, results) -> Optional[RetrievalAttempt]:
+        """Ghép context từ các hit vượt ngưỡng; None nếu không có chunk nào chưa dùng."""
+        if state.use_rerank:
+            # Hit rerank đã là top-`limit` theo cross-encoder: lọc theo thứ hạng, không theo ngưỡng cosine.
+            # hit.score vẫn là điểm dense nên dùng được cho Eval
+            kept = list(results)
+        else:
+            kept = [hit for hit in results if hit.score >= state.threshold]
+        new_ids = {hit.id for hit in kept} - state.seen_ids
+        state.strategy = strategy
+        self._count(strategy, "tried")
+        if not new_ids:
+            logger.info(f"Retry strategy '{strategy}' retrieved nothing new")
+            return None
+        self._count(strategy, "novel")
+        state.seen_ids |= new_ids
+        texts = self.medical_pipeline.medical_rag.texts(kept)
+        if not texts:
+            logger.info(f"Retry strategy '{strategy}' hits have no payload anymore")
+            return None
+        return RetrievalAttempt(
+            strategy=strategy,
+            context="\n\n".join(texts),
+            scores=[hit.score for hit in results],
+            new_ids=len(new_ids),
+        )
+
+    def next_attempt(self, state: RetryState) -> Optional[RetrievalAttempt]:
+        """
+        Retrieval cho lần thử tiếp theo.
+
+        Returns:
+            RetrievalAttempt hoặc None nếu không chiến lược nào còn lấy được chunk mới
+        """
+        strategy = "initial" if state.strategy is None else None
+        while True:
+            if strategy is None:
+                strategy = self._next_strategy(state)
+                if strategy is None:
+                    return None
+            attempt = self._attempt(state, strategy, self._search(state))
+            if attempt is not None:
+                return attempt
+            strategy = None
+
+    async def anext_attempt(self, state: RetryState) -> Optional[RetrievalAttempt]:
+        """Phiên bản async của next_attempt."""
+        strategy = "initial" if state.strategy is None else None
+        while True:
+            if strategy is None:
+                strategy = await self._anext_strategy(state)
+                if strategy is None:
+                    return None
+            results = await self._asearch(state)
+            attempt = await asyncio.to_thread(self._attempt, state, strategy, results)
+            if attempt is not None:
+                return attempt
+            strategy = None
+
+    # -------------------------
+    # Thống kê
+    # -------------------------
+    def record(self, attempt: RetrievalAttempt, satisfactory: bool):
+        """Ghi nhận kết quả Eval của lần thử và log tỉ lệ thành công theo chiến lược."""
+        if satisfactory:
+            self._count(attempt.strategy, "success")
+        logger.info("Retry strategy success rates: " + ", ".join(
+            f"{name}={values['success']}/{values['novel']}" for name, values in self.stats().items()
+        ))
+
+    def _count(self, strategy: str, key: str):
+        with self._lock:
+            self._stats[strategy][key] += 1
+
+    def stats(self) -> dict:
+        """{chiến lược: {"tried", "novel", "success", "success_rate"}} (success_rate trên các lần có chunk mới)."""
+        with self._lock:
+            return {
+                name: {**values, "success_rate": values["success"] / values["novel"] if values["novel"] else 0.0}
+                for name, values in self._stats.items()
+            }
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from typing import Optional
+
+import numpy as np
+
+from ..core import RouteQuery, get_embedding_service
+from .prototypes import ROUTE_PROTOTYPES
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingRouter:
+    """
+    Router cục bộ: so embedding câu hỏi với các câu mẫu có nhãn của từng route
+    (dùng lại Vietnamese embedder đã load). Chỉ gọi Router LLM khi khoảng cách điểm
+    giữa route tốt nhất và route thứ hai (margin) nhỏ hơn ngưỡng.
+    """
+
+    def __init__(self, embedder, llm_router=None, prototypes: Optional[dict] = None,
+                 margin: float = 0.05, top_k: int = 3):
+        """
+        Args:
+            embedder: SentenceTransformer dùng chung với RAG
+            llm_router: Router LLM dùng khi margin thấp (None để luôn quyết định cục bộ)
+            prototypes: {route: [câu mẫu]} (mặc định ROUTE_PROTOTYPES)
+            margin: Margin tối thiểu để quyết định không cần LLM
+            top_k: Điểm của một route là trung bình k câu mẫu gần nhất
+        """
+        self.embedding_service = get_embedding_service(embedder)
+        self.llm_router = llm_router
+        self.margin = margin
+        self.top_k = top_k
+        self.prototypes = prototypes or ROUTE_PROTOTYPES
+        self.routes = list(self.prototypes)
+
+        texts = [text for route in self.routes for text in self.prototypes[route]]
+        vectors = np.asarray(self.embedding_service.encode_many(texts), dtype=np.float32)
+        self._vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self._labels = np.array([i for i, route in enumerate(self.routes) for _ in self.prototypes[route]])
+
+        self._lock = threading.Lock()
+        self.total = 0
+        self.local = 0
+
+    def scores(self, vector) -> dict:
+        """Điểm tương đồng của câu hỏi (vector) với từng route."""
+        vector = np.asarray(vector, dtype=np.float32)
+        similarities = self._vectors @ (vector / max(np.linalg.norm(vector), 1e-12))
+        scores = {}
+        for i, route in enumerate(self.routes):
+            route_similarities = np.sort(similarities[self._labels == i])[::-1]
+            scores[route] = float(route_similarities[:self.top_k].mean())
+        return scores
+
+    def classify(self, vector) -> tuple[str, float]:
+        """Trả về (route tốt nhất, margin so với route thứ hai)."""
+        ranked = sorted(self.scores(vector).items(), key=lambda item: item[1], reverse=True)
+        margin = ranked[0][1] - ranked[1][1] if len(ranked) > 1 else ranked[0][1]
+        return ranked[0][0], margin
+
+    def _decide(self, question: str, vector) -> Optional[RouteQuery]:
+        route, margin = self.classify(vector)
+        local = margin >= self.margin or self.llm_router is None
+        with self._lock:
+            self.total += 1
+            self.local += int(local)
+        if not local:
+            logger.info(f"Embedding router margin {margin:.3f} too low, asking LLM router")
+            return None
+        logger.info(f"Routed question to: {route} (embedding, margin={margin:.3f})")
+        return RouteQuery(datasource=route, reasoning=f"Embedding router, margin={margin:.3f}")
+
+    def route(self, question: str) -> RouteQuery:
+        result = self._decide(question, self.embedding_service.encode(question))
+        return result if result is not None else self.llm_router.route(question)
+
+    async def aroute(self, question: str) -> RouteQuery:
+        vector = await asyncio.wrap_future(self.embedding_service.submit(question))
+        result = self._decide(question, vector)
+        return result if result is not None else await self.llm_router.aroute(question)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "total": self.total,
+                "local": self.local,
+                "llm": self.total - self.local,
+                "local_fraction": self.local / self.total if self.total else 0.0,
+            }
@@ -0,0 +1,48 @@
+# Câu mẫu có nhãn cho EmbeddingRouter, mỗi route một nhóm câu đại diện.
+# Không trùng với data/routing_eval_set.json để benchmark không bị rò rỉ.
+ROUTE_PROTOTYPES = {
+    "medical_knowledge": [
+        "Thuốc này có công dụng gì?",
+        "Thuốc được chỉ định điều trị bệnh gì?",
+        "Liều dùng cho người lớn là bao nhiêu?",
+        "Trẻ em uống thuốc này với liều như thế nào?",
+        "Cách sử dụng thuốc nhỏ mắt đúng cách",
+        "Thuốc có tác dụng phụ gì không?",
+        "Tác dụng không mong muốn thường gặp của thuốc",
+        "Phụ nữ mang thai và cho con bú có dùng được không?",
+        "Chống chỉ định của thuốc là gì?",
+        "Cần thận trọng gì khi dùng thuốc?",
+        "Thuốc có tương tác với thuốc khác không?",
+        "Thành phần hoạt chất của thuốc gồm những gì?",
+        "Bảo quản thuốc như thế nào?",
+        "Quá liều thì phải xử trí ra sao?",
+        "Quên một liều thì phải làm gì?",
+        "Tôi bị đau đầu, sốt thì nên dùng thuốc gì?",
+        "Siro ho này có dùng cho trẻ nhỏ được không?",
+        "Thuốc kháng sinh này điều trị viêm họng được không?",
+        "Uống thuốc trước hay sau bữa ăn?",
+        "Người suy gan, suy thận có cần chỉnh liều không?",
+    ],
+    "store_database": [
+        "Giá bán của thuốc này là bao nhiêu?",
+        "Thuốc này bán với giá bao nhiêu tiền một hộp?",
+        "Cửa hàng còn bao nhiêu hộp trong kho?",
+        "Sản phẩm này còn hàng không?",
+        "Tồn kho hiện tại của thuốc là bao nhiêu?",
+        "Doanh thu tháng này của cửa hàng là bao nhiêu?",
+        "Tổng doanh thu bán thuốc trong quý vừa rồi",
+        "Tháng trước đã bán được bao nhiêu hộp?",
+        "Số lượng đã bán của sản phẩm trong tuần này",
+        "Thuốc nào bán chạy nhất tháng này?",
+        "Top 5 sản phẩm có doanh số cao nhất",
+        "Lợi nhuận của nhà thuốc năm nay là bao nhiêu?",
+        "Giá nhập và giá bán lẻ của thuốc chênh lệch bao nhiêu?",
+        "Có bao nhiêu đơn hàng trong ngày hôm nay?",
+        "Danh sách các thuốc sắp hết hàng",
+        "Lô thuốc nào sắp hết hạn trong kho?",
+        "Khách hàng mua nhiều nhất tháng này là ai?",
+        "Nhà cung cấp nào giao hàng cho thuốc này?",
+        "Thống kê số lượng nhập kho theo tháng",
+        "Hóa đơn bán hàng hôm qua tổng cộng bao nhiêu tiền?",
+    ],
+}
@@ -30,8 +30,20 @@ class Router:
             return result
         except Exception as e:
             logger.error(f"Error in routing: {e}")
-            # Default to medical knowledge if routing fails
-            return RouteQuery(
-                datasource="medical_knowledge",
-                reasoning="Fallback due to routing error",
-            )
+            return self._fallback_route()
+
+    async def aroute(self, question: str) -> RouteQuery:
+        try:
+            result = await self.router_chain.ainvoke({"question": question})
+            logger.info(f"Routed question to: {result.datasource} - {result.reasoning}")
+            return result
+        except Exception as e:
+            logger.error(f"Error in routing: {e}")
+            return self._fallback_route()
+
+    def _fallback_route(self) -> RouteQuery:
+        # Default to medical knowledge if routing fails
+        return RouteQuery(
+            datasource="medical_knowledge",
+            reasoning="Fallback due to routing error",
+        )
@@ -0,0 +1,222 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from .core import FinalAnswer, CollectionVersion, get_embedding_service
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời theo ngữ nghĩa: câu hỏi mới được embed và so khớp cosine với
+    các câu hỏi đã trả lời. Nếu độ tương đồng vượt ngưỡng thì trả lại FinalAnswer đã lưu.
+    Dựa trên kiến trúc: User Query -> Semantic Cache -> (hit: Final Answer | miss: Split Query ...)
+    Cache bị xóa khi version của collection đổi (re-index ở process khác).
+    """
+
+    def __init__(self, embedder, similarity_threshold: float = 0.92, max_size: int = 5000,
+                 ttl: Optional[float] = 86400, snapshot_path: Optional[str] = None,
+                 autosave_every: int = 20, collection_name: Optional[str] = None,
+                 versions: Optional[CollectionVersion] = None):
+        """
+        Khởi tạo SemanticAnswerCache.
+
+        Args:
+            embedder: SentenceTransformer đã load (dùng chung với RAG)
+            similarity_threshold: Ngưỡng cosine để coi hai câu hỏi là một
+            max_size: Số câu hỏi tối đa trong cache, vượt quá sẽ loại câu cũ nhất
+            ttl: Thời gian sống của một câu trả lời (giây), None để không hết hạn
+            snapshot_path: File snapshot trên đĩa (.npz) để cache sống sót qua restart
+            autosave_every: Tự ghi snapshot sau mỗi N lần thêm mới
+            collection_name: Collection mà câu trả lời được lấy từ đó
+            versions: Version của collection dùng chung giữa các process
+        """
+        self.embedding_service = get_embedding_service(embedder)
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.autosave_every = autosave_every
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._entries = []  # [{"question", "answer", "created_at"}]
+        self._pending_saves = 0
+        self.hits = 0
+        self.misses = 0
+        self.collection_name = collection_name
+        self.versions = versions
+        self._version = self._current_version()
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load(snapshot_path)
+
+    def _current_version(self) -> str:
+        if self.versions is None or not self.collection_name:
+            return ""
+        return self.versions.current(self.collection_name)
+
+    def _check_version(self):
+        version = self._current_version()
+        with self._lock:
+            if version == self._version:
+                return
+            self._version = version
+            removed = len(self._entries)
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._entries = []
+        logger.info(f"Collection {self.collection_name} re-indexed, dropped {removed} cached answers")
+
+    def embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embedding_service.encode(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, query: str, vector: Optional[np.ndarray] = None) -> Optional[FinalAnswer]:
+        """
+        Tìm câu trả lời đã lưu cho câu hỏi tương tự.
+
+        Args:
+            query: Câu hỏi người dùng
+            vector: Embedding đã chuẩn hóa của query (nếu đã tính trước)
+
+        Returns:
+            FinalAnswer hoặc None nếu không có câu hỏi nào đủ giống
+        """
+        vector = self.embed(query) if vector is None else vector
+        self._check_version()
+        with self._lock:
+            self._evict_expired()
+            if not self._entries or self._vectors.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            entry = self._entries[best]
+            logger.info(
+                f"Semantic cache hit ({similarities[best]:.3f}): '{query}' ~ '{entry['question']}'"
+            )
+            return FinalAnswer(**entry["answer"])
+
+    def add(self, query: str, answer: FinalAnswer, vector: Optional[np.ndarray] = None):
+        """
+        Lưu câu trả lời cho câu hỏi. Câu trả lời có confidence = 0 (không tìm thấy) sẽ bị bỏ qua.
+        """
+        if answer.confidence <= 0.0:
+            return
+        vector = self.embed(query) if vector is None else vector
+        self._check_version()
+        with self._lock:
+            entry = {"question": query, "answer": answer.model_dump(), "created_at": time.time()}
+            if self._entries and self._vectors.shape[1] != vector.shape[0]:
+                logger.warning("Embedding dimension changed, clearing semantic cache")
+                self._vectors = np.zeros((0, 0), dtype=np.float32)
+                self._entries = []
+            if self._entries:
+                self._vectors = np.vstack([self._vectors, vector[None, :]])
+            else:
+                self._vectors = vector[None, :].astype(np.float32)
+            self._entries.append(entry)
+
+            # Các entry được thêm theo thời gian -> entry cũ nhất luôn ở đầu
+            overflow = len(self._entries) - self.max_size
+            if overflow > 0:
+                self._drop_first(overflow)
+
+            self._pending_saves += 1
+            should_save = self.snapshot_path and self._pending_saves >= self.autosave_every
+
+        if should_save:
+            self.save()
+
+    def _evict_expired(self):
+        if self.ttl is None or not self._entries:
+            return
+        cutoff = time.time() - self.ttl
+        expired = 0
+        while expired < len(self._entries) and self._entries[expired]["created_at"] < cutoff:
+            expired += 1
+        if expired:
+            self._drop_first(expired)
+
+    def _drop_first(self, count: int):
+        self._entries = self._entries[count:]
+        self._vectors = self._vectors[count:]
+
+    def save(self, path: Optional[str] = None):
+        """Ghi snapshot (vectors + câu trả lời) ra file .npz."""
+        path = path or self.snapshot_path
+        if not path:
+            return
+        with self._lock:
+            vectors = self._vectors.copy()
+            entries = json.dumps(self._entries, ensure_ascii=False)
+            version = self._version
+            self._pending_saves = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=vectors, entries=np.array(entries), version=np.array(version))
+        os.replace(tmp_path, path)
+        logger.info(f"Saved semantic cache snapshot ({len(self._entries)} entries) to {path}")
+
+    def load(self, path: str):
+        """Nạp snapshot từ file .npz."""
+        try:
+            with np.load(path) as data:
+                vectors = data["vectors"].astype(np.float32)
+                entries = json.loads(str(data["entries"]))
+                version = str(data["version"]) if "version" in data.files else ""
+        except Exception as e:
+            logger.error(f"Cannot load semantic cache snapshot {path}: {e}")
+            return
+
+        # Snapshot từ embedder khác (khác số chiều) không dùng được -> bỏ qua
+        dimension = self.embedding_service.model.get_sentence_embedding_dimension()
+        if len(entries) and (vectors.ndim != 2 or vectors.shape[1] != dimension):
+            logger.warning(
+                f"Discarding semantic cache snapshot {path}: dimension {vectors.shape[-1]} != {dimension}"
+            )
+            return
+        # Snapshot ghi trước lần re-index gần nhất chứa câu trả lời từ dữ liệu cũ
+        if version != self._version:
+            logger.warning(f"Discarding semantic cache snapshot {path}: collection version changed")
+            return
+
+        with self._lock:
+            self._vectors = vectors
+            self._entries = entries
+            self._evict_expired()
+            overflow = len(self._entries) - self.max_size
+            if overflow > 0:
+                self._drop_first(overflow)
+        logger.info(f"Loaded semantic cache snapshot ({len(self._entries)} entries) from {path}")
+
+    def clear(self):
+        with self._lock:
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._entries = []
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
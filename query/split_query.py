@@ -1,3 +1,7 @@
+import re
+import threading
+import unicodedata
+
 from langchain_core.prompts import ChatPromptTemplate
 from .core import get_llm, SplitQuery
 from .prompt_templates import SPLIT_QUERY_SYSTEM_PROMPT, SPLIT_QUERY_HUMAN_PROMPT
@@ -6,6 +10,80 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Dấu hiệu chắc chắn có nhiều ý: so sánh, liệt kê, nhiều dấu hỏi
+MULTI_INTENT_PATTERN = re.compile(
+    r"\b(so với|khác với|khác biệt|khác nhau|giống nhau|so sánh|cái nào|tốt hơn|hiệu quả hơn|"
+    r"đồng thời|cũng như|ngoài ra|bên cạnh đó|thêm vào đó)\b|;|\?.+\?",
+    re.IGNORECASE,
+)
+# Hai tên riêng (thường là tên thuốc) nối bằng liên từ / dấu phẩy: "Panadol và Efferalgan", "Panadol hay Aspirin"
+ENTITY_CONJUNCTION_PATTERN = re.compile(r"\b(\w[\w-]*)\s*(?:,|\bvà\b|\bhay\b|\bhoặc\b|\bvới\b)\s*(\w[\w-]*)")
+QUESTION_MARKER_PATTERN = re.compile(
+    r"\b(gì|bao nhiêu|như thế nào|thế nào|ra sao|nào|có nên|được không|hay không|không\s*\?|là ai|khi nào|"
+    r"ở đâu|tại sao|vì sao)",
+    re.IGNORECASE,
+)
+# Các nhóm thông tin về thuốc; câu hỏi chạm >= 2 nhóm thường cần tách
+INTENT_PATTERNS = {
+    "usage": re.compile(r"công dụng|tác dụng gì|(?<!chống )chỉ định|điều trị|dùng để|sử dụng để|hỗ trợ", re.IGNORECASE),
+    "dosage": re.compile(r"(?<!quá )(?<!quên )liều|cách dùng|cách sử dụng|uống (mấy|bao nhiêu)", re.IGNORECASE),
+    "side_effect": re.compile(r"tác dụng phụ|tác dụng không mong muốn|phản ứng phụ", re.IGNORECASE),
+    "caution": re.compile(r"lưu ý|thận trọng|chống chỉ định|mang thai|cho con bú", re.IGNORECASE),
+    "ingredient": re.compile(r"thành phần|hoạt chất", re.IGNORECASE),
+    "storage": re.compile(r"bảo quản", re.IGNORECASE),
+    "interaction": re.compile(r"tương tác", re.IGNORECASE),
+    "overdose": re.compile(r"quá liều|quên liều", re.IGNORECASE),
+    "store": re.compile(r"giá|tồn kho|doanh thu|còn hàng|đã bán", re.IGNORECASE),
+}
+# Dấu phẩy / liên từ ngăn cách hai mệnh đề hỏi
+CLAUSE_SEPARATOR_PATTERN = re.compile(r",|\b(và|hoặc|với cả|còn)\b", re.IGNORECASE)
+
+
+class SingleIntentClassifier:
+    """
+    Nhận diện nhanh câu hỏi chỉ có một ý (không cần LLM tách) bằng heuristic:
+    độ dài, liên từ, mẫu so sánh / liệt kê và số nhóm thông tin được hỏi.
+    Ưu tiên precision: trường hợp không chắc chắn vẫn đi qua LLM.
+    """
+
+    def __init__(self, max_words: int = 30):
+        self.max_words = max_words
+
+    def classify(self, query: str) -> tuple[bool, str]:
+        """
+        Returns:
+            tuple[bool, str]: (có phải câu một ý không, lý do)
+        """
+        text = unicodedata.normalize("NFC", query)
+        # Bỏ phần trong ngoặc (thường là chú thích / tên nhóm thông tin)
+        text = re.sub(r"\([^)]*\)", "", text)
+        if len(text.split()) > self.max_words:
+            return False, "long question"
+        if MULTI_INTENT_PATTERN.search(text):
+            return False, "comparison or enumeration"
+        # Đếm nhóm thông tin trên mọi câu hỏi: các ý có thể nối bằng dấu phẩy hoặc không có liên từ
+        intents = [name for name, pattern in INTENT_PATTERNS.items() if pattern.search(text)]
+        if "store" in intents and len(intents) >= 2:
+            return False, f"medical and store intents: {', '.join(intents)}"
+        if len(intents) >= 2:
+            return False, f"multiple intents: {', '.join(intents)}"
+        if len(QUESTION_MARKER_PATTERN.findall(text)) >= 2 and CLAUSE_SEPARATOR_PATTERN.search(text):
+            return False, "multiple questions"
+        # Câu hỏi tương tác vốn nhắc hai thuốc nhưng chỉ có một ý
+        if intents != ["interaction"] and self._has_multiple_entities(text):
+            return False, "multiple entities"
+        return True, "single intent"
+
+    @staticmethod
+    def _has_multiple_entities(text: str) -> bool:
+        return any(
+            left[0].isupper() and right[0].isupper()
+            for left, right in ENTITY_CONJUNCTION_PATTERN.findall(text)
+        )
+
+    def is_single_intent(self, query: str) -> bool:
+        return self.classify(query)[0]
+
 
 class SplitQueryHandler:
     """
@@ -13,11 +91,19 @@ class SplitQueryHandler:
     Dựa trên kiến trúc: User Query -> Split Query -> K Queries
     """
     
-    def __init__(self):
+    def __init__(self, use_heuristic: bool = True):
+        """
+        Args:
+            use_heuristic: Bỏ qua LLM cho câu hỏi một ý (SingleIntentClassifier)
+        """
         self.llm = get_llm()
         self.structured_llm = self.llm.with_structured_output(SplitQuery)
         self.prompt = self._create_prompt()
         self.split_chain = self.prompt | self.structured_llm
+        self.classifier = SingleIntentClassifier() if use_heuristic else None
+        self._lock = threading.Lock()
+        self.total = 0
+        self.bypassed = 0
     
     def _create_prompt(self):
         """Tạo prompt template cho việc chia câu hỏi."""
@@ -36,17 +122,62 @@ class SplitQueryHandler:
         Returns:
             SplitQuery: Đối tượng chứa danh sách các câu hỏi con và lý do chia
         """
+        shortcut = self._shortcut(query)
+        if shortcut is not None:
+            return shortcut
         try:
             result = self.split_chain.invoke({"query": query})
             logger.info(f"Split query into {len(result.queries)} sub-queries: {result.reasoning}")
             return result
         except Exception as e:
             logger.error(f"Error in splitting query: {e}")
-            # Fallback: trả về chính câu hỏi gốc nếu có lỗi
-            return SplitQuery(
-                queries=[query],
-                reasoning="Fallback due to splitting error - using original query"
-            )
+            return self._fallback_split(query)
+    
+    async def asplit(self, query: str) -> SplitQuery:
+        """
+        Phiên bản async của split, dùng ainvoke để không chặn event loop.
+        
+        Args:
+            query: Câu hỏi gốc từ người dùng
+            
+        Returns:
+            SplitQuery: Đối tượng chứa danh sách các câu hỏi con và lý do chia
+        """
+        shortcut = self._shortcut(query)
+        if shortcut is not None:
+            return shortcut
+        try:
+            result = await self.split_chain.ainvoke({"query": query})
+            logger.info(f"Split query into {len(result.queries)} sub-queries: {result.reasoning}")
+            return result
+        except Exception as e:
+            logger.error(f"Error in splitting query: {e}")
+            return self._fallback_split(query)
+    
+    def _shortcut(self, query: str):
+        single = self.classifier is not None and self.classifier.is_single_intent(query)
+        with self._lock:
+            self.total += 1
+            self.bypassed += int(single)
+        if not single:
+            return None
+        logger.info("Single-intent question, skipping LLM split")
+        return SplitQuery(queries=[query], reasoning="Single-intent question (heuristic) - not split")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "total": self.total,
+                "bypassed": self.bypassed,
+                "bypass_rate": self.bypassed / self.total if self.total else 0.0,
+            }
+
+    def _fallback_split(self, query: str) -> SplitQuery:
+        # Fallback: trả về chính câu hỏi gốc nếu có lỗi
+        return SplitQuery(
+            queries=[query],
+            reasoning="Fallback due to splitting error - using original query"
+        )
     
     def get_queries(self, query: str) -> list[str]:
         """
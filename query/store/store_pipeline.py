@@ -0,0 +1,484 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from qdrant_client import models
+
+from ..core import get_rag_client, get_embedding_model, get_collection_version, get_sparse_encoder
+from ..core.sparse import DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME, encode_sparse_documents
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "AITeamVN/Vietnamese_Embedding_v2"
+DEFAULT_TEXT_FIELDS = ("text", "content")
+# Các trường metadata ngắn được giữ lại trong payload
+DEFAULT_METADATA_FIELDS = ("name", "drug", "title", "manufacturer", "url", "source")
+
+
+@dataclass
+class Chunk:
+    id: int
+    doc_id: str
+    chunk_index: int
+    text: str
+    content_hash: str
+    metadata: dict = field(default_factory=dict)
+
+    def payload(self) -> dict:
+        return {
+            "text": self.text,
+            "doc_id": self.doc_id,
+            "chunk_index": self.chunk_index,
+            "content_hash": self.content_hash,
+            **self.metadata,
+        }
+
+
+@dataclass
+class IngestionStats:
+    records: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    unchanged: int = 0
+    upserted: int = 0
+    deleted: int = 0
+    resumed: int = 0
+    chars: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def report(self) -> dict:
+        return {
+            "records": self.records,
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "unchanged": self.unchanged,
+            "upserted": self.upserted,
+            "deleted": self.deleted,
+            "resumed": self.resumed,
+            "elapsed_s": round(self.elapsed, 2),
+            "chunks_per_s": round(self.embedded / self.elapsed, 2) if self.elapsed else 0.0,
+        }
+
+
+# -------------------------
+# 1. Đọc corpus
+# -------------------------
+def iter_records(path: str) -> Iterator[dict]:
+    """
+    Đọc corpus thuốc từ JSONL (stream từng dòng) hoặc JSON (mảng bản ghi,
+    hoặc object có khóa "data" / "documents").
+    """
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("data") or data.get("documents") or []
+    yield from data
+
+
+def record_text(record: dict, text_fields: tuple = DEFAULT_TEXT_FIELDS) -> str:
+    """Text của bản ghi: trường text nếu có, ngược lại ghép các trường chuỗi thành "key: value"."""
+    for name in text_fields:
+        if isinstance(record.get(name), str) and record[name].strip():
+            return record[name].strip()
+    return "\n".join(
+        f"{key}: {value.strip()}" for key, value in record.items()
+        if isinstance(value, str) and value.strip()
+    )
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _hash_id(doc_id: str, chunk_index: int) -> int:
+    # Id số nguyên 63 bit, không đổi khi thêm / bớt bản ghi khác trong corpus
+    return int.from_bytes(hashlib.sha1(f"{doc_id}:{chunk_index}".encode("utf-8")).digest()[:8], "big") >> 1
+
+
+# -------------------------
+# 2. Chunking
+# -------------------------
+class CorpusChunker:
+    """
+    Chia corpus thành chunk một cách tất định: cùng corpus + cùng cấu hình -> cùng chunk, cùng id.
+    - id_mode="sequential": id tăng dần theo thứ tự chunk (giống collection hiện tại, id 1..N)
+    - id_mode="hash": id tính từ (doc_id, chunk_index), ổn định khi corpus thêm / bớt bản ghi
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 100, id_mode: str = "sequential",
+                 start_id: int = 1, text_fields: tuple = DEFAULT_TEXT_FIELDS,
+                 metadata_fields: tuple = DEFAULT_METADATA_FIELDS, id_field: str = "id"):
+        if id_mode not in ("sequential", "hash"):
+            raise ValueError(f"Unknown id_mode: {id_mode}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.id_mode = id_mode
+        self.start_id = start_id
+        self.text_fields = text_fields
+        self.metadata_fields = metadata_fields
+        self.id_field = id_field
+
+    def chunks(self, records) -> Iterator[Chunk]:
+        next_id = self.start_id
+        for position, record in enumerate(records):
+            text = record_text(record, self.text_fields)
+            if not text:
+                continue
+            doc_id = str(record.get(self.id_field, position))
+            metadata = {key: record[key] for key in self.metadata_fields if key in record}
+            for chunk_index, chunk_text in enumerate(self.splitter.split_text(text)):
+                chunk_id = next_id if self.id_mode == "sequential" else _hash_id(doc_id, chunk_index)
+                next_id += 1
+                yield Chunk(chunk_id, doc_id, chunk_index, chunk_text, _content_hash(chunk_text), metadata)
+
+
+# -------------------------
+# 3. Embedding (process pool)
+# -------------------------
+_worker_model = None
+
+
+def _init_embedding_worker(model_name: str, device: Optional[str]):
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name, device=device)
+
+
+def _embed_in_worker(texts: list[str], batch_size: int) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+
+
+class EmbeddingPool:
+    """
+    Embed theo batch lớn. workers <= 1 dùng model trong process (phù hợp GPU),
+    workers > 1 chia batch cho một pool process (mỗi process load model một lần, phù hợp CPU).
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, workers: int = 1, batch_size: int = 64,
+                 device: Optional[str] = None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self._model = None
+        self._executor = None
+        if workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_embedding_worker, initargs=(model_name, device),
+            )
+        else:
+            self._model = get_embedding_model(model_name, device=device)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if self._executor is None:
+            return self._model.encode(
+                texts, batch_size=self.batch_size, convert_to_numpy=True, normalize_embeddings=True,
+            )
+        parts = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(list(self._executor.map(_embed_in_worker, parts, [self.batch_size] * len(parts))))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+# -------------------------
+# 4. Checkpoint
+# -------------------------
+class IngestionCheckpoint:
+    """Lưu vị trí chunk đã upsert xong để chạy lại tiếp từ đó."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def position(self, fingerprint: str) -> int:
+        if self.state.get("fingerprint") != fingerprint:
+            return 0
+        return self.state.get("position", 0)
+
+    def save(self, fingerprint: str, position: int, stats: IngestionStats):
+        if not self.path:
+            return
+        self.state = {"fingerprint": fingerprint, "position": position, "stats": stats.report()}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# -------------------------
+# 5. Pipeline
+# -------------------------
+class StorePipeline:
+    """
+    Ingest corpus vào collection Qdrant:
+    đọc (stream) -> chunk tất định -> embed batch lớn (process pool) -> upsert song song theo batch,
+    có checkpoint để chạy tiếp, chế độ diff chỉ embed chunk thay đổi và dry run ước lượng kích thước.
+    """
+
+    def __init__(self, collection_name: Optional[str] = None, chunker: Optional[CorpusChunker] = None,
+                 workers: int = 1, embed_batch_size: int = 64, window_size: int = 2048,
+                 upsert_batch_size: int = 256, upsert_parallel: int = 4, with_sparse: bool = False,
+                 checkpoint_path: Optional[str] = None, model_name: str = EMBEDDING_MODEL_NAME):
+        """
+        Args:
+            collection_name: Tên collection (mặc định COLLECTION_NAME)
+            chunker: CorpusChunker (mặc định chunk 1000 ký tự, id tuần tự)
+            workers: Số process embed (<= 1 để embed trong process)
+            embed_batch_size: Batch size của model embedding
+            window_size: Số chunk xử lý mỗi vòng (embed + upsert + checkpoint)
+            upsert_batch_size: Số điểm mỗi request upsert
+            upsert_parallel: Số request upsert chạy song song
+            with_sparse: Ghi kèm sparse vector BM25 (cho hybrid retrieval)
+            checkpoint_path: File checkpoint, None để tắt
+            model_name: Model embedding
+        """
+        self.collection_name = collection_name or os.getenv("COLLECTION_NAME")
+        self.chunker = chunker or CorpusChunker()
+        self.workers = workers
+        self.embed_batch_size = embed_batch_size
+        self.window_size = window_size
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_parallel = upsert_parallel
+        self.with_sparse = with_sparse
+        self.checkpoint = IngestionCheckpoint(checkpoint_path)
+        self.model_name = model_name
+
+    def _fingerprint(self, path: str, diff: bool) -> str:
+        stat = os.stat(path)
+        return _content_hash(json.dumps([
+            os.path.abspath(path), stat.st_size, stat.st_mtime, self.collection_name, self.model_name,
+            self.chunker.chunk_size, self.chunker.chunk_overlap, self.chunker.id_mode, diff,
+        ]))
+
+    def ensure_collection(self, client, dim: int):
+        if client.collection_exists(self.collection_name):
+            return
+        vectors_config = models.VectorParams(size=dim, distance=models.Distance.COSINE)
+        client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config={DENSE_VECTOR_NAME: vectors_config} if DENSE_VECTOR_NAME else vectors_config,
+            sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+            if self.with_sparse else None,
+        )
+        logger.info(f"Created collection {self.collection_name} (dim={dim})")
+
+    def _changed(self, client, window: list[Chunk]) -> list[Chunk]:
+        """Diff mode: bỏ các chunk đã có trong collection với cùng content_hash."""
+        existing = client.retrieve(
+            collection_name=self.collection_name,
+            ids=[chunk.id for chunk in window],
+            with_payload=["content_hash"],
+            with_vectors=False,
+        )
+        hashes = {point.id: (point.payload or {}).get("content_hash") for point in existing}
+        return [chunk for chunk in window if hashes.get(chunk.id) != chunk.content_hash]
+
+    def _points(self, chunks: list[Chunk], vectors: np.ndarray) -> list[models.PointStruct]:
+        sparse_vectors = None
+        if self.with_sparse:
+            sparse_vectors = encode_sparse_documents(get_sparse_encoder(), [chunk.text for chunk in chunks])
+
+        points = []
+        for i, (chunk, vector) in enumerate(zip(chunks, vectors)):
+            dense = vector.tolist()
+            if sparse_vectors is not None:
+                point_vector = {DENSE_VECTOR_NAME or "": dense, SPARSE_VECTOR_NAME: sparse_vectors[i]}
+            elif DENSE_VECTOR_NAME:
+                point_vector = {DENSE_VECTOR_NAME: dense}
+            else:
+                point_vector = dense
+            points.append(models.PointStruct(id=chunk.id, vector=point_vector, payload=chunk.payload()))
+        return points
+
+    def _upsert(self, client, executor: ThreadPoolExecutor, points: list[models.PointStruct]) -> int:
+        batches = [points[i:i + self.upsert_batch_size] for i in range(0, len(points), self.upsert_batch_size)]
+        futures = [
+            executor.submit(client.upsert, collection_name=self.collection_name, points=batch, wait=True)
+            for batch in batches
+        ]
+        for future in futures:
+            future.result()
+        return len(points)
+
+    def _delete_stale(self, client, live_ids: set) -> int:
+        """Diff mode: xóa các điểm không còn trong corpus."""
+        stale = []
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=self.collection_name, limit=1000, offset=offset,
+                with_payload=False, with_vectors=False,
+            )
+            stale.extend(point.id for point in points if point.id not in live_ids)
+            if offset is None or not points:
+                break
+        for i in range(0, len(stale), 1000):
+            client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=stale[i:i + 1000]),
+            )
+        return len(stale)
+
+    def run(self, path: str, diff: bool = False) -> dict:
+        """
+        Ingest corpus vào collection.
+
+        Args:
+            path: File corpus (.json / .jsonl)
+            diff: Chỉ embed + upsert chunk mới / thay đổi và xóa chunk không còn trong corpus
+
+        Returns:
+            dict: Thống kê (số chunk, chunks/s, ...)
+        """
+        client = get_rag_client()
+        stats = IngestionStats()
+        fingerprint = self._fingerprint(path, diff)
+        resume_from = self.checkpoint.position(fingerprint)
+        if resume_from:
+            logger.info(f"Resuming ingestion of {path} from chunk #{resume_from}")
+
+        embedder = EmbeddingPool(self.model_name, workers=self.workers, batch_size=self.embed_batch_size)
+        live_ids = set()
+        collection_ready = client.collection_exists(self.collection_name)
+        try:
+            with ThreadPoolExecutor(max_workers=self.upsert_parallel, thread_name_prefix="upsert") as executor:
+                window = []
+                position = 0
+
+                def flush():
+                    nonlocal collection_ready
+                    pending = window
+                    if diff and collection_ready:
+                        pending = self._changed(client, window)
+                        stats.unchanged += len(window) - len(pending)
+                    if pending:
+                        vectors = embedder.embed([chunk.text for chunk in pending])
+                        if not collection_ready:
+                            self.ensure_collection(client, vectors.shape[1])
+                            collection_ready = True
+                        stats.embedded += len(pending)
+                        stats.upserted += self._upsert(client, executor, self._points(pending, vectors))
+                    self.checkpoint.save(fingerprint, position, stats)
+                    logger.info(f"Ingestion progress: {stats.report()}")
+
+                records = iter_records(path)
+                for chunk in self.chunker.chunks(self._count_records(records, stats)):
+                    position += 1
+                    stats.chunks += 1
+                    stats.chars += len(chunk.text)
+                    live_ids.add(chunk.id)
+                    if position <= resume_from:
+                        stats.resumed += 1
+                        continue
+                    window.append(chunk)
+                    if len(window) >= self.window_size:
+                        flush()
+                        window = []
+                if window:
+                    flush()
+
+            if diff:
+                stats.deleted = self._delete_stale(client, live_ids)
+        finally:
+            embedder.close()
+
+        self.checkpoint.clear()
+        # Kết quả retrieval / text chunk cũ không còn đúng sau khi re-index: đổi version để
+        # mọi process dùng chung CACHE_VERSION_DIR bỏ cache của collection này
+        get_collection_version().bump(self.collection_name)
+        report = stats.report()
+        logger.info(f"Ingestion done: {report}")
+        return report
+
+    @staticmethod
+    def _count_records(records, stats: IngestionStats):
+        for record in records:
+            stats.records += 1
+            yield record
+
+    def dry_run(self, path: str, dim: int = 1024) -> dict:
+        """
+        Chunk corpus mà không embed / ghi, ước lượng kích thước collection.
+
+        Args:
+            path: File corpus
+            dim: Số chiều embedding (Vietnamese_Embedding_v2: 1024)
+        """
+        stats = IngestionStats()
+        payload_bytes = 0
+        for chunk in self.chunker.chunks(self._count_records(iter_records(path), stats)):
+            stats.chunks += 1
+            stats.chars += len(chunk.text)
+            payload_bytes += len(json.dumps(chunk.payload(), ensure_ascii=False).encode("utf-8"))
+
+        vector_bytes = stats.chunks * dim * 4
+        return {
+            "records": stats.records,
+            "chunks": stats.chunks,
+            "avg_chunk_chars": round(stats.chars / stats.chunks, 1) if stats.chunks else 0.0,
+            "dense_vectors_mb": round(vector_bytes / 2 ** 20, 2),
+            "int8_vectors_mb": round(vector_bytes / 4 / 2 ** 20, 2),
+            "payload_mb": round(payload_bytes / 2 ** 20, 2),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a drug corpus into the Qdrant collection")
+    parser.add_argument("corpus", help="Corpus file (.json / .jsonl)")
+    parser.add_argument("--collection", default=None)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--id-mode", choices=("sequential", "hash"), default="sequential")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--upsert-parallel", type=int, default=4)
+    parser.add_argument("--sparse", action="store_true", help="Also index BM25 sparse vectors")
+    parser.add_argument("--diff", action="store_true", help="Only re-embed changed chunks")
+    parser.add_argument("--dry-run", action="store_true", help="Estimate sizes without embedding")
+    parser.add_argument("--checkpoint", default=".cache/ingestion_checkpoint.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    os.makedirs(os.path.dirname(args.checkpoint) or ".", exist_ok=True)
+    pipeline = StorePipeline(
+        collection_name=args.collection,
+        chunker=CorpusChunker(args.chunk_size, args.chunk_overlap, id_mode=args.id_mode),
+        workers=args.workers,
+        embed_batch_size=args.batch_size,
+        upsert_parallel=args.upsert_parallel,
+        with_sparse=args.sparse,
+        checkpoint_path=args.checkpoint,
+    )
+    result = pipeline.dry_run(args.corpus) if args.dry_run else pipeline.run(args.corpus, diff=args.diff)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
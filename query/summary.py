@@ -39,33 +39,56 @@ class SummaryHandler:
             SummaryAnswer: Câu trả lời đã được tổng hợp và danh sách nguồn
         """
         try:
-            # Format các câu trả lời thành chuỗi
-            answers_text = []
-            for i, answer in enumerate(answers, 1):
-                answer_text = f"[Nguồn {i}: {answer.source}]\n{answer.answer}"
-                answers_text.append(answer_text)
-            
-            answers_formatted = "\n\n---\n\n".join(answers_text)
-            
-            result = self.summary_chain.invoke({
-                "original_query": original_query,
-                "answers": answers_formatted
-            })
+            result = self.summary_chain.invoke(self._build_inputs(original_query, answers))
+            logger.info(f"Summarized {len(answers)} answers into one comprehensive answer")
+            return result
+        except Exception as e:
+            logger.error(f"Error in summarizing answers: {e}")
+            return self._fallback_summary(answers)
+    
+    async def asummarize(self, original_query: str, answers: list[AnswerQuery]) -> SummaryAnswer:
+        """
+        Phiên bản async của summarize, dùng ainvoke để không chặn event loop.
+        
+        Args:
+            original_query: Câu hỏi gốc của người dùng
+            answers: Danh sách các câu trả lời từ các nguồn khác nhau
             
+        Returns:
+            SummaryAnswer: Câu trả lời đã được tổng hợp và danh sách nguồn
+        """
+        try:
+            result = await self.summary_chain.ainvoke(self._build_inputs(original_query, answers))
             logger.info(f"Summarized {len(answers)} answers into one comprehensive answer")
             return result
         except Exception as e:
             logger.error(f"Error in summarizing answers: {e}")
-            # Fallback: lấy câu trả lời đầu tiên nếu có lỗi
-            if answers:
-                return SummaryAnswer(
-                    summary=answers[0].answer,
-                    sources=[answers[0].source]
-                )
+            return self._fallback_summary(answers)
+    
+    def _build_inputs(self, original_query: str, answers: list[AnswerQuery]) -> dict:
+        # Format các câu trả lời thành chuỗi
+        answers_text = []
+        for i, answer in enumerate(answers, 1):
+            answer_text = f"[Nguồn {i}: {answer.source}]\n{answer.answer}"
+            answers_text.append(answer_text)
+        
+        answers_formatted = "\n\n---\n\n".join(answers_text)
+        return {
+            "original_query": original_query,
+            "answers": answers_formatted
+        }
+    
+    def _fallback_summary(self, answers: list[AnswerQuery]) -> SummaryAnswer:
+        # Fallback: lấy câu trả lời đầu tiên nếu có lỗi
+        if answers:
             return SummaryAnswer(
-                summary="Xin lỗi, không thể tổng hợp câu trả lời.",
-                sources=[]
+                summary=answers[0].answer,
+                sources=[answers[0].source]
             )
+        return SummaryAnswer(
+            summary="Xin lỗi, không thể tổng hợp câu trả lời.",
+            sources=[]
+        )
     
     def summarize_single(self, original_query: str, answer: AnswerQuery) -> SummaryAnswer:
         """
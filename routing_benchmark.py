@@ -0,0 +1,88 @@
+import argparse
+import json
+import time
+import logging
+
+import numpy as np
+
+from query.core import get_embedding_model
+from query.router.embedding_router import EmbeddingRouter
+from query.router.router import Router
+
+
+# =========================
+# CONFIG
+# =========================
+
+EVAL_FILE = "data/routing_eval_set.json"
+MARGINS = (0.0, 0.02, 0.05, 0.08, 0.1, 0.15)
+
+
+# =========================
+# LOGGING
+# =========================
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+logger = logging.getLogger("routing-benchmark")
+
+
+# =========================
+# Main
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline accuracy of the embedding router")
+    parser.add_argument("--eval-path", default=EVAL_FILE)
+    parser.add_argument("--with-llm", action="store_true", help="Also run the LLM router on low-margin queries")
+    args = parser.parse_args()
+
+    with open(args.eval_path, "r", encoding="utf-8") as f:
+        eval_data = json.load(f)
+    questions = [item["question"] for item in eval_data]
+    labels = [item["datasource"] for item in eval_data]
+
+    router = EmbeddingRouter(get_embedding_model())
+    started = time.perf_counter()
+    vectors = router.embedding_service.encode_many(questions)
+    decisions = [router.classify(vector) for vector in vectors]
+    local_ms = (time.perf_counter() - started) * 1000 / len(questions)
+
+    llm_routes = {}
+    llm_ms = 0.0
+    if args.with_llm:
+        llm_router = Router()
+        started = time.perf_counter()
+        for i, question in enumerate(questions):
+            if decisions[i][1] < max(MARGINS):
+                llm_routes[i] = llm_router.route(question).datasource
+        llm_ms = (time.perf_counter() - started) * 1000 / max(len(llm_routes), 1)
+
+    print("📊 ROUTING BENCHMARK")
+    print(f"queries: {len(questions)} | embedding router: {local_ms:.1f} ms/query"
+          + (f" | LLM router: {llm_ms:.0f} ms/query" if args.with_llm else ""))
+    accuracy = np.mean([route == label for (route, _), label in zip(decisions, labels)])
+    print(f"embedding only (no fallback) accuracy: {accuracy:.3f}")
+
+    for margin in MARGINS:
+        local = [i for i, (_, m) in enumerate(decisions) if m >= margin]
+        local_accuracy = np.mean([decisions[i][0] == labels[i] for i in local]) if local else 0.0
+        line = (f"margin >= {margin:.2f}: local {len(local) / len(questions):.1%} of queries, "
+                f"local accuracy {local_accuracy:.3f}")
+        if args.with_llm:
+            combined = [
+                (decisions[i][0] if decisions[i][1] >= margin else llm_routes[i]) == labels[i]
+                for i in range(len(questions))
+            ]
+            line += f", combined accuracy {np.mean(combined):.3f}"
+        print(line)
+
+    errors = [(questions[i], labels[i], route, m) for i, (route, m) in enumerate(decisions) if route != labels[i]]
+    for question, label, route, m in errors:
+        logger.info(f"[MISS] {label} -> {route} (margin={m:.3f}): {question}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import logging
+
+from query.split_query import SingleIntentClassifier
+
+
+# =========================
+# CONFIG
+# =========================
+
+# Các câu hỏi trong hai file này đều có nhiều ý (cần tách)
+MULTI_INTENT_FILES = ["data/comprehensive_1_drug.json", "data/comparison_eval_set_fixed.json"]
+# metadata.type: single_hop -> một ý, multi_hop -> nhiều ý
+LABELLED_FILE = "data/hybrid_eval_set_openai.json"
+RESULT_FILE = "split_heuristic_eval_results.json"
+# Câu ngắn viết tay: so sánh / nhiều thuốc (nhiều ý) và câu một ý nhắc tên thuốc
+HANDWRITTEN_ITEMS = [
+    ("Panadol và Efferalgan khác nhau thế nào?", False),
+    ("Nên dùng Panadol hay Efferalgan?", False),
+    ("Panadol và Efferalgan cái nào tốt hơn?", False),
+    ("Công dụng của Panadol và Efferalgan là gì?", False),
+    ("Tác dụng phụ của Panadol và Aspirin?", False),
+    ("Liều dùng Hapacol, Panadol cho trẻ em?", False),
+    ("Ibuprofen hoặc Paracetamol, uống loại nào khi sốt?", False),
+    ("Efferalgan với Hapacol giống nhau không?", False),
+    ("Aspirin có hiệu quả hơn Paracetamol không?", False),
+    ("Panadol có tác dụng phụ gì?", True),
+    ("Liều dùng của Efferalgan cho trẻ em?", True),
+    ("Panadol Extra dùng để làm gì?", True),
+    ("Hapacol 250 dùng cho trẻ mấy tuổi?", True),
+    ("Paracetamol uống lúc đói được không?", True),
+    ("Panadol và Aspirin có tương tác không?", True),
+    ("Người mang thai có dùng được Aspirin không?", True),
+]
+
+
+# =========================
+# LOGGING
+# =========================
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+logger = logging.getLogger("split-heuristic-eval")
+
+
+# =========================
+# Metrics
+# =========================
+
+def load_items() -> dict[str, list[tuple[str, bool]]]:
+    """Trả về {tên tập: [(câu hỏi, có phải một ý)]}."""
+    items = {"handwritten": HANDWRITTEN_ITEMS}
+    for path in MULTI_INTENT_FILES:
+        with open(path, "r", encoding="utf-8") as f:
+            items[path] = [(item["question"], False) for item in json.load(f)]
+    with open(LABELLED_FILE, "r", encoding="utf-8") as f:
+        items[LABELLED_FILE] = [
+            (item["question"], item["metadata"]["type"] == "single_hop") for item in json.load(f)
+        ]
+    return items
+
+
+def evaluate(classifier: SingleIntentClassifier, items: list[tuple[str, bool]]) -> dict:
+    """Precision / recall của dự đoán "một ý" (bỏ qua LLM split)."""
+    tp = fp = fn = 0
+    misses = []
+    for question, single in items:
+        predicted, reason = classifier.classify(question)
+        tp += predicted and single
+        fp += predicted and not single
+        fn += (not predicted) and single
+        if predicted != single:
+            misses.append({"question": question, "single": single, "reason": reason})
+    return {
+        "total": len(items),
+        "bypassed": tp + fp,
+        "bypass_rate": round((tp + fp) / len(items), 4) if items else 0.0,
+        "false_bypass": fp,
+        "precision": round(tp / (tp + fp), 4) if tp + fp else None,
+        "recall": round(tp / (tp + fn), 4) if tp + fn else None,
+        "misses": misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precision / recall of the single-intent split heuristic")
+    parser.add_argument("--max-words", type=int, default=30)
+    args = parser.parse_args()
+
+    classifier = SingleIntentClassifier(max_words=args.max_words)
+    items = load_items()
+    results = {name: evaluate(classifier, data) for name, data in items.items()}
+    results["all"] = evaluate(classifier, [item for data in items.values() for item in data])
+
+    with open(RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print("📊 SINGLE-INTENT HEURISTIC")
+    for name, result in results.items():
+        # Với tập chỉ có câu nhiều ý, recall không xác định; chỉ số quan trọng là false_bypass
+        print(f"{name:40s} total={result['total']:4d} bypassed={result['bypassed']:4d} "
+              f"false_bypass={result['false_bypass']:3d} precision={result['precision']} recall={result['recall']}")
+        for miss in result["misses"] if name != "all" else []:
+            logger.info(f"[MISS] single={miss['single']} ({miss['reason']}): {miss['question']}")
+
+
+if __name__ == "__main__":
+    main()